@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+BENCH_USER = {'username': 'bench', 'email': 'bench@songbox.dev', 'password': 'bench-password'}
+
+
+# Importa la app apuntando a los reemplazos locales:
+# Spotify -> stub HTTP, MongoDB -> mongomock (o un mongod desechable con mongo_uri)
+def load_app(spotify_api_url, mongo_uri=None):
+    os.environ.update({
+        'MONGO_URI': mongo_uri or 'mongodb://localhost:27017/songbox_bench',
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY', 'benchmark-secret-key-with-enough-length'),
+        'SPOTIFY_CLIENT_ID': 'benchmark',
+        'SPOTIFY_CLIENT_SECRET': 'benchmark',
+        'SPOTIFY_REDIRECT_URI': 'http://127.0.0.1:5000/callback',
+        'SPOTIFY_API_URL': spotify_api_url,
+        'MONGO_ENSURE_INDEXES': '0',
+        'SESSION_BACKEND': 'mongo',
+        'SPOTIFY_TOKEN_BACKEND': 'mongo',
+        # El stub no tiene el limite de Spotify: el gateway no debe frenar la medicion
+        'SPOTIFY_RATE_LIMIT': '100000',
+        'SPOTIFY_RATE_BURST': '100000',
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+    })
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+
+    import app as songbox
+
+    if mongo_uri is None:
+        import mongomock
+        client = mongomock.MongoClient()
+        songbox.mongo.cx = client
+        songbox.mongo.db = client.songbox_bench
+    else:
+        from indexes import ensure_indexes
+        songbox.init_mongo()
+        songbox.mongo.cx.drop_database(songbox.mongo.db.name)
+        ensure_indexes(songbox.mongo.db)
+    return songbox
+
+
+# Datos base: un usuario, una playlist, una trivia y comentarios en un album
+def seed(songbox, playlist_size=100, comments=200):
+    client = songbox.app.test_client()
+    client.post('/register', json=BENCH_USER)
+    token = client.post('/login', json=BENCH_USER).get_json()['token']
+    auth = {'Authorization': f'Bearer {token}'}
+
+    playlist = client.post('/playlist', headers=auth, json={
+        'name': 'Benchmark',
+        'description': 'Playlist de prueba',
+        'songs': [f'track{i:05d}' for i in range(playlist_size)]
+    }).get_json()
+
+    trivia = client.post('/trivia', headers=auth, json={
+        'question': '¿En qué año salió Abbey Road?',
+        'options': ['1967', '1968', '1969', '1970'],
+        'correct_answer': '1969'
+    }).get_json()
+
+    db = songbox.mongo.db
+    db.comments.insert_many([{
+        'user': BENCH_USER['email'],
+        'album_id': '0ETFjACtuP2ADo6LFhL6HN',
+        'song_id': None,
+        'text': f'Comentario {i}',
+        'created_at': '2024-01-01T00:00:00+00:00',
+        'comment_type': 'album'
+    } for i in range(comments)])
+
+    seed_spotify_session(songbox)
+
+    return {
+        'auth': auth,
+        'email': BENCH_USER['email'],
+        'password': BENCH_USER['password'],
+        'playlist_id': playlist['id'],
+        'trivia_id': trivia['id'],
+    }
+
+
+BENCH_TOKEN_KEY = 'session:benchmark'
+BENCH_SESSION_ID = 'benchmark-session'
+
+
+# Token de Spotify del benchmark en el store y una sesion del servidor que lo usa
+def seed_spotify_session(songbox):
+    songbox.token_store.set(BENCH_TOKEN_KEY, {
+        'access_token': 'benchmark-access-token',
+        'refresh_token': 'benchmark-refresh-token',
+        'token_type': 'Bearer',
+        'expires_at': int(time.time()) + 24 * 3600,
+    })
+    songbox.app.session_interface.store.set(
+        BENCH_SESSION_ID, {'spotify_token_key': BENCH_TOKEN_KEY}, songbox.app.permanent_session_lifetime
+    )
+
+
+# Cliente de pruebas con un token de Spotify en la sesion
+def make_client(songbox):
+    client = songbox.app.test_client()
+    with client.session_transaction() as session:
+        session['spotify_token_key'] = BENCH_TOKEN_KEY
+    return client
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import spotipy
+
+from benchmarks.harness import SRC
+from benchmarks.run import percentile
+from benchmarks.stub_spotify import StubSpotify
+
+TOKEN = 'benchmark-access-token'
+
+
+# Como antes del cambio: un cliente de spotipy (y una sesion HTTP nueva) por peticion
+def per_call_search(api_url):
+    def search(i):
+        sp = spotipy.Spotify(auth=TOKEN, requests_session=True)
+        sp.prefix = api_url
+        try:
+            return sp.search(q=f'http session {i}', type='album')
+        finally:
+            sp._session.close()
+    return search
+
+
+# Como ahora: get_spotify_client() sobre la sesion HTTP compartida del worker
+def pooled_search(api_url):
+    os.environ['SPOTIFY_API_URL'] = api_url
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    from spotify_integration import get_spotify_client
+
+    return lambda i: get_spotify_client(TOKEN).search(q=f'http session {i}', type='album')
+
+
+def measure(stub, search, total, concurrency):
+    connections = stub.connections
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies = []
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            search(i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'connections': stub.connections - connections,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Latencia de llamadas a Spotify con una sesion HTTP por llamada o compartida')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latencia del stub de Spotify')
+    args = parser.parse_args(argv)
+
+    stub = StubSpotify(latency=args.latency_ms / 1000).start()
+    try:
+        modes = {'por llamada': per_call_search(stub.api_url), 'compartida': pooled_search(stub.api_url)}
+        results = {name: measure(stub, search, args.requests, args.concurrency) for name, search in modes.items()}
+    finally:
+        stub.stop()
+
+    print(f"{args.requests} busquedas, {args.concurrency} hilos, stub con {args.latency_ms} ms de latencia")
+    print(f"{'sesion':<14}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'conexiones':>12}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['connections']:>12}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
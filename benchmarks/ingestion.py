@@ -0,0 +1,143 @@
+import argparse
+import copy
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.harness import SRC
+from benchmarks.stub_spotify import load_fixture
+
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+
+# Paginas de busqueda como las de Spotify (20 albumes); `overlap` es la fraccion
+# de cada pagina que ya aparecio en la anterior
+def search_pages(pages, page_size=20, overlap=0.5):
+    template = load_fixture('search_album.json')['albums']['items']
+    repeated = int(page_size * overlap)
+    counter = 0
+    previous = []
+    for page in range(pages):
+        ids = previous[-repeated:] if repeated else []
+        while len(ids) < page_size:
+            ids.append(f'album{counter:08d}')
+            counter += 1
+        previous = ids
+        items = []
+        for i, album_id in enumerate(ids):
+            item = copy.deepcopy(template[i % len(template)])
+            item['id'] = album_id
+            items.append(item)
+        yield items
+
+
+# Cuenta las llamadas a MongoDB (cada una es un round trip al servidor)
+class CountingCollection:
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._counter[0] += 1
+            return attr(*args, **kwargs)
+        return call
+
+
+class CountingDb:
+    def __init__(self, db):
+        self._db = db
+        self.round_trips = [0]
+
+    def __getattr__(self, name):
+        return CountingCollection(self._db[name], self.round_trips)
+
+
+# Antes del cambio: find_one + insert_one por album (dos round trips, con carrera)
+def find_then_insert(db, items):
+    for item in items:
+        if not db.albums.find_one({'album_id': item['id']}):
+            db.albums.insert_one({
+                'album_id': item['id'],
+                'name': item['name'],
+                'artist': [artist['name'] for artist in item['artists']],
+                'created_at': datetime.now(timezone.utc).isoformat()
+            })
+
+
+def upsert_each(db, items):
+    from catalog import upsert_album
+
+    for item in items:
+        upsert_album(db, item)
+
+
+def bulk(db, items):
+    from catalog import ingest_albums
+
+    ingest_albums(db, items)
+
+
+MODES = {
+    'find_one + insert_one': find_then_insert,
+    'upsert por album': upsert_each,
+    'bulk_write por pagina': bulk,
+}
+
+
+def measure(db, ingest, pages):
+    from indexes import INDEXES
+
+    db.albums.drop()
+    db.albums.create_indexes(INDEXES['albums'])
+
+    counting = CountingDb(db)
+    start = time.perf_counter()
+    for items in pages:
+        ingest(counting, items)
+    elapsed = time.perf_counter() - start
+    return elapsed, counting.round_trips[0], db.albums.count_documents({})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Albumes guardados por segundo al ingerir paginas de busqueda de Spotify')
+    parser.add_argument('--pages', type=int, default=500, help='Paginas de 20 albumes')
+    parser.add_argument('--overlap', type=float, default=0.5, help='Fraccion de albumes repetidos entre paginas')
+    parser.add_argument('--mongo-uri', help='mongod desechable (por defecto mongomock); la base se borra')
+    parser.add_argument('--rtt-ms', type=float, default=1.0,
+                        help='Round trip a MongoDB para la estimacion (mongomock no tiene red)')
+    args = parser.parse_args(argv)
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+        db = client.get_default_database('songbox_ingestion')
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+        db = client.songbox_ingestion
+
+    pages = list(search_pages(args.pages, overlap=args.overlap))
+    total = sum(len(items) for items in pages)
+    print(f"{args.pages} paginas ({total} albumes, {args.overlap:.0%} repetidos), "
+          f"{'mongod' if args.mongo_uri else 'mongomock'}")
+    print(f"{'modo':<24}{'albumes/s':>12}{'round trips':>13}{'por pagina':>12}{f'albumes/s ({args.rtt_ms:g} ms RTT)':>26}{'guardados':>11}")
+    try:
+        for name, ingest in MODES.items():
+            elapsed, round_trips, stored = measure(db, ingest, pages)
+            # Con mongomock el tiempo medido no incluye la red: se suma un RTT por llamada
+            estimated = elapsed + (0 if args.mongo_uri else round_trips * args.rtt_ms / 1000)
+            print(f"{name:<24}{total / elapsed:>12.0f}{round_trips:>13}{round_trips / len(pages):>12.1f}"
+                  f"{total / estimated:>26.0f}{stored:>11}")
+    finally:
+        client.drop_database(db.name)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
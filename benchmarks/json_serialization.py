@@ -0,0 +1,97 @@
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.harness import SRC
+from benchmarks.run import percentile
+
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+from json_provider import OrjsonProvider  # noqa: E402
+
+PROVIDERS = {'json': DefaultJSONProvider, 'orjson': OrjsonProvider}
+
+
+# Pagina de comentarios como la arma comments_page_response
+def comments_payload(size):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return {
+        'comments': [{
+            'id': str(ObjectId()),
+            'user': f'user{i % 97}@songbox.dev',
+            'text': f'Comentario numero {i} sobre el album, con algo de texto para que pese',
+            'created_at': (start + timedelta(minutes=i)).isoformat()
+        } for i in range(size)],
+        'next_cursor': str(ObjectId())
+    }
+
+
+# Playlist con ?expand=songs como la arma get_playlist
+def playlist_payload(size):
+    return {
+        'id': str(ObjectId()),
+        'name': 'Benchmark',
+        'description': 'Playlist grande',
+        'songs': [{
+            'song_id': f'track{i:05d}',
+            'name': f'Cancion {i}',
+            'artist': ['Artista', f'Invitado {i % 13}'],
+            'album': f'Album {i // 12}',
+            'album_id': f'album{i // 12:04d}',
+            'release_date': '1969-09-26'
+        } for i in range(size)],
+        'comments': [],
+        'version': 3,
+        'created_at': '2024-01-01T00:00:00+00:00'
+    }
+
+
+PAYLOADS = {'comments': comments_payload, 'playlist': playlist_payload}
+
+
+# Tiempo de jsonify (serializar y armar la Response) con cada proveedor
+def measure(app, payload, repeat):
+    latencies = []
+    with app.app_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = app.json.response(payload)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'bytes': len(response.get_data()),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tiempo de serializacion JSON: proveedor de Flask (json) contra orjson')
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    apps = {}
+    for name, provider in PROVIDERS.items():
+        app = Flask(name)
+        app.json = provider(app)
+        apps[name] = app
+
+    print(f"{'payload':>10}{'items':>8}{'proveedor':>11}{'bytes':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for kind, build in PAYLOADS.items():
+        for size in (int(s) for s in args.sizes.split(',')):
+            payload = build(size)
+            for name, app in apps.items():
+                r = measure(app, payload, args.repeat)
+                print(f"{kind:>10}{size:>8}{name:>11}{r['bytes']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METHODS = ['argon2id', 'scrypt:32768:8:1', 'pbkdf2:sha256:600000']
+
+
+def verifier(method, password):
+    if method == 'argon2id':
+        from argon2 import PasswordHasher
+        hasher = PasswordHasher(
+            time_cost=int(os.getenv('ARGON2_TIME_COST', 2)),
+            memory_cost=int(os.getenv('ARGON2_MEMORY_COST', 19456)),
+            parallelism=int(os.getenv('ARGON2_PARALLELISM', 1))
+        )
+        stored = hasher.hash(password)
+        return lambda: hasher.verify(stored, password)
+    stored = generate_password_hash(password, method=method)
+    return lambda: check_password_hash(stored, password)
+
+
+# Verificaciones por segundo (= logins por segundo sin contar MongoDB)
+def measure(verify, seconds, threads):
+    deadline = time.perf_counter() + seconds
+
+    def loop():
+        done = 0
+        while time.perf_counter() < deadline:
+            verify()
+            done += 1
+        return done
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(lambda _: loop(), range(threads)))
+    return total / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Logins por segundo segun el algoritmo de hash')
+    parser.add_argument('--methods', default=','.join(METHODS))
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    print(f"{'metodo':<24}{'1 hilo (por nucleo)':>22}{f'{args.threads} hilos':>14}")
+    for method in args.methods.split(','):
+        verify = verifier(method, 'benchmark-password')
+        single = measure(verify, args.seconds, 1)
+        pooled = measure(verify, args.seconds, args.threads)
+        print(f"{method:<24}{single:>22.1f}{pooled:>14.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import argparse
+import json
+import sys
+import time
+
+from bson import ObjectId
+
+from benchmarks.harness import load_app, seed
+from benchmarks.run import percentile
+from benchmarks.stub_spotify import StubSpotify
+
+
+# Una edicion de una cancion: PUT con la lista completa contra PATCH con una operacion
+def put_edit(client, ctx, songs, i):
+    songs[i % len(songs)] = f'edited{i:05d}'
+    return {'songs': songs}, lambda body: client.put(f"/playlist/{ctx['playlist_id']}", headers=ctx['auth'], json=body)
+
+
+def patch_edit(client, ctx, songs, i):
+    if i % 2 == 0:
+        body = {'op': 'add', 'songs': [f'added{i:05d}'], 'position': i % len(songs), 'version': ctx['version']}
+    else:
+        body = {'op': 'move', 'from': 0, 'to': len(songs) // 2, 'version': ctx['version']}
+    return body, lambda body: client.patch(f"/playlist/{ctx['playlist_id']}/songs", headers=ctx['auth'], json=body)
+
+
+MODES = {'put': put_edit, 'patch': patch_edit}
+
+
+def measure(songbox, ctx, size, mode, edits):
+    client = songbox.app.test_client()
+    songs = [f'track{i:05d}' for i in range(size)]
+    songbox.mongo.db.playlist.update_one(
+        {'_id': ObjectId(ctx['playlist_id'])}, {'$set': {'songs': list(songs), 'version': 0}}
+    )
+    ctx['version'] = 0
+
+    latencies = []
+    payload = 0
+    for i in range(edits):
+        body, send = MODES[mode](client, ctx, songs, i)
+        payload += len(json.dumps(body))
+        start = time.perf_counter()
+        response = send(body)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{mode}: {response.status_code} {response.get_data(as_text=True)}')
+        ctx['version'] += 1
+
+    latencies.sort()
+    return {
+        'bytes_per_edit': payload // edits,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Costo de editar una cancion en playlists grandes: PUT completo contra PATCH')
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--edits', type=int, default=50)
+    parser.add_argument('--mongo-uri', help='mongod desechable (por defecto mongomock)')
+    args = parser.parse_args(argv)
+
+    stub = StubSpotify(latency=0).start()
+    try:
+        songbox = load_app(stub.api_url, args.mongo_uri)
+        ctx = seed(songbox, playlist_size=0, comments=1)
+        print(f"{'canciones':>10}{'modo':>7}{'bytes/edicion':>15}{'p50 ms':>10}{'p95 ms':>10}")
+        for size in (int(s) for s in args.sizes.split(',')):
+            for mode in MODES:
+                r = measure(songbox, ctx, size, mode, args.edits)
+                print(f"{size:>10}{mode:>7}{r['bytes_per_edit']:>15}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    finally:
+        stub.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
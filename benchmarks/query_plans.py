@@ -0,0 +1,109 @@
+import argparse
+import random
+import sys
+import time
+
+from pymongo import MongoClient
+
+from benchmarks.harness import SRC
+
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+WORDS = ['abbey', 'road', 'kind', 'blue', 'dark', 'side', 'moon', 'ok', 'computer', 'nevermind', 'something', 'money']
+
+
+def _name(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(3))
+
+
+# Datos de prueba con el volumen de un catalogo real; incluye los documentos
+# que buscan las consultas de HOT_QUERIES
+def seed(db, albums, comments_per_album, batch=5000):
+    rng = random.Random(1)
+
+    def insert(collection, docs):
+        chunk = []
+        for doc in docs:
+            chunk.append(doc)
+            if len(chunk) >= batch:
+                collection.insert_many(chunk, ordered=False)
+                chunk = []
+        if chunk:
+            collection.insert_many(chunk, ordered=False)
+
+    insert(db.users, ({'email': f'user{i}@example.com', 'username': f'user{i}'} for i in range(albums // 10)))
+    insert(db.albums, ({'album_id': f'album{i:08d}', 'name_norm': _name(rng), 'artist': ['Artista']} for i in range(albums)))
+    insert(db.songs, ({'song_id': f'song{i:08d}', 'name_norm': _name(rng), 'album_id': f'album{i // 10:08d}'} for i in range(albums * 10)))
+    insert(db.comments, ({'album_id': f'album{rng.randrange(albums):08d}', 'song_id': None, 'text': 'Comentario'}
+                         for _ in range(albums * comments_per_album)))
+    insert(db.leaderboards, ({'scope': 'global', 'user': f'user{i}@example.com', 'score': rng.randrange(100)}
+                             for i in range(albums // 10)))
+
+    db.users.insert_one({'email': 'user@example.com', 'username': 'user'})
+    db.albums.insert_one({'album_id': '0ETFjACtuP2ADo6LFhL6HN', 'name_norm': 'abbey road', 'artist': ['The Beatles']})
+    db.songs.insert_one({'song_id': '3n3Ppam7vgaVa1iaRUc9Lp', 'name_norm': 'something', 'album_id': '0ETFjACtuP2ADo6LFhL6HN'})
+
+
+# Plan ganador, documentos revisados y tiempo de cada consulta de HOT_QUERIES
+def explain(db):
+    from indexes import HOT_QUERIES, plan_stages
+
+    results = []
+    for endpoint, collection, query in HOT_QUERIES:
+        result = db.command('explain', {'find': collection, 'filter': query}, verbosity='executionStats')
+        stats = result['executionStats']
+        results.append({
+            'endpoint': endpoint,
+            'collection': collection,
+            'plan': ' <- '.join(plan_stages(result['queryPlanner']['winningPlan'])),
+            'docs_examined': stats['totalDocsExamined'],
+            'returned': stats['nReturned'],
+            'ms': stats['executionTimeMillis'],
+        })
+    return results
+
+
+def print_plans(title, results):
+    print(f'\n{title}')
+    print(f"{'consulta':<44}{'docs revisados':>16}{'devueltos':>11}{'ms':>7}  plan")
+    for r in results:
+        print(f"{r['endpoint']:<44}{r['docs_examined']:>16}{r['returned']:>11}{r['ms']:>7}  {r['plan']}")
+
+
+def main(argv=None):
+    from indexes import ensure_indexes
+
+    parser = argparse.ArgumentParser(description='Planes de las consultas principales sobre un dataset grande, sin y con los indices')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/songbox_query_plans',
+                        help='mongod desechable: la base se borra al empezar (explain no existe en mongomock)')
+    parser.add_argument('--albums', type=int, default=20000, help='Albumes (10 canciones por album)')
+    parser.add_argument('--comments-per-album', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.mongo_uri)
+    db = client.get_default_database('songbox_query_plans')
+    client.drop_database(db.name)
+
+    start = time.perf_counter()
+    seed(db, args.albums, args.comments_per_album)
+    print(f"Datos cargados en {time.perf_counter() - start:.1f}s: "
+          f"{args.albums} albumes, {args.albums * 10} canciones, {args.albums * args.comments_per_album} comentarios")
+
+    print_plans('Sin indices', explain(db))
+    created, errors = ensure_indexes(db)
+    for collection, error in errors.items():
+        print(f'{collection}: ERROR {error}', file=sys.stderr)
+    after = explain(db)
+    print_plans('Con los indices de src/indexes.py', after)
+
+    # Codigo 1 si alguna consulta sigue recorriendo la coleccion
+    scans = [r['endpoint'] for r in after if 'COLLSCAN' in r['plan']]
+    for endpoint in scans:
+        print(f'COLLSCAN en {endpoint}')
+    client.drop_database(db.name)
+    return 1 if scans or errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
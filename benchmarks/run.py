@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from benchmarks.harness import load_app, make_client, seed
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.stub_spotify import StubSpotify
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+# Ejecuta `requests` llamadas de un escenario repartidas en `concurrency` hilos
+def run_scenario(songbox, ctx, scenario, requests, concurrency, warmup=0):
+    warm_client = make_client(songbox)
+    for i in range(warmup):
+        scenario(warm_client, ctx, i)
+
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    results_lock = threading.Lock()
+
+    def worker():
+        client = make_client(songbox)
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            response = scenario(client, ctx, i)
+            local_latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                local_errors += 1
+        with results_lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+# Regresion: p95 mas alto o rps mas bajo que la linea base, fuera de la tolerancia
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {result['rps']}")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    header = f"{'escenario':<22}{'req':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        line = f"{name:<22}{r['requests']:>7}{r['errors']:>6}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+        base = (baseline or {}).get('results', {}).get(name)
+        if base:
+            line += f"   (base p95 {base['p95_ms']} ms, {base['rps']} rps)"
+        print(line)
+
+
+def baseline_path(name):
+    return os.path.join(BASELINES, f'{name}.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pruebas de carga de SongBox con Spotify y MongoDB locales')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Escenarios separados por coma')
+    parser.add_argument('--requests', type=int, default=300, help='Peticiones por escenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Hilos concurrentes')
+    parser.add_argument('--warmup', type=int, default=10, help='Peticiones de calentamiento por escenario')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Latencia del stub de Spotify')
+    parser.add_argument('--mongo-uri', help='mongod desechable (por defecto se usa mongomock)')
+    parser.add_argument('--save', metavar='NOMBRE', help='Guardar los resultados como linea base')
+    parser.add_argument('--compare', metavar='NOMBRE', help='Comparar con una linea base guardada')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Tolerancia de la comparacion (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    stub = StubSpotify(latency=args.latency_ms / 1000).start()
+    try:
+        songbox = load_app(stub.api_url, args.mongo_uri)
+        ctx = seed(songbox)
+        results = {}
+        for name in names:
+            results[name] = run_scenario(songbox, ctx, SCENARIOS[name], args.requests, args.concurrency, args.warmup)
+    finally:
+        stub.stop()
+
+    baseline = None
+    if args.compare:
+        with open(baseline_path(args.compare), encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+    print(f"\nllamadas al stub de Spotify: {stub.calls}")
+
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(baseline_path(args.save), 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'config': {k: v for k, v in vars(args).items() if k not in ('save', 'compare')},
+                'results': results
+            }, f, indent=2)
+        print(f"linea base guardada en {baseline_path(args.save)}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
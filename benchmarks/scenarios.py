@@ -0,0 +1,60 @@
+# Escenarios de carga: cada uno recibe (cliente, contexto, numero de iteracion)
+# y devuelve la respuesta de la app.
+
+ALBUMS = ['Abbey Road (Remastered)', 'OK Computer', 'The Dark Side of the Moon', 'Kind Of Blue', 'Nevermind']
+SONGS = ['Something - Remastered 2009', 'Paranoid Android', 'Money', 'So What', 'Smells Like Teen Spirit']
+
+
+def login(client, ctx, i):
+    return client.post('/login', json={'email': ctx['email'], 'password': ctx['password']})
+
+
+def search_album(client, ctx, i):
+    return client.get('/search_album', query_string={'name': ALBUMS[i % len(ALBUMS)]})
+
+
+# Cada busqueda es distinta: no hay cache ni catalogo local, siempre va al stub
+def search_album_remote(client, ctx, i):
+    return client.get('/search_album', query_string={'name': f'benchmark album {i}'})
+
+
+def search_song(client, ctx, i):
+    return client.get('/search_song', query_string={'name': SONGS[i % len(SONGS)]})
+
+
+def comments(client, ctx, i):
+    return client.post('/comments', headers=ctx['auth'], json={
+        'album_name': ALBUMS[i % len(ALBUMS)],
+        'text': f'Comentario de carga {i}'
+    })
+
+
+def playlist(client, ctx, i):
+    return client.get(f"/playlist/{ctx['playlist_id']}")
+
+
+# Resuelve todas las canciones de la playlist (catalogo local + /v1/tracks de a 50)
+def playlist_expand(client, ctx, i):
+    return client.get(f"/playlist/{ctx['playlist_id']}", query_string={'expand': 'songs'})
+
+
+def trivia(client, ctx, i):
+    return client.get(f"/trivia/{ctx['trivia_id']}")
+
+
+# Respuestas a la misma trivia: solo la primera suma, el resto va al registro en lotes
+def trivia_answer(client, ctx, i):
+    return client.post(f"/trivia/{ctx['trivia_id']}/answer", headers=ctx['auth'], json={'answer': '1969'})
+
+
+SCENARIOS = {
+    'login': login,
+    'search_album': search_album,
+    'search_album_remote': search_album_remote,
+    'search_song': search_song,
+    'comments': comments,
+    'playlist': playlist,
+    'playlist_expand': playlist_expand,
+    'trivia': trivia,
+    'trivia_answer': trivia_answer,
+}
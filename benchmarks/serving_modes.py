@@ -0,0 +1,160 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from flask import Flask
+
+from benchmarks.harness import BENCH_SESSION_ID, SRC, load_app, seed_spotify_session
+from benchmarks.run import percentile
+from benchmarks.stub_spotify import StubSpotify
+
+ROOT = os.path.dirname(SRC)
+SECRET_KEY = 'benchmark-secret-key'
+
+# Modos de servir la app: workers sync (uno bloqueado por llamada a Spotify)
+# contra workers gevent (I/O cooperativa, cientos de llamadas en vuelo por proceso)
+MODES = {
+    'sync': ['--worker-class', 'sync'],
+    'gevent': ['--worker-class', 'gevent', '--worker-connections', '1000'],
+}
+
+
+# Cookie con el id firmado de la sesion del benchmark (seed_spotify_session),
+# como la que deja /callback
+def spotify_session_cookie():
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    from sessions import session_cookie
+
+    signing_app = Flask(__name__)
+    signing_app.secret_key = SECRET_KEY
+    return session_cookie(signing_app, BENCH_SESSION_ID)
+
+
+def start_server(mode, port, workers, spotify_api_url, mongo_uri):
+    env = dict(os.environ,
+               SECRET_KEY=SECRET_KEY,
+               JWT_SECRET_KEY='benchmark-secret-key-with-enough-length',
+               SPOTIFY_CLIENT_ID='benchmark',
+               SPOTIFY_CLIENT_SECRET='benchmark',
+               SPOTIFY_REDIRECT_URI='http://127.0.0.1:5000/callback',
+               SPOTIFY_API_URL=spotify_api_url,
+               SPOTIFY_POOL_SIZE='200',
+               SESSION_BACKEND='mongo',
+               SPOTIFY_TOKEN_BACKEND='mongo',
+               SPOTIFY_RATE_LIMIT='100000',
+               SPOTIFY_RATE_BURST='100000',
+               LOG_LEVEL='WARNING')
+    if mongo_uri:
+        env['MONGO_URI'] = mongo_uri
+        target = ['--chdir', SRC, 'app:app']
+    else:
+        target = ['--chdir', ROOT, '--pythonpath', SRC, 'benchmarks.wsgi_mock:app']
+
+    # -c os.devnull: sin esto gunicorn carga ./gunicorn.conf.py (preload_app, y
+    # el monkey patch de gevent solo si GUNICORN_WORKER_CLASS=gevent), y con
+    # --worker-class gevent la app quedaria precargada sin parchear
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.devnull, '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--log-level', 'warning', *MODES[mode], *target],
+        env=env
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/metrics', timeout=1)
+            return process
+        except requests.RequestException:
+            # Sin conexion o con los workers todavia cargando la app
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn ({mode}) no respondio en el puerto {port}')
+
+
+# Busquedas siempre distintas, asi cada peticion espera a Spotify
+def drive(base_url, cookie, total, concurrency):
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def worker():
+        http = requests.Session()
+        http.cookies.set('session', cookie)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                response = http.get(f'{base_url}/search_album', params={'name': f'serving mode {i} {time.time_ns()}'}, timeout=60)
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara los workers sync y gevent en rutas que llaman a Spotify')
+    parser.add_argument('--modes', default='sync,gevent')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=200, help='Latencia del stub de Spotify')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--mongo-uri', help='mongod desechable (por defecto mongomock dentro de cada worker)')
+    args = parser.parse_args(argv)
+
+    stub = StubSpotify(latency=args.latency_ms / 1000).start()
+    cookie = spotify_session_cookie()
+    if args.mongo_uri:
+        # Con un mongod compartido la sesion se guarda una vez para todos los workers
+        seed_spotify_session(load_app(stub.api_url, args.mongo_uri))
+    results = {}
+    try:
+        for mode in args.modes.split(','):
+            process = start_server(mode, args.port, args.workers, stub.api_url, args.mongo_uri)
+            try:
+                results[mode] = drive(f'http://127.0.0.1:{args.port}', cookie, args.requests, args.concurrency)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+    finally:
+        stub.stop()
+
+    print(f"{args.workers} workers, {args.concurrency} clientes, Spotify con {args.latency_ms} ms de latencia")
+    print(f"{'modo':<10}{'req':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['requests']:>7}{r['errors']:>6}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
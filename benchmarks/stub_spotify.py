@@ -0,0 +1,153 @@
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Servidor HTTP local que responde como la API de Spotify con respuestas grabadas
+# (benchmarks/fixtures) y una latencia configurable.
+class StubSpotify:
+    def __init__(self, latency=0.05, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.calls = {}
+        self.connections = 0
+        self._forced = {}
+        self._lock = threading.Lock()
+        self._responses = {
+            'album': load_fixture('search_album.json'),
+            'track': load_fixture('search_track.json'),
+            'me': load_fixture('me.json'),
+            'track_item': load_fixture('track.json'),
+        }
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return self.url + '/v1/'
+
+    def count(self, path):
+        with self._lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    # Fuerza la respuesta de una ruta (errores, 429 con Retry-After) hasta reset()
+    def respond_with(self, path, status, payload=None, headers=None):
+        with self._lock:
+            self._forced[path] = (status, payload if payload is not None else {}, headers or {})
+
+    def reset(self):
+        with self._lock:
+            self._forced.clear()
+
+    def route(self, method, path, query):
+        # spotipy pide /v1/tracks/?ids=...
+        path = path.rstrip('/')
+        with self._lock:
+            forced = self._forced.get(path)
+        if forced:
+            return forced
+        if path == '/v1/search':
+            return 200, self._responses[query.get('type', ['track'])[0]], {}
+        if path == '/v1/me':
+            return 200, self._responses['me'], {}
+        if path == '/v1/tracks':
+            ids = query.get('ids', [''])[0].split(',')
+            return 200, {'tracks': [self._track(track_id) for track_id in ids if track_id]}, {}
+        if path == '/api/token' and method == 'POST':
+            return 200, {
+                'access_token': f'stub-{time.time_ns()}',
+                'token_type': 'Bearer',
+                'expires_in': 3600,
+                'scope': 'user-library-read playlist-read-private user-read-private'
+            }, {}
+        return 404, {'error': {'status': 404, 'message': 'Not found'}}, {}
+
+    def _track(self, track_id):
+        return json.loads(json.dumps(self._responses['track_item']).replace('TRACK_ID', track_id))
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            # Una vez por conexion TCP (con keep-alive sirve varias peticiones).
+            # TCP_NODELAY: los headers y el cuerpo salen en dos writes y, con Nagle
+            # y el ACK retrasado del cliente, cada respuesta en una conexion
+            # reutilizada esperaria ~40 ms
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with stub._lock:
+                    stub.connections += 1
+
+            def _respond(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                stub.count(parsed.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload, headers = stub.route(method, parsed.path, parse_qs(parsed.query))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, str(value))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Servidor local que imita la API de Spotify')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    stub = StubSpotify(latency=args.latency_ms / 1000, port=args.port).start()
+    print(f'Stub de Spotify en {stub.api_url} (latencia {args.latency_ms} ms)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
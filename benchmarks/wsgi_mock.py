@@ -0,0 +1,9 @@
+import os
+from benchmarks.harness import load_app, seed_spotify_session
+
+# App para gunicorn con MongoDB en memoria (mongomock), usada por serving_modes.py
+# cuando no se pasa --mongo-uri. Cada worker tiene su propia base en memoria,
+# con la sesion y el token de Spotify del benchmark.
+songbox = load_app(os.environ['SPOTIFY_API_URL'])
+seed_spotify_session(songbox)
+app = songbox.app
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import tempfile
+
+# Configuracion de produccion de gunicorn (Procfile: gunicorn -c gunicorn.conf.py)
+#
+# GUNICORN_WORKLOAD elige el tipo de worker si no se fija GUNICORN_WORKER_CLASS:
+#   io  -> gthread: las rutas pasan la mayor parte del tiempo esperando a Spotify/MongoDB
+#   cpu -> sync: un proceso por nucleo para trabajo de CPU (hash de contrasenas)
+# GUNICORN_WORKER_CLASS=gevent activa el modo asincrono (ver README).
+
+workload = os.getenv('GUNICORN_WORKLOAD', 'io')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread' if workload == 'io' else 'sync')
+cores = multiprocessing.cpu_count()
+
+if worker_class == 'gevent':
+    # Con preload la app se importa en el master: hay que parchear antes
+    from gevent import monkey
+    monkey.patch_all()
+
+    default_workers = cores
+elif worker_class == 'gthread':
+    default_workers = cores + 1
+else:
+    default_workers = cores * 2 + 1
+
+workers = int(os.getenv('WEB_CONCURRENCY', default_workers))
+# La app lo lee para saber si sus caches en memoria son compartidos (preload_app)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 500))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+wsgi_app = 'app:app'
+
+# El codigo se carga una vez en el master y los workers lo comparten (copy-on-write)
+preload_app = True
+
+# Reciclar workers cada ~1000 peticiones; el jitter evita que se reinicien todos juntos
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+
+# Metricas de todos los workers en /metrics (ver metrics.py); sin la variable
+# cada /metrics muestra solo el worker que lo atiende
+if workers > 1:
+    os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'songbox-metrics-{os.getpid()}'))
+
+
+def on_starting(server):
+    from metrics import clear_multiproc_dir
+
+    clear_multiproc_dir()
+
+
+# Cada worker crea su propio cliente de MongoDB (los pools de PyMongo no son
+# seguros entre procesos) y su propio hilo de logs
+def post_fork(server, worker):
+    from app import init_mongo
+    from logging_config import restart_listener_after_fork
+    from metrics import start_snapshot_writer
+
+    restart_listener_after_fork()
+    init_mongo()
+    start_snapshot_writer()
+
+
+def worker_exit(server, worker):
+    from metrics import multiproc_dir, write_snapshot
+
+    if multiproc_dir():
+        write_snapshot(multiproc_dir())
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -1,26 +1,185 @@
-from flask import Flask, request, jsonify, redirect, session, url_for
+from flask import Flask, Response, request, jsonify, redirect, session, url_for
+from flask.cli import AppGroup
+import click
+import math
+import secrets
+import threading
+import time
 from flask_pymongo import PyMongo
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hash_password, verify_password, rehash_in_background, PasswordPoolBusy
 from datetime import datetime, timezone, timedelta
-from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required
-from marshmallow import Schema, fields, ValidationError
-from spotify_integration import create_spotify_oauth, get_spotify_token, refresh_spotify_token, spotify_token_required
-import spotipy
+from flask_jwt_extended import JWTManager, create_access_token, get_current_user, get_jwt_identity, jwt_required
+from marshmallow import EXCLUDE, Schema, fields, ValidationError
+from spotify_integration import create_spotify_oauth, get_spotify_client, get_app_spotify_client, get_spotify_token, spotify_token_required, token_manager
+from cache import create_search_cache, make_key
+from spotify_gateway import create_spotify_gateway, SpotifyThrottled
+from comments import get_comments_page, page_size, parent_summary, add_to_parents, update_in_parents, remove_from_parents, rebuild_comment_counters
+from catalog import normalize_name, album_from_spotify, song_from_spotify, ingest_albums, ingest_songs, upsert_album, upsert_song, backfill_name_norm, resolve_songs
+from local_search import create_local_search
+from catalog_import import CatalogImporter, Checkpoint, IMPORT_CHUNK_SIZE, import_file, import_artists, file_format, open_source
+from http_cache import create_response_cache
+from playlists import songs_operation_schema, apply_songs_operation
+from sessions import create_session_interface
+from token_store import create_token_store, session_token_key, user_token_key
+from token_refresher import create_token_refresher
+from users import create_user_cache, user_claims, UserContext, PROFILE_PROJECTION
+from trivia import create_answer_log, create_leaderboard, create_question_pool, trivia_scope, valid_tags, GLOBAL_SCOPE
+from indexes import ensure_indexes, check_indexes, explain_queries
 from dotenv import load_dotenv
+from logging_config import setup_logging
+from json_provider import create_json_provider
+import metrics
+import logging
 import os
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 
 # Carga variables de entorno
 load_dotenv()
 
 app = Flask(__name__)
+# Serializacion JSON con orjson (ObjectId, datetime y Decimal128 incluidos)
+app.json = create_json_provider(app)
+setup_logging(app)
+metrics.setup_metrics(app)
+logger = logging.getLogger('songbox.app')
 
 app.config["MONGO_URI"] = os.getenv('MONGO_URI')
 app.config["JWT_SECRET_KEY"] = os.getenv('JWT_SECRET_KEY')
 app.secret_key = os.getenv('SECRET_KEY', 'default_secret_key')
-mongo = PyMongo(app)
+# El cliente de MongoDB se crea por proceso en init_mongo(): con gunicorn
+# --preload el codigo se carga antes del fork y el pool no debe compartirse
+mongo = PyMongo()
 jwt = JWTManager(app)
+_mongo_lock = threading.Lock()
+
+# Antes el token de Spotify iba dentro de la sesion (`token_info`): se pasa al
+# store la primera vez que vuelve cada usuario
+def migrate_session_token(data):
+    token_info = data.pop('token_info', None)
+    if token_info:
+        key = session_token_key(secrets.token_urlsafe(16))
+        token_store.set(key, token_info)
+        data['spotify_token_key'] = key
+
+# Sesiones en el servidor (la cookie lleva solo el id) y tokens de Spotify compartidos
+session_interface = create_session_interface(lambda: mongo.db.sessions, migrate_session_token)
+if session_interface is not None:
+    app.session_interface = session_interface
+else:
+    # Con SESSION_BACKEND=cookie la sesion vieja sigue en la cookie
+    @app.before_request
+    def migrate_cookie_session():
+        if 'token_info' in session:
+            migrate_session_token(session)
+token_store = create_token_store(lambda: mongo.db.spotify_tokens)
+app.extensions['spotify_token_store'] = token_store
+
+# Refresca los tokens de Spotify en segundo plano antes de que venzan
+token_refresher = create_token_refresher(token_store, token_manager.refresh)
+
+# Crear los indices al arrancar, en segundo plano para no bloquear el inicio
+def provision_indexes():
+    created, errors = ensure_indexes(mongo.db)
+    for collection, error in errors.items():
+        logger.error("No se pudieron crear los indices de %s: %s", collection, error)
+
+# Crea el cliente de MongoDB del proceso (gunicorn lo llama en post_fork)
+def init_mongo():
+    with _mongo_lock:
+        if mongo.cx is not None:
+            return mongo
+        mongo.init_app(app, event_listeners=[metrics.MongoCommandListener()])
+
+    if os.getenv('MONGO_ENSURE_INDEXES', '1') == '1':
+        threading.Thread(target=provision_indexes, daemon=True).start()
+    if os.getenv('SPOTIFY_PREREFRESH', '1') == '1':
+        token_refresher.start()
+    return mongo
+
+# Si el proceso no paso por post_fork (flask run, tests) se crea en la primera peticion
+@app.before_request
+def ensure_mongo():
+    if mongo.cx is None:
+        init_mongo()
+
+# App lista para servir (python app.py, flask --app "app:create_app()")
+def create_app():
+    init_mongo()
+    return app
+
+# Cache de busquedas de Spotify
+search_cache = create_search_cache()
+
+# Limite de llamadas a Spotify, Retry-After y llamadas identicas juntadas en una
+spotify_gateway = create_spotify_gateway()
+
+# Busqueda en el catalogo local antes de ir a Spotify
+local_search = create_local_search()
+
+# Cache de respuestas (con ETag) de las lecturas publicas de playlist y trivia
+response_cache = create_response_cache()
+
+# Cache de perfiles de usuario (memoria y, opcional, Redis)
+user_cache = create_user_cache()
+
+# Respuestas de trivia (escritas en lotes) y leaderboards pre-agregados
+answer_log = create_answer_log(lambda: mongo.db.trivia_answers)
+leaderboard = create_leaderboard(lambda: mongo.db.leaderboards)
+TRIVIA_POINTS = 1
+
+# Pool de preguntas de /trivia/next (las mas recientes, refrescado periodicamente)
+TRIVIA_POOL_SIZE = int(os.getenv('TRIVIA_POOL_SIZE', 10000))
+
+def load_trivia_pool():
+    cursor = mongo.db.trivia.find(
+        {}, {'question': 1, 'options': 1, 'album_id': 1, 'song_id': 1, 'tags': 1, 'created_at': 1}
+    ).sort('_id', -1).limit(TRIVIA_POOL_SIZE)
+    return [{
+        'id': str(trivia['_id']),
+        'question': trivia['question'],
+        'options': trivia['options'],
+        'album_id': trivia.get('album_id'),
+        'song_id': trivia.get('song_id'),
+        'tags': trivia.get('tags', []),
+        'created_at': trivia['created_at']
+    } for trivia in cursor]
+
+question_pool = create_question_pool(load_trivia_pool, lambda: mongo.db.trivia_seen)
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MAX_SIZE = 100
+
+metrics.register(metrics.Gauges(
+    'songbox_search_cache', 'Contadores del cache de busquedas de Spotify', ('stat',),
+    lambda: [((k,), v) for k, v in search_cache.stats().items()]
+))
+metrics.register(metrics.Gauges(
+    'songbox_response_cache', 'Cache de respuestas de playlist y trivia', ('stat',),
+    lambda: [((k,), v) for k, v in response_cache.stats().items()]
+))
+metrics.register(metrics.Gauges(
+    'songbox_trivia_answers', 'Escritura en lotes de respuestas de trivia', ('stat',),
+    lambda: [((k,), v) for k, v in answer_log.stats().items()]
+))
+metrics.register(metrics.Gauges(
+    'songbox_user_cache', 'Cache de perfiles de usuario', ('stat',),
+    lambda: [((k,), v) for k, v in user_cache.stats().items()]
+))
+metrics.register(metrics.Gauges(
+    'songbox_spotify_gateway', 'Cola y limite de llamadas a Spotify', ('stat',),
+    lambda: [((k,), v) for k, v in spotify_gateway.stats().items()]
+))
+metrics.register(metrics.Gauges(
+    'songbox_token_refresher', 'Refresco en segundo plano de tokens de Spotify', ('stat',),
+    lambda: [((k,), v) for k, v in token_refresher.stats().items()]
+))
+metrics.register(metrics.Gauges(
+    'songbox_local_search', 'Busqueda en el catalogo local', ('stat',),
+    lambda: [((k,), v) for k, v in local_search.stats().items()]
+))
 
 # Validacion de datos de usuario
 class UserSchema(Schema):
@@ -30,6 +189,20 @@ class UserSchema(Schema):
 
 user_schema = UserSchema()
 
+def not_blank(value):
+    if not value.strip():
+        raise ValidationError('No puede estar vacio')
+
+# Campos editables con PUT /profile; los demas se ignoran
+class ProfileSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    username = fields.Str(validate=not_blank)
+    profile_picture = fields.Str(validate=not_blank)
+
+profile_schema = ProfileSchema()
+
 # Error para datos invalidos
 @app.errorhandler(ValidationError)
 def handle_validation_error(e):
@@ -48,8 +221,8 @@ def register_user():
             return jsonify({'message': 'El usuario ya existe'}), 409
         
 
-        # Hasheo de contrasena
-        hashed_password = generate_password_hash(data['password'])
+        # Hasheo de contrasena (en el pool de hash, fuera del hilo de la peticion)
+        hashed_password = hash_password(data['password'])
 
         user_data ={
             'username': data['username'], 
@@ -57,12 +230,14 @@ def register_user():
             'password': hashed_password, 
             'created_at': datetime.now(timezone.utc).isoformat(), 
             'favorites': [], 
-            'trivia_scores' : [],
             'profile_picture' : ""
         }
 
-        # Insertar usuario
-        result = mongo.db.users.insert_one(user_data)
+        # Insertar usuario (el indice unique cubre registros simultaneos)
+        try:
+            result = mongo.db.users.insert_one(user_data)
+        except DuplicateKeyError:
+            return jsonify({'message': 'El usuario ya existe'}), 409
         response = {
             'id': str(result.inserted_id),  # id del usuario insertado
             'username': data['username'],
@@ -74,6 +249,8 @@ def register_user():
 
     except ValidationError as e:
         return handle_validation_error(e)
+    except PasswordPoolBusy:
+        return jsonify({'message': 'Servidor ocupado, intenta de nuevo'}), 503
     
 
 @app.route('/login', methods=['POST'])
@@ -88,33 +265,95 @@ def login_user():
     # Buscar por email
     user = mongo.db.users.find_one({'email': email})
 
-    if not user or not check_password_hash(user['password'], password):
+    try:
+        valid = user is not None and verify_password(user['password'], password)
+    except PasswordPoolBusy:
+        return jsonify({'message': 'Servidor ocupado, intenta de nuevo'}), 503
+
+    if not valid:
         return jsonify({'message': 'Credenciales invalidas'}), 401
 
-    # Creacion token con email como identidad
+    # Si cambio el algoritmo o sus parametros se actualiza el hash guardado
+    rehash_in_background(mongo.db.users, user['_id'], user['password'], password)
+
+    return jsonify({'token': user_token(user)}), 200
+
+# Token con email como identidad; id y nombre van como claims para no buscar al usuario en cada peticion
+def user_token(user):
     expires = timedelta(hours=1)
-    access_token = create_access_token(identity=email, expires_delta=expires)
+    return create_access_token(identity=user['email'], additional_claims=user_claims(user), expires_delta=expires)
+
+def load_profile(email):
+    return mongo.db.users.find_one({'email': email}, PROFILE_PROJECTION)
 
-    return jsonify({'token': access_token}), 200
+# Usuario de cada peticion autenticada: se arma con los claims, sin consultar MongoDB
+@jwt.user_lookup_loader
+def load_user_context(jwt_header, jwt_data):
+    return UserContext(jwt_data, user_cache, load_profile)
 
 # Ruta peotegida para obtener info
 @app.route('/profile', methods=['GET'])
 @jwt_required()
 def user_profile():
-    # Obtener identidad del token
-    current_user = get_jwt_identity()
-    user = mongo.db.users.find_one({'email' : current_user},{'_id':0, 'password': 0})
+    # Perfil del usuario del token (cacheado)
+    user = get_current_user().profile
 
     if not user:
         return jsonify({'message': 'Usuario no encotrado'}), 404
     
     return jsonify(user), 200
 
+# Actualizar nombre o foto de perfil
+@app.route('/profile', methods=['PUT'])
+@jwt_required()
+def update_profile():
+    current_user = get_jwt_identity()
+    update_data = profile_schema.load(request.get_json() or {})
+    if not update_data:
+        return jsonify({'message': 'No hay datos para actualizar'}), 400
+
+    user = mongo.db.users.find_one_and_update(
+        {'email': current_user}, {'$set': update_data},
+        projection={'email': 1, 'username': 1}, return_document=ReturnDocument.AFTER
+    )
+    if not user:
+        return jsonify({'message': 'Usuario no encotrado'}), 404
+    user_cache.invalidate(current_user)
+
+    # Token nuevo con el nombre actualizado en los claims
+    return jsonify({'message': 'Perfil actualizado exitosamente', 'token': user_token(user)}), 200
+
+# Contadores internos (cache de busquedas y busqueda local)
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'search_cache': search_cache.stats(),
+        'spotify_gateway': spotify_gateway.stats(),
+        'local_search': local_search.stats(),
+        'response_cache': response_cache.stats(),
+        'trivia_answers': answer_log.stats(),
+        'trivia_pool': question_pool.stats(),
+        'user_cache': user_cache.stats(),
+        'token_refresher': token_refresher.stats()
+    }), 200
+
+# Metricas en formato texto de Prometheus
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Errores rutas no encontradas
 @app.errorhandler(404)
 def not_found(e):
     return jsonify({"error": "Ruta no encotrada"}), 404
 
+# Spotify limitado y sin resultado en cache: el cliente reintenta despues de Retry-After
+@app.errorhandler(SpotifyThrottled)
+def spotify_throttled(e):
+    response = jsonify({"error": "Spotify esta ocupado, intenta de nuevo en unos segundos"})
+    response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+    return response, 503
+
 # Errores genericos
 @app.errorhandler(500)
 def internal_server_error(e):
@@ -138,33 +377,72 @@ def callback():
 
     if code:
         try:
-            print(f"Codigo de autorizacion recibido: {code}")
-            token_info = sp_oauth.get_access_token(code)
-            print(f"Token info: {token_info}")
-            session['token_info'] = token_info
-            print("Token de Spotify almacenado:", token_info)
+            logger.debug("Codigo de autorizacion recibido")
+            token_info = sp_oauth.get_access_token(code, check_cache=False)
+            # La sesion guarda solo la clave; el token queda en el store compartido
+            key = session.get('spotify_token_key') or session_token_key(secrets.token_urlsafe(16))
+            token_store.set(key, token_info)
+            session['spotify_token_key'] = key
+            logger.info("Token de Spotify almacenado", extra={'expires_at': token_info.get('expires_at')})
             return redirect(url_for('home'))
         except Exception as e:
+            logger.warning("Error al obtener el token de acceso de Spotify: %s", e)
             return jsonify({"message": f"Error al obtener el token de acceso de Spotify: {str(e)}"}), 400
     else:
-        print("Codigo de autorizacion no recibido")
+        logger.info("Codigo de autorizacion no recibido")
         return jsonify({"message": "Error: No se ha recibido el código de autorización de Spotify"}), 400
 
+# Vincula el token de Spotify de esta sesion a la cuenta del usuario: desde
+# cualquier dispositivo con su JWT se usa el mismo token (y sus refresh)
+@app.route('/spotify/link', methods=['POST'])
+@jwt_required()
+def link_spotify():
+    key = session.get('spotify_token_key')
+    token_info = token_store.get(key) if key else None
+    if not token_info:
+        return jsonify({'message' : 'Por favor, inicia sesion en Spotify'}), 401
+
+    user_key = user_token_key(get_jwt_identity())
+    if key != user_key:
+        token_store.set(user_key, token_info)
+        token_store.delete(key)
+        session['spotify_token_key'] = user_key
+    return jsonify({'message': 'Cuenta de Spotify vinculada'}), 200
+
 @app.route('/home')
 def home():
     token_info = get_spotify_token()
-    print("Token en /home", token_info)
     if token_info:
-        sp_oauth = create_spotify_oauth()
-        refresh_spotify_token(sp_oauth)
-        sp = spotipy.Spotify(auth=token_info['access_token'])
-        user_profile = sp.current_user()
+        sp = get_spotify_client(token_info['access_token'])
+        user_profile = spotify_gateway.call(None, sp.current_user, 'me')
         return f"Bievenido, {user_profile['display_name']}!"
     return "Por favor, inicia sesion"
 
 
+# Busqueda en Spotify con cache; el tiempo real de Spotify se mide para las metricas.
+# Las busquedas iguales en curso (de cualquier usuario) se juntan en una sola llamada,
+# y si Spotify esta limitado el cache sigue sirviendo las entradas vencidas.
+def spotify_search(sp, query, kind):
+    fetch = lambda: local_search.timed_remote(sp.search, q=query, type=kind)
+    return search_cache.get_or_fetch(query, kind, lambda: spotify_gateway.call(('search', make_key(kind, query)), fetch))
+
 # --------------------------- Coleccion Album -------------------------
 
+ALBUM_FIELDS = {'album_id': 1, 'name': 1, 'artist': 1, 'release_date': 1, 'comment_count': 1, 'recent_comments': 1}
+
+# Respuesta de /search_album a partir de los datos del album y su resumen de comentarios
+def album_response(album, parent):
+    recent, comment_count, next_cursor = parent_summary(parent)
+    return {
+        'album_id': album['album_id'],
+        'name': album['name'],
+        'artist': album['artist'],
+        'release_date': album['release_date'],  # Fecha de lanzamiento
+        'comments': [comment['text'] for comment in recent],
+        'comment_count': comment_count,
+        'comments_next': next_cursor
+    }
+
 # Crear  album
 @app.route('/albums', methods=['POST'])
 @jwt_required()
@@ -183,12 +461,16 @@ def create_album():
     album_data = {
         'album_id' : album_id,
         'name' : name,
+        'name_norm' : normalize_name(name),
         'artist' : artist,
         'created_at' : datetime.now(timezone.utc).isoformat()
     }
 
     # Insertar el album en la coleccion
-    result = mongo.db.albums.insert_one(album_data)
+    try:
+        result = mongo.db.albums.insert_one(album_data)
+    except DuplicateKeyError:
+        return jsonify({'message' : 'El album ya existe'}), 409
     
     respose = {
         'id' : str(result.inserted_id),
@@ -210,38 +492,27 @@ def search_album():
     if token_info is None:
         return jsonify({'error': 'No hay token de Spotify disponible, inicia sesión'}), 401
 
+    # Primero el catalogo local; Spotify solo si no hay un resultado confiable
+    album = local_search.find(mongo.db, 'album', album_name, ALBUM_FIELDS)
+    if album:
+        return jsonify(album_response(album, album)), 200
+
     # Conecta con la API de Spotify
-    sp = spotipy.Spotify(auth=token_info['access_token'])
+    sp = get_spotify_client(token_info['access_token'])
     
     # Busca el álbum
-    results = sp.search(q=album_name, type='album')
+    results = spotify_search(sp, album_name, 'album')
 
     if results['albums']['items']:
         album_data = results['albums']['items'][0]
         album_id = album_data['id']
 
-        # Verifica si el álbum ya está en la base de datos
-        existing_album = mongo.db.albums.find_one({'album_id': album_id})
-        if not existing_album:
-            # Guardar los datos relevantes en la colección
-            mongo.db.albums.insert_one({
-                'album_id': album_id,
-                'name': album_data['name'],
-                'artist': [artist['name'] for artist in album_data['artists']],
-                'created_at': datetime.now(timezone.utc).isoformat()
-            })
-
-        # Buscar comentarios en la colección
-        comments = mongo.db.comments.find({'album_id': album_id})
-        comments_list = [comment['text'] for comment in comments]
-
-        return jsonify({
-            'album_id': album_id,
-            'name': album_data['name'],
-            'artist': [artist['name'] for artist in album_data['artists']],
-            'release_date': album_data['release_date'],  # Fecha de lanzamiento
-            'comments': comments_list
-        }), 200
+        # Guardar todos los albumes de la pagina en la coleccion (upsert en lote)
+        ingest_albums(mongo.db, results['albums']['items'])
+
+        # Contador y ultimos comentarios guardados en el documento; el resto en /albums/<id>/comments
+        parent = mongo.db.albums.find_one({'album_id': album_id}, {'comment_count': 1, 'recent_comments': 1})
+        return jsonify(album_response(album_from_spotify(album_data), parent)), 200
     else:
         return jsonify({'error': 'Álbum no encontrado en Spotify'}), 404
 
@@ -265,6 +536,7 @@ def update_album(album_id):
     update_data = {}
     if name:
         update_data['name'] = name
+        update_data['name_norm'] = normalize_name(name)
     if artist:
         update_data['artist'] = artist
     
@@ -294,6 +566,22 @@ def delete_album(album_id):
 
 # ---------------------------- Coleccion canciones ----------------------------
 
+SONG_FIELDS = {'song_id': 1, 'name': 1, 'artist': 1, 'album': 1, 'release_date': 1, 'comment_count': 1, 'recent_comments': 1}
+
+# Respuesta de /search_song a partir de los datos de la cancion y su resumen de comentarios
+def song_response(song, parent):
+    recent, comment_count, next_cursor = parent_summary(parent)
+    return {
+        'song_id': song['song_id'],
+        'name': song['name'],
+        'artist': song['artist'],
+        'album': song['album'],  # Nombre del álbum
+        'release_date': song['release_date'],  # Fecha de lanzamiento
+        'comments': [comment['text'] for comment in recent],
+        'comment_count': comment_count,
+        'comments_next': next_cursor
+    }
+
 # Creacion cancion
 @app.route('/songs', methods=['POST'])
 @jwt_required()
@@ -311,12 +599,17 @@ def create_songs():
     song_data = {
         'song_id' : song_id,
         'name' : name,
+        'name_norm' : normalize_name(name),
         'album_id' : album_id,
         'created_at' : datetime.now(timezone.utc).isoformat()
     }
 
     # Insertar a coleccion
-    result = mongo.db.songs.insert_one(song_data)
+    try:
+        result = mongo.db.songs.insert_one(song_data)
+    except DuplicateKeyError:
+        return jsonify({'message' : 'La cancion ya existe'}), 409
+    invalidate_song_playlists(song_id)
 
     response = {
         'id' : str(result.inserted_id),
@@ -327,6 +620,34 @@ def create_songs():
     }
     return jsonify(response), 201
 
+# Alta en lote de albumes y canciones: una lista de objetos como los de POST
+# /albums y /songs, guardada con los mismos lotes que `flask catalog import`.
+# Los que ya existen no se modifican; los invalidos se reportan por indice.
+CATALOG_BULK_MAX = int(os.getenv('CATALOG_BULK_MAX', 1000))
+
+def bulk_create(kind):
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        return jsonify({'message': 'Se espera una lista de objetos'}), 400
+    if len(records) > CATALOG_BULK_MAX:
+        return jsonify({'message': f'Maximo {CATALOG_BULK_MAX} objetos por peticion'}), 413
+
+    importer = CatalogImporter(mongo.db)
+    for index, record in enumerate(records):
+        importer.add_record(kind, record, index)
+    importer.flush()
+    return jsonify({**importer.counts[kind], 'errors': importer.errors}), 200
+
+@app.route('/albums/bulk', methods=['POST'])
+@jwt_required()
+def create_albums_bulk():
+    return bulk_create('albums')
+
+@app.route('/songs/bulk', methods=['POST'])
+@jwt_required()
+def create_songs_bulk():
+    return bulk_create('songs')
+
 # Lectura de cancion
 @app.route('/search_song', methods=['GET'])
 @spotify_token_required
@@ -338,39 +659,27 @@ def search_song():
     if token_info is None:
         return jsonify({'error': 'No hay token de Spotify disponible, inicia sesión'}), 401
 
+    # Primero el catalogo local; Spotify solo si no hay un resultado confiable
+    song = local_search.find(mongo.db, 'track', song_name, SONG_FIELDS)
+    if song:
+        return jsonify(song_response(song, song)), 200
+
     # Conecta con la API de Spotify
-    sp = spotipy.Spotify(auth=token_info['access_token'])
+    sp = get_spotify_client(token_info['access_token'])
     
     # Busca la canción
-    results = sp.search(q=song_name, type='track')
+    results = spotify_search(sp, song_name, 'track')
 
     if results['tracks']['items']:
         song_data = results['tracks']['items'][0]
         song_id = song_data['id']
         
-        # Verifica si la canción ya está en la base de datos
-        existing_song = mongo.db.songs.find_one({'song_id': song_id})
-        if not existing_song:
-            # Guardar los datos relevantes en la colección
-            mongo.db.songs.insert_one({
-                'song_id': song_id,
-                'name': song_data['name'],
-                'album_id': song_data['album']['id'],  # Almacena el ID del álbum
-                'created_at': datetime.now(timezone.utc).isoformat()
-            })
-
-        # Buscar comentarios en la colección
-        comments = mongo.db.comments.find({'song_id': song_id})
-        comments_list = [comment['text'] for comment in comments]
-
-        return jsonify({
-            'song_id': song_id,
-            'name': song_data['name'],
-            'artist': [artist['name'] for artist in song_data['artists']],
-            'album': song_data['album']['name'],  # Nombre del álbum
-            'release_date': song_data['album']['release_date'],  # Fecha de lanzamiento
-            'comments': comments_list
-        }), 200
+        # Guardar todas las canciones de la pagina en la coleccion (upsert en lote)
+        ingest_songs(mongo.db, results['tracks']['items'])
+
+        # Contador y ultimos comentarios guardados en el documento; el resto en /songs/<id>/comments
+        parent = mongo.db.songs.find_one({'song_id': song_id}, {'comment_count': 1, 'recent_comments': 1})
+        return jsonify(song_response(song_from_spotify(song_data), parent)), 200
     else:
         return jsonify({'error': 'Canción no encontrada en Spotify'}), 404
 
@@ -395,11 +704,13 @@ def update_song(song_id):
     update_data = {}
     if name:
         update_data['name'] = name
+        update_data['name_norm'] = normalize_name(name)
     if album_id:
         update_data['album_id'] = album_id
     
     # Actualizar cancion en la coleccion
     mongo.db.songs.update_one({'song_id': song_id}, {'$set':update_data})
+    invalidate_song_playlists(song_id)
     
     return jsonify({'message' : 'Cancion actualizada exitosamente'}), 200
 
@@ -419,11 +730,34 @@ def delete_song(song_id):
     
     # Eliminar cancion
     mongo.db.songs.delete_one({'_id': ObjectId(song_id)})
+    invalidate_song_playlists(song['song_id'])
 
     return jsonify({'message' : 'Cancion eliminada exitosamente'})
 
 # ----------------------- Coleccion comentarios ----------------------
 
+# Comentarios paginados de un album o cancion (ID SPOTIFY)
+# ?cursor=<id del ultimo comentario recibido>&limit=<tamano de pagina>
+def comments_page_response(field, value):
+    try:
+        comments, next_cursor = get_comments_page(
+            mongo.db, field, value,
+            cursor=request.args.get('cursor'),
+            limit=page_size(request.args.get('limit'))
+        )
+    except InvalidId:
+        return jsonify({'message': 'Cursor invalido'}), 400
+
+    return jsonify({'comments': comments, 'next_cursor': next_cursor}), 200
+
+@app.route('/albums/<string:album_id>/comments', methods=['GET'])
+def get_album_comments(album_id):
+    return comments_page_response('album_id', album_id)
+
+@app.route('/songs/<string:song_id>/comments', methods=['GET'])
+def get_song_comments(song_id):
+    return comments_page_response('song_id', song_id)
+
 @app.route('/comments', methods=['POST'])
 @jwt_required()
 def create_comment():
@@ -431,7 +765,6 @@ def create_comment():
 
     # Obtener el token de Spotify
     token_info = get_spotify_token()
-    print("Token de spotify en comentarios:", token_info)
     if token_info is None:
         return jsonify({'message': 'No se ha podido obtener el token de Spotify, inicia sesión'}), 401
 
@@ -450,31 +783,33 @@ def create_comment():
     album_id = None
     song_id = None
 
-    # Buscar el ID del álbum por su nombre
+    # Buscar el ID del álbum por su nombre (siempre el ID de Spotify)
     if album_name:
-        album = mongo.db.albums.find_one({'name': album_name})
+        album = local_search.find(mongo.db, 'album', album_name, {'album_id': 1}, require_details=False)
         if not album:
-            sp = spotipy.Spotify(auth=token_info['access_token'])
-            results = sp.search(q=album_name, type='album')
+            sp = get_spotify_client(token_info['access_token'])
+            results = spotify_search(sp, album_name, 'album')
             if results['albums']['items']:
                 album_id = results['albums']['items'][0]['id']  # Usar el ID de Spotify
+                upsert_album(mongo.db, results['albums']['items'][0])
             else:
                 return jsonify({'message': 'Álbum no encontrado'}), 404
         else:
-            album_id = str(album['_id'])    
+            album_id = album['album_id']
 
     # Buscar la canción por su nombre
     if song_name:
-        song = mongo.db.songs.find_one({'name': song_name})
+        song = local_search.find(mongo.db, 'track', song_name, {'song_id': 1}, require_details=False)
         if not song:
-            sp = spotipy.Spotify(auth=token_info['access_token'])
-            results = sp.search(q=song_name, type='track')
+            sp = get_spotify_client(token_info['access_token'])
+            results = spotify_search(sp, song_name, 'track')
             if results['tracks']['items']:
                 song_id = results['tracks']['items'][0]['id']  # Usar el ID de Spotify
+                upsert_song(mongo.db, results['tracks']['items'][0])
             else:
                 return jsonify({'message': 'Canción no encontrada'}), 404
         else:
-            song_id = str(song['_id'])  
+            song_id = song['song_id']
 
     # Crear el comentario
     comment_data = { 
@@ -487,6 +822,9 @@ def create_comment():
     }
     result = mongo.db.comments.insert_one(comment_data)
 
+    # Contador y ultimos comentarios del album/cancion
+    add_to_parents(mongo.db, comment_data)
+
     response = {
         'id': str(result.inserted_id),
         'user': current_user,
@@ -524,6 +862,7 @@ def update_comment(comment_id):
         return jsonify({'message' : 'El texto del comentario es requerido'}), 400 
     
     mongo.db.comments.update_one({'_id' : ObjectId(comment_id)}, {'$set': {'text': new_text}})
+    update_in_parents(mongo.db, comment, new_text)
 
     return jsonify({'message' : 'Comentario actualizado exitosamente'}), 200
 
@@ -544,7 +883,9 @@ def delete_comment(comment_id):
         return jsonify({'message': 'No tienes permiso de edicion'}), 403
 
     # Eliminar comentario
-    mongo.db.comments.delete_one({'_id' : ObjectId(comment_id)})
+    result = mongo.db.comments.delete_one({'_id' : ObjectId(comment_id)})
+    if result.deleted_count:
+        remove_from_parents(mongo.db, comment)
 
     return jsonify({'message' : 'Comentario elimiando correctamete'}), 200
     
@@ -556,6 +897,20 @@ def delete_comment(comment_id):
 
 # Creacion de playlist
 
+PLAYLIST_SONG_FIELDS = {'song_id': 1, 'name': 1, 'artist': 1, 'album': 1, 'album_id': 1, 'release_date': 1}
+
+def playlist_song_response(song):
+    if song is None:
+        return None
+    return {field: song.get(field) for field in PLAYLIST_SONG_FIELDS}
+
+# Las canciones que no estan en el catalogo se piden a Spotify con el token del
+# usuario si inicio sesion, si no con las credenciales de la app
+def playlist_tracks_fetcher():
+    token_info = get_spotify_token()
+    sp = get_spotify_client(token_info['access_token']) if token_info else get_app_spotify_client()
+    return lambda ids: spotify_gateway.call(('tracks', tuple(ids)), lambda: local_search.timed_remote(sp.tracks, ids))
+
 @app.route('/playlist', methods=['POST'])
 @jwt_required()
 def create_playlist():
@@ -577,8 +932,8 @@ def create_playlist():
         'songs' : songs,
         'user' : current_user,
         'created_at' : datetime.now(timezone.utc).isoformat(),
-        'comments' : []
-        
+        'comments' : [],
+        'version' : 0
     }
 
     # Insertar en la coleccion 
@@ -589,6 +944,7 @@ def create_playlist():
         'name' : name,
         'description' : description,
         'songs' : songs,
+        'version' : 0,
         'created_at' : playlist_data['created_at']
     }
     return jsonify(response), 201
@@ -596,20 +952,37 @@ def create_playlist():
 # Obtener una playlist por su ID DE MONGO
 @app.route('/playlist/<string:playlist_id>', methods=['GET']) 
 def get_playlist(playlist_id):
-    # Buscar en la base de datos
-    playlist = mongo.db.playlist.find_one({'_id' : ObjectId(playlist_id)})
-
-    if not playlist:
+    # ?expand=songs devuelve los datos de cada cancion en vez de solo los ids
+    expand = request.args.get('expand') == 'songs'
+
+    # Buscar en la base de datos (solo si no esta en el cache de respuestas)
+    def load():
+        playlist = mongo.db.playlist.find_one({'_id' : ObjectId(playlist_id)})
+        if not playlist:
+            return None
+        songs = playlist['songs']
+        complete = True
+        if expand:
+            resolved, complete = resolve_songs(
+                mongo.db, songs, PLAYLIST_SONG_FIELDS, fetch_tracks=playlist_tracks_fetcher()
+            )
+            songs = [playlist_song_response(song) for song in resolved]
+        # Si Spotify fallo o estaba limitado las canciones sin resolver van en null:
+        # esa respuesta no se guarda en el cache
+        return {
+            'id' : str(playlist['_id']),
+            'name' : playlist['name'],
+            'description' : playlist.get('description',''),
+            'songs' : songs,
+            'comments' : playlist['comments'],
+            'version' : playlist.get('version', 0),
+            'created_at' : playlist['created_at']
+        }, complete
+
+    response = response_cache.serve('playlist_songs' if expand else 'playlist', playlist_id, load)
+    if response is None:
         return jsonify({'message': 'Playlist no encontrada'}), 404
-    
-    return jsonify({
-        'id' : str(playlist['_id']),
-        'name' : playlist['name'],
-        'description' : playlist.get('description',''),
-        'songs' : playlist['songs'],
-        'comments' : playlist['comments'],
-        'created_at' : playlist['created_at']
-    }), 200
+    return response
 
 # Actualizar la playlist DE MONGO
 @app.route('/playlist/<string:playlist_id>', methods=['PUT'])
@@ -638,10 +1011,49 @@ def update_playlist(playlist_id):
     if 'songs' in data:
         update_data['songs'] = data['songs']
 
-    # Actualizar coleccio
-    mongo.db.playlist.update_one({'_id': ObjectId(playlist_id)}, {'$set': update_data})
+    # Actualizar coleccio (la version sube para que los PATCH concurrentes lo detecten)
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    mongo.db.playlist.update_one({'_id': ObjectId(playlist_id)}, {'$set': update_data, '$inc': {'version': 1}})
+    invalidate_playlist(playlist_id)
     return jsonify({'message': 'Playlist actualizada exitosamente'}), 200
 
+# Agregar, quitar o mover canciones sin reenviar la lista completa
+@app.route('/playlist/<string:playlist_id>/songs', methods=['PATCH'])
+@jwt_required()
+def patch_playlist_songs(playlist_id):
+    current_user = get_jwt_identity()
+    operation = songs_operation_schema.load(request.get_json() or {})
+
+    try:
+        playlist_oid = ObjectId(playlist_id)
+    except InvalidId:
+        return jsonify({'message': 'Id de playlist invalido'}), 400
+
+    updated = apply_songs_operation(mongo.db.playlist, playlist_oid, current_user, operation)
+    if updated:
+        invalidate_playlist(playlist_id)
+        return jsonify({'message': 'Playlist actualizada exitosamente', 'version': updated['version']}), 200
+
+    # No se aplico: averiguar por que
+    playlist = mongo.db.playlist.find_one({'_id': playlist_oid}, {'user': 1, 'version': 1})
+    if not playlist:
+        return jsonify({'message' : 'Playlist no encontrada'}), 404
+    if playlist['user'] != current_user:
+        return jsonify({'message' : 'No tienes permiso para modificar esta playlist'}), 403
+    if playlist.get('version', 0) != operation['version']:
+        return jsonify({'message': 'La playlist fue modificada por otro editor', 'version': playlist.get('version', 0)}), 409
+    return jsonify({'message': 'Posicion fuera de rango'}), 400
+
+def invalidate_playlist(playlist_id):
+    response_cache.invalidate('playlist', playlist_id)
+    response_cache.invalidate('playlist_songs', playlist_id)
+
+# Las respuestas con ?expand=songs llevan los datos de cada cancion: al cambiar
+# una cancion se invalidan las playlists que la tienen
+def invalidate_song_playlists(song_id):
+    for playlist in mongo.db.playlist.find({'songs': song_id}, {'_id': 1}):
+        response_cache.invalidate('playlist_songs', str(playlist['_id']))
+
 # Eliminar una playlist ID MONGO
 @app.route('/playlist/<string:playlist_id>', methods=['DELETE'])
 @jwt_required()
@@ -661,6 +1073,7 @@ def delete_playlist(playlist_id):
     
     #Elimiar playlist
     mongo.db.playlist.delete_one({'_id': ObjectId(playlist_id)})
+    invalidate_playlist(playlist_id)
 
     return jsonify({'message': 'Playlist eliminada exitosamente'}), 200
 
@@ -682,6 +1095,8 @@ def create_trivia():
 
     if not question or not options or not correct_answer:
         return jsonify({'message': 'Faltan datos necesarios para para crear la trivida'}), 400
+    if not valid_tags(data.get('tags', [])):
+        return jsonify({'message': 'Los tags deben ser una lista de textos'}), 400
     
     # Crear el documentos de trivia
     trivia_data = {
@@ -690,15 +1105,22 @@ def create_trivia():
         'correct_answer' : correct_answer,
         'user' : current_user,
         'created_at' : datetime.now(timezone.utc).isoformat(),
-        'answer' : [] # Guardado de respuestas
+        # Filtros de /trivia/next (opcionales)
+        'album_id' : data.get('album_id'),
+        'song_id' : data.get('song_id'),
+        'tags' : data.get('tags', [])
     }
 
     result = mongo.db.trivia.insert_one(trivia_data)
+    question_pool.invalidate()
 
     response = {
         'id' : str(result.inserted_id),
         'question' : question,
         'options' : options,
+        'album_id' : trivia_data['album_id'],
+        'song_id' : trivia_data['song_id'],
+        'tags' : trivia_data['tags'],
         'created_at' : trivia_data['created_at']    
     }
     return jsonify(response), 201
@@ -706,17 +1128,21 @@ def create_trivia():
 # Obtener trivia por id MONGO
 @app.route('/trivia/<string:trivia_id>', methods=['GET']) 
 def get_trivia(trivia_id):
-    trivia = mongo.db.trivia.find_one({'_id': ObjectId(trivia_id)})
-
-    if not trivia:
+    def load():
+        trivia = mongo.db.trivia.find_one({'_id': ObjectId(trivia_id)}, {'answer': 0})
+        if not trivia:
+            return None
+        return {
+            'id' : str(trivia['_id']),
+            'question' : trivia['question'],
+            'options' : trivia['options'],
+            'created_at' : trivia['created_at']
+        }, True
+
+    response = response_cache.serve('trivia', trivia_id, load)
+    if response is None:
         return jsonify({'message' : 'Trivia no encontrada'}), 404
-    
-    return jsonify({
-        'id' : str(trivia['_id']),
-        'question' : trivia['question'],
-        'options' : trivia['options'],
-        'created_at' : trivia['created_at']
-    }), 200
+    return response
 
 # Actualizar trivia ID MONGO
 @app.route('/trivia/<string:trivia_id>', methods=['PUT'])
@@ -735,6 +1161,9 @@ def update_trivia(trivia_id):
     if trivia['user'] != current_user:
         return jsonify({'message': 'No tienes permiso para modificar'}), 403
     
+    if 'tags' in data and not valid_tags(data['tags']):
+        return jsonify({'message': 'Los tags deben ser una lista de textos'}), 400
+
     # Actualizar los campos necesarios
     update_data = {}
     if 'question' in data:
@@ -743,8 +1172,14 @@ def update_trivia(trivia_id):
         update_data['options'] = data['options']
     if 'correct_answer' in data:
         update_data['correct_answer'] = data['correct_answer']
+    for field in ('album_id', 'song_id', 'tags'):
+        if field in data:
+            update_data[field] = data[field]
 
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
     mongo.db.trivia.update_one({'_id' : ObjectId(trivia_id)}, {'$set': update_data})
+    response_cache.invalidate('trivia', trivia_id)
+    question_pool.invalidate()
 
     return jsonify({'message' : 'Trivia actualizada correctamente'}), 200
 
@@ -764,11 +1199,184 @@ def delete_trivia(trivia_id):
         return jsonify({'message' : 'No tienes permiso para eliminar la trivia'}), 403
     
     mongo.db.trivia.delete_one({'_id': ObjectId(trivia_id)})
+    response_cache.invalidate('trivia', trivia_id)
+    leaderboard.remove_trivia(trivia_id)
+    question_pool.invalidate()
 
     return jsonify({'message' : 'Trivia eliminada correctamente'}), 200
-    
+
+# Siguiente pregunta para el usuario, sin repetir las que ya vio.
+# Filtros opcionales: ?album_id=, ?song_id=, ?tag=
+@app.route('/trivia/next', methods=['GET'])
+@jwt_required()
+def next_trivia():
+    filters = {key: request.args[key] for key in ('album_id', 'song_id', 'tag') if request.args.get(key)}
+    question = question_pool.next(get_jwt_identity(), filters)
+    if question is None:
+        return jsonify({'message': 'No quedan preguntas nuevas'}), 404
+    return jsonify(question), 200
+
+# Responder una trivia: solo la primera respuesta de cada usuario suma puntos
+@app.route('/trivia/<string:trivia_id>/answer', methods=['POST'])
+@jwt_required()
+def answer_trivia(trivia_id):
+    current_user = get_jwt_identity()
+    data = request.get_json() or {}
+    answer = data.get('answer')
+
+    if not answer:
+        return jsonify({'message': 'Falta la respuesta'}), 400
+    try:
+        trivia = mongo.db.trivia.find_one({'_id': ObjectId(trivia_id)}, {'correct_answer': 1})
+    except InvalidId:
+        return jsonify({'message': 'Id de trivia invalido'}), 400
+    if not trivia:
+        return jsonify({'message' : 'Trivia no encontrada'}), 404
+
+    correct = answer == trivia['correct_answer']
+    first_answer = leaderboard.record(trivia_id, current_user, TRIVIA_POINTS if correct else 0)
+    answer_log.add({
+        'trivia_id': trivia_id,
+        'user': current_user,
+        'answer': answer,
+        'correct': correct,
+        'first_answer': first_answer,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    })
+    return jsonify({
+        'correct': correct,
+        'first_answer': first_answer,
+        'points': TRIVIA_POINTS if correct and first_answer else 0
+    }), 200
+
+def leaderboard_response(scope):
+    limit = request.args.get('limit', LEADERBOARD_SIZE, type=int)
+    limit = max(1, min(limit, LEADERBOARD_MAX_SIZE))
+    leaders = leaderboard.top(scope, limit)
+    return jsonify({
+        'leaders': [{'rank': rank, 'user': user, 'score': score} for rank, (user, score) in enumerate(leaders, start=1)]
+    }), 200
+
+# Leaderboard de una trivia
+@app.route('/trivia/<string:trivia_id>/leaderboard', methods=['GET'])
+def trivia_leaderboard(trivia_id):
+    return leaderboard_response(trivia_scope(trivia_id))
+
+# Leaderboard global (suma de todas las trivias)
+@app.route('/trivia/leaderboard', methods=['GET'])
+def global_leaderboard():
+    return leaderboard_response(GLOBAL_SCOPE)
+
+
+
+
+# ------------------------------ Comandos CLI ---------------------------------
+
+indexes_cli = AppGroup('indexes', help='Indices de MongoDB')
+
+# flask indexes ensure
+@indexes_cli.command('ensure')
+def indexes_ensure():
+    init_mongo()
+    created, errors = ensure_indexes(mongo.db)
+    for collection, names in created.items():
+        click.echo(f"{collection}: {', '.join(names)}")
+    for collection, error in errors.items():
+        click.echo(f"{collection}: ERROR {error}", err=True)
+    if errors:
+        raise SystemExit(1)
+
+# flask indexes check
+@indexes_cli.command('check')
+def indexes_check():
+    init_mongo()
+    report = check_indexes(mongo.db)
+    problems = False
+    for collection, result in report.items():
+        click.echo(f"{collection}: faltan {result['missing'] or '-'} / sobran {result['extra'] or '-'}")
+        problems = problems or bool(result['missing'] or result['extra'])
+    if problems:
+        raise SystemExit(1)
+
+# flask indexes explain
+@indexes_cli.command('explain')
+def indexes_explain():
+    init_mongo()
+    for endpoint, collection, plan in explain_queries(mongo.db):
+        click.echo(f"{endpoint} [{collection}]: {plan}")
+
+app.cli.add_command(indexes_cli)
+
+comments_cli = AppGroup('comments', help='Comentarios')
+
+# flask comments reconcile
+@comments_cli.command('reconcile')
+def comments_reconcile():
+    init_mongo()
+    for collection, total in rebuild_comment_counters(mongo.db).items():
+        click.echo(f"{collection}: {total} documentos con comentarios")
+
+app.cli.add_command(comments_cli)
+
+catalog_cli = AppGroup('catalog', help='Catalogo de albumes y canciones')
+
+# flask catalog normalize-names
+@catalog_cli.command('normalize-names')
+def catalog_normalize_names():
+    init_mongo()
+    for collection in (mongo.db.albums, mongo.db.songs):
+        click.echo(f"{collection.name}: {backfill_name_norm(collection)} documentos actualizados")
+
+# Las llamadas de la importacion esperan lo que pida Spotify en vez de abortar
+def spotify_import_call(fetch):
+    while True:
+        try:
+            return spotify_gateway.call(None, fetch, 'import')
+        except SpotifyThrottled as e:
+            click.echo(f"Spotify limitado, esperando {e.retry_after:.1f}s", err=True)
+            time.sleep(e.retry_after)
+
+def import_progress(interval=1.0):
+    last = [0.0]
+    def report(importer):
+        now = time.monotonic()
+        if now - last[0] >= interval:
+            last[0] = now
+            click.echo(f"{importer.written} documentos, {importer.rate():.0f} docs/s", err=True)
+    return report
+
+# flask catalog import albums|songs ARCHIVO... (NDJSON o CSV, '-' para stdin)
+# flask catalog import artists ID_ARTISTA... (discografia completa desde Spotify)
+@catalog_cli.command('import')
+@click.argument('kind', type=click.Choice(['albums', 'songs', 'artists']))
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help='Por defecto segun la extension')
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Documentos por bulk_write')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), help='Archivo para reanudar la importacion')
+@click.option('--overwrite', is_flag=True, help='Actualizar los documentos que ya existen')
+def catalog_import(kind, sources, fmt, chunk_size, checkpoint, overwrite):
+    init_mongo()
+    checkpoint = Checkpoint(checkpoint)
+    importer = CatalogImporter(mongo.db, chunk_size=chunk_size, overwrite=overwrite, on_flush=import_progress())
+
+    if kind == 'artists':
+        import_artists(importer, get_app_spotify_client(), sources, checkpoint, call=spotify_import_call)
+    else:
+        for path in sources:
+            source = path if path == '-' else os.path.abspath(path)
+            with open_source(path) as stream:
+                import_file(importer, kind, stream, file_format(path, fmt), source, checkpoint)
+
+    for name, counts in importer.counts.items():
+        if any(counts.values()):
+            click.echo(f"{name}: {counts['inserted']} nuevos, {counts['existing']} existentes, {counts['invalid']} invalidos")
+    for error in importer.errors:
+        click.echo(f"linea {error['index']}: {error['message']}", err=True)
+    click.echo(f"{importer.written} documentos en {importer.clock() - importer.started:.1f}s ({importer.rate():.0f} docs/s)")
+
+app.cli.add_command(catalog_cli)
 
 
 if __name__ == "__main__": 
 
-    app.run(debug=True)
+    create_app().run(debug=True)
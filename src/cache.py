@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Normaliza la busqueda para que "Abbey Road " y "abbey  road" usen la misma entrada
+def normalize_query(query):
+    return ' '.join((query or '').split()).casefold()
+
+
+def make_key(kind, query):
+    return f"{kind}:{normalize_query(query)}"
+
+
+# Backend en memoria del proceso: LRU acotado por numero de entradas
+class MemoryBackend:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stored_at, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value, stored_at
+
+    def set(self, key, value, stored_at, max_age):
+        with self._lock:
+            self._data[key] = (value, stored_at, stored_at + max_age)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Redis de los caches (busquedas, respuestas, perfiles): CACHE_REDIS_URL, si no
+# REDIS_URL. Con allkeys-lru Redis puede borrar cualquier clave, y en REDIS_URL
+# tambien viven sesiones, tokens de Spotify, leaderboards y preguntas vistas. Por
+# eso allkeys-lru va en una instancia aparte para CACHE_REDIS_URL: la politica es
+# de toda la instancia, otra base del mismo Redis no alcanza.
+def cache_redis_url():
+    return os.getenv('CACHE_REDIS_URL') or os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+
+# Backend compartido entre workers. El limite LRU lo aplica Redis con
+# maxmemory-policy allkeys-lru (ver cache_redis_url); aqui solo fijamos la
+# expiracion de cada clave. `dumps` serializa la entrada (json.dumps por defecto).
+class RedisBackend:
+    def __init__(self, url, prefix='songbox:cache:', dumps=json.dumps):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.dumps = dumps
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['v'], entry['t']
+
+    def set(self, key, value, stored_at, max_age):
+        payload = self.dumps({'v': value, 't': stored_at})
+        self._client.set(self.prefix + key, payload, ex=max(1, int(max_age)))
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(match=self.prefix + '*'))
+
+
+# Cache read-through para las busquedas de Spotify.
+# Una entrada vale `ttl` segundos; despues se sigue sirviendo durante
+# `stale_ttl` segundos mientras se refresca en segundo plano.
+class SearchCache:
+    def __init__(self, backend, ttl=3600, stale_ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception:
+            # Si el backend falla tratamos la busqueda como un miss
+            self._count('errors')
+            return None
+
+    def _store(self, key, value):
+        try:
+            self.backend.set(key, value, time.time(), self.ttl + self.stale_ttl)
+        except Exception:
+            self._count('errors')
+
+    def get(self, query, kind):
+        entry = self._lookup(make_key(kind, query))
+        return entry[0] if entry else None
+
+    def get_or_fetch(self, query, kind, fetch):
+        key = make_key(kind, query)
+        entry = self._lookup(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count('hits')
+                return value
+            # Entrada vencida: se sirve igual y se refresca en segundo plano
+            self._count('stale_hits')
+            self._refresh_in_background(key, fetch)
+            return value
+
+        self._count('misses')
+        value = fetch()
+        self._store(key, value)
+        return value
+
+    def _refresh_in_background(self, key, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(key, fetch())
+                self._count('refreshes')
+            except Exception:
+                # Si Spotify falla se mantiene la entrada vieja
+                self._count('errors')
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, query, kind):
+        try:
+            self.backend.delete(make_key(kind, query))
+        except Exception:
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+                'refreshing': len(self._refreshing),
+            }
+
+
+# Backend en memoria o en Redis segun la configuracion
+def create_backend(name, max_entries, prefix='songbox:cache:'):
+    if name == 'redis':
+        return RedisBackend(cache_redis_url(), prefix=prefix)
+    return MemoryBackend(max_entries)
+
+
+# Crea el cache segun las variables de entorno
+def create_search_cache():
+    ttl = int(os.getenv('SEARCH_CACHE_TTL', 3600))
+    stale_ttl = int(os.getenv('SEARCH_CACHE_STALE_TTL', 86400))
+    backend = create_backend(
+        os.getenv('SEARCH_CACHE_BACKEND', 'memory'),
+        int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 512))
+    )
+    return SearchCache(backend, ttl=ttl, stale_ttl=stale_ttl)
@@ -0,0 +1,163 @@
+import logging
+import unicodedata
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import BulkWriteResult
+from spotipy.exceptions import SpotifyException
+
+logger = logging.getLogger('songbox.catalog')
+
+# Maximo de ids por llamada a GET /v1/tracks de Spotify
+SPOTIFY_TRACKS_BATCH = 50
+
+
+# Nombre normalizado para busquedas locales: minusculas, sin acentos ni espacios de mas
+def normalize_name(name):
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(without_accents.casefold().split())
+
+
+# Campos que guardamos de un album de Spotify
+def album_from_spotify(item):
+    return {
+        'album_id': item['id'],
+        'name': item['name'],
+        'name_norm': normalize_name(item['name']),
+        'artist': [artist['name'] for artist in item['artists']],
+        'release_date': item.get('release_date')
+    }
+
+
+# Campos que guardamos de una cancion de Spotify
+def song_from_spotify(item):
+    return {
+        'song_id': item['id'],
+        'name': item['name'],
+        'name_norm': normalize_name(item['name']),
+        'album_id': item['album']['id'],
+        'album': item['album']['name'],
+        'artist': [artist['name'] for artist in item['artists']],
+        'release_date': item['album'].get('release_date')
+    }
+
+
+# Operacion de upsert: solo escribe si el documento no existe,
+# asi no pisa los cambios hechos con PUT /albums o PUT /songs.
+# Con overwrite (importaciones) actualiza los campos del documento existente;
+# los campos en None (no venian en el registro) no borran los guardados.
+def _upsert_update(doc, overwrite=False):
+    created_at = datetime.now(timezone.utc).isoformat()
+    if overwrite:
+        present = {k: v for k, v in doc.items() if v is not None}
+        missing = {k: v for k, v in doc.items() if v is None}
+        return {'$set': present, '$setOnInsert': {**missing, 'created_at': created_at}}
+    return {'$setOnInsert': {**doc, 'created_at': created_at}}
+
+
+def upsert_one(collection, key, doc):
+    try:
+        return collection.update_one({key: doc[key]}, _upsert_update(doc), upsert=True)
+    except DuplicateKeyError:
+        # Otro worker lo inserto al mismo tiempo: el documento ya existe
+        return None
+
+
+# Upsert de muchos documentos en un solo round trip
+def bulk_upsert(collection, key, docs, overwrite=False):
+    unique_docs = {}
+    for doc in docs:
+        if overwrite:
+            unique_docs[doc[key]] = doc
+        else:
+            unique_docs.setdefault(doc[key], doc)
+    if not unique_docs:
+        return None
+
+    try:
+        return collection.bulk_write(
+            [UpdateOne({key: k}, _upsert_update(doc, overwrite), upsert=True) for k, doc in unique_docs.items()],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        # Ignorar las carreras con otros workers (clave duplicada); el resto del
+        # lote se escribio igual y los detalles traen cuantos se insertaron
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+        return BulkWriteResult(e.details, True)
+
+
+def upsert_album(db, item):
+    return upsert_one(db.albums, 'album_id', album_from_spotify(item))
+
+
+def upsert_song(db, item):
+    return upsert_one(db.songs, 'song_id', song_from_spotify(item))
+
+
+# Guarda todos los resultados de una pagina de busqueda
+def ingest_albums(db, items):
+    return bulk_upsert(db.albums, 'album_id', [album_from_spotify(item) for item in items])
+
+
+def ingest_songs(db, items):
+    return bulk_upsert(db.songs, 'song_id', [song_from_spotify(item) for item in items])
+
+
+# Respuestas de Spotify que no se arreglan reintentando: /v1/tracks responde 400
+# al lote entero si un id esta mal formado
+NOT_FOUND_STATUS = (400, 404)
+
+
+# Resuelve una lista de ids de canciones en pocos round trips: un solo $in contra
+# `songs` y, para los que faltan, GET /v1/tracks de a 50 ids. Lo que trae Spotify
+# se guarda en `songs`. Devuelve (documentos en el orden de `song_ids`, con None
+# en los ids que no se pudieron resolver; False si una llamada a Spotify fallo o
+# estaba limitada y esos None pueden ser temporales). Un lote que Spotify
+# rechaza por los ids cuenta como no encontrado y se sigue con el siguiente.
+def resolve_songs(db, song_ids, projection, fetch_tracks=None):
+    found = {}
+    unique_ids = list(dict.fromkeys(song_ids))
+    if unique_ids:
+        for song in db.songs.find({'song_id': {'$in': unique_ids}}, {**projection, 'song_id': 1}):
+            found[song['song_id']] = song
+
+    complete = True
+    missing = [song_id for song_id in unique_ids if song_id not in found]
+    if missing and fetch_tracks is not None:
+        items = []
+        for start in range(0, len(missing), SPOTIFY_TRACKS_BATCH):
+            try:
+                tracks = fetch_tracks(missing[start:start + SPOTIFY_TRACKS_BATCH])
+            except Exception as e:
+                if isinstance(e, SpotifyException) and e.http_status in NOT_FOUND_STATUS:
+                    logger.info("Spotify rechazo un lote de canciones: %s", e)
+                    continue
+                # Se devuelve lo que haya; los ids sin resolver quedan en None
+                logger.warning("No se pudieron obtener canciones de Spotify: %s", e)
+                complete = False
+                break
+            # Spotify devuelve null para los ids que no existen
+            items.extend(track for track in tracks['tracks'] if track)
+        ingest_songs(db, items)
+        for item in items:
+            found.setdefault(item['id'], song_from_spotify(item))
+
+    return [found.get(song_id) for song_id in song_ids], complete
+
+
+# Completa name_norm en documentos creados antes de que existiera
+def backfill_name_norm(collection, batch_size=1000):
+    ops = []
+    total = 0
+    for doc in collection.find({'name_norm': {'$exists': False}}, {'name': 1}):
+        ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'name_norm': normalize_name(doc.get('name'))}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            total += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        total += len(ops)
+    return total
@@ -0,0 +1,249 @@
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from catalog import normalize_name, bulk_upsert, album_from_spotify, song_from_spotify
+
+logger = logging.getLogger('songbox.catalog')
+
+# Documentos por bulk_write; el importador nunca guarda mas que esto en memoria por coleccion
+IMPORT_CHUNK_SIZE = int(os.getenv('CATALOG_IMPORT_CHUNK_SIZE', 1000))
+
+# Paginas de la API de Spotify (maximo permitido por artist_albums y album_tracks)
+SPOTIFY_PAGE_SIZE = 50
+
+KEYS = {'albums': 'album_id', 'songs': 'song_id'}
+
+
+# Un registro de importacion que no se puede guardar
+class InvalidRecord(ValueError):
+    pass
+
+
+def _artists(value):
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise InvalidRecord('El artist debe ser una lista de textos')
+    return [name.strip() for name in value if name.strip()] or None
+
+
+# En CSV los artistas van separados por ';'
+def _csv_artists(value):
+    if not value:
+        return None
+    return [name.strip() for name in value.split(';')]
+
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    if isinstance(value, str):
+        value = value.strip() or None
+    if required and not value:
+        raise InvalidRecord(f'El {field} es requerido')
+    if value is not None and not isinstance(value, str):
+        raise InvalidRecord(f'El {field} debe ser texto')
+    return value
+
+
+# Documento de `albums` a partir de un registro plano (NDJSON, CSV o /albums/bulk)
+def album_record(record):
+    if not isinstance(record, dict):
+        raise InvalidRecord('Cada album debe ser un objeto')
+    name = _text(record, 'name')
+    return {
+        'album_id': _text(record, 'album_id', required=True),
+        'name': name,
+        'name_norm': normalize_name(name) if name else None,
+        'artist': _artists(record.get('artist')),
+        'release_date': _text(record, 'release_date')
+    }
+
+
+# Documento de `songs` a partir de un registro plano (NDJSON, CSV o /songs/bulk)
+def song_record(record):
+    if not isinstance(record, dict):
+        raise InvalidRecord('Cada cancion debe ser un objeto')
+    name = _text(record, 'name')
+    return {
+        'song_id': _text(record, 'song_id', required=True),
+        'name': name,
+        'name_norm': normalize_name(name) if name else None,
+        'album_id': _text(record, 'album_id', required=True),
+        'album': _text(record, 'album'),
+        'artist': _artists(record.get('artist')),
+        'release_date': _text(record, 'release_date')
+    }
+
+
+RECORDS = {'albums': album_record, 'songs': song_record}
+
+
+# Lectores en streaming: devuelven (numero de linea, registro) sin cargar el archivo
+def read_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, InvalidRecord(f'JSON invalido: {e}')
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        if 'artist' in row:
+            row['artist'] = _csv_artists(row['artist'])
+        yield reader.line_num, row
+
+
+def file_format(path, default=None):
+    if default:
+        return default
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_file(stream, fmt):
+    return read_csv(stream) if fmt == 'csv' else read_ndjson(stream)
+
+
+# Discografia completa de un artista: todas las paginas de artist_albums y, por
+# cada album, de album_tracks. Devuelve ('albums', item) y ('songs', item) de a uno.
+# `call` envuelve cada llamada a Spotify (limite de llamadas, reintentos).
+def spotify_discography(sp, artist_id, call=lambda fetch: fetch()):
+    page = call(lambda: sp.artist_albums(artist_id, include_groups='album,single', limit=SPOTIFY_PAGE_SIZE))
+    while page:
+        for album in page['items']:
+            yield 'albums', album
+            tracks = call(lambda: sp.album_tracks(album['id'], limit=SPOTIFY_PAGE_SIZE))
+            while tracks:
+                for track in tracks['items']:
+                    # album_tracks devuelve canciones sin el album: se completa para song_from_spotify
+                    yield 'songs', {**track, 'album': album}
+                tracks = call(lambda: sp.next(tracks)) if tracks.get('next') else None
+        page = call(lambda: sp.next(page)) if page.get('next') else None
+
+
+# Estado de una importacion reanudable: por cada fuente, cuantos registros ya
+# quedaron guardados. Se escribe en un archivo JSON despues de cada lote.
+class Checkpoint:
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def get(self, source, default=None):
+        return self.state.get(source, default)
+
+    def set(self, source, value):
+        self.state[source] = value
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+# Importa documentos a `albums` y `songs` en lotes de `chunk_size` con
+# bulk_write (upsert por album_id/song_id, sin orden). Los mismos lotes sirven
+# para la CLI y para POST /albums/bulk y /songs/bulk.
+class CatalogImporter:
+    def __init__(self, db, chunk_size=IMPORT_CHUNK_SIZE, overwrite=False, on_flush=None, clock=time.perf_counter):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.overwrite = overwrite
+        self.on_flush = on_flush
+        self.clock = clock
+        self.started = clock()
+        self.pending = {'albums': [], 'songs': []}
+        self.counts = {kind: {'inserted': 0, 'existing': 0, 'invalid': 0} for kind in KEYS}
+        self.errors = []
+        self.flushes = 0
+
+    def add(self, kind, doc):
+        self.pending[kind].append(doc)
+        if len(self.pending[kind]) >= self.chunk_size:
+            self.flush(kind)
+
+    def add_record(self, kind, record, position=None, max_errors=100):
+        try:
+            if isinstance(record, InvalidRecord):
+                raise record
+            doc = RECORDS[kind](record)
+        except InvalidRecord as e:
+            self.counts[kind]['invalid'] += 1
+            if len(self.errors) < max_errors:
+                self.errors.append({'index': position, 'message': str(e)})
+            return False
+        self.add(kind, doc)
+        return True
+
+    def flush(self, kind=None):
+        for name in ([kind] if kind else list(KEYS)):
+            docs = self.pending[name]
+            if not docs:
+                continue
+            self.pending[name] = []
+            result = bulk_upsert(self.db[name], KEYS[name], docs, overwrite=self.overwrite)
+            # Los que no se insertaron ya existian (o los inserto otro writer en paralelo)
+            inserted = result.upserted_count
+            self.counts[name]['inserted'] += inserted
+            self.counts[name]['existing'] += len({doc[KEYS[name]] for doc in docs}) - inserted
+            self.flushes += 1
+            if self.on_flush:
+                self.on_flush(self)
+
+    @property
+    def written(self):
+        return sum(c['inserted'] + c['existing'] for c in self.counts.values())
+
+    def rate(self):
+        elapsed = self.clock() - self.started
+        return self.written / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {**self.counts, 'docs_per_second': round(self.rate(), 1)}
+
+
+# Importa un archivo NDJSON o CSV de `kind`. Con checkpoint salta las lineas ya
+# guardadas; la posicion se registra solo despues de cada lote escrito.
+def import_file(importer, kind, stream, fmt, source, checkpoint):
+    done = checkpoint.get(source, 0)
+    if done == 'done':
+        return
+    flushes = importer.flushes
+    for number, record in read_file(stream, fmt):
+        if number <= done:
+            continue
+        importer.add_record(kind, record, number)
+        if importer.flushes != flushes:
+            flushes = importer.flushes
+            checkpoint.set(source, number)
+    importer.flush(kind)
+    checkpoint.set(source, 'done')
+
+
+# Importa las discografias de Spotify; cada artista queda registrado al terminar
+# (un artista a medias se vuelve a recorrer, los upserts son idempotentes)
+def import_artists(importer, sp, artist_ids, checkpoint, call=lambda fetch: fetch()):
+    for artist_id in artist_ids:
+        source = f'artist:{artist_id}'
+        if checkpoint.get(source) == 'done':
+            continue
+        for kind, item in spotify_discography(sp, artist_id, call):
+            importer.add(kind, album_from_spotify(item) if kind == 'albums' else song_from_spotify(item))
+        importer.flush()
+        checkpoint.set(source, 'done')
+
+
+def open_source(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, encoding='utf-8', newline='')
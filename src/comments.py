@@ -0,0 +1,152 @@
+import os
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+# Campos que se devuelven de cada comentario
+COMMENT_PROJECTION = {'text': 1, 'user': 1, 'created_at': 1}
+
+
+# Tamano de pagina pedido por el cliente, acotado por la configuracion
+def page_size(requested=None):
+    default = int(os.getenv('COMMENTS_PAGE_SIZE', 20))
+    maximum = int(os.getenv('COMMENTS_MAX_PAGE_SIZE', 100))
+    try:
+        size = int(requested) if requested else default
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+def comment_to_json(comment):
+    return {
+        'id': str(comment['_id']),
+        'user': comment.get('user'),
+        'text': comment.get('text'),
+        'created_at': comment.get('created_at')
+    }
+
+
+# Pagina de comentarios de un album o cancion, del mas nuevo al mas viejo.
+# El cursor es el _id del ultimo comentario de la pagina anterior;
+# lanza bson.errors.InvalidId si el cursor no es valido.
+def get_comments_page(db, field, value, cursor=None, limit=20):
+    query = {field: value}
+    if cursor:
+        query['_id'] = {'$lt': ObjectId(cursor)}
+
+    # Se pide uno de mas para saber si hay otra pagina
+    docs = list(db.comments.find(query, COMMENT_PROJECTION).sort('_id', -1).limit(limit + 1))
+    has_more = len(docs) > limit
+    comments = [comment_to_json(doc) for doc in docs[:limit]]
+    next_cursor = comments[-1]['id'] if has_more else None
+    return comments, next_cursor
+
+
+# ---------------- Contadores y ultimos comentarios en albums/songs ----------------
+
+# Cuantos comentarios recientes se guardan dentro del album o cancion
+def recent_size():
+    return int(os.getenv('RECENT_COMMENTS_SIZE', 10))
+
+
+# Documentos padre de un comentario: (coleccion, campo, valor)
+def _parents(db, comment):
+    parents = []
+    if comment.get('album_id'):
+        parents.append((db.albums, 'album_id', comment['album_id']))
+    if comment.get('song_id'):
+        parents.append((db.songs, 'song_id', comment['song_id']))
+    return parents
+
+
+# Resumen guardado en el album o cancion: (ultimos comentarios, total, cursor)
+def parent_summary(parent):
+    recent = (parent or {}).get('recent_comments', [])
+    count = (parent or {}).get('comment_count', 0)
+    next_cursor = recent[-1]['id'] if recent and count > len(recent) else None
+    return recent, count, next_cursor
+
+
+# Al crear un comentario: contador +1 y se agrega al inicio de los recientes
+def add_to_parents(db, comment):
+    snapshot = comment_to_json(comment)
+    for collection, field, value in _parents(db, comment):
+        collection.update_one({field: value}, {
+            '$inc': {'comment_count': 1},
+            '$push': {'recent_comments': {'$each': [snapshot], '$position': 0, '$slice': recent_size()}}
+        })
+
+
+# Al editar: se actualiza el texto si el comentario esta entre los recientes
+def update_in_parents(db, comment, text):
+    comment_id = str(comment['_id'])
+    for collection, field, value in _parents(db, comment):
+        collection.update_one(
+            {field: value, 'recent_comments.id': comment_id},
+            {'$set': {'recent_comments.$.text': text}}
+        )
+
+
+# Al eliminar: contador -1 y se saca de los recientes.
+# Si quedaron menos recientes de los que hay, se rellenan desde `comments`.
+def remove_from_parents(db, comment):
+    comment_id = str(comment['_id'])
+    for collection, field, value in _parents(db, comment):
+        parent = collection.find_one_and_update(
+            {field: value},
+            {'$inc': {'comment_count': -1}, '$pull': {'recent_comments': {'id': comment_id}}},
+            projection={'comment_count': 1, 'recent_comments': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if parent and len(parent.get('recent_comments', [])) < min(recent_size(), parent.get('comment_count', 0)):
+            recent, _ = get_comments_page(db, field, value, limit=recent_size())
+            collection.update_one({field: value}, {'$set': {'recent_comments': recent}})
+
+
+# Reconstruye comment_count y recent_comments desde la coleccion `comments`
+# para corregir diferencias (flask comments reconcile). Necesita MongoDB 5.2+ ($topN).
+def rebuild_comment_counters(db, batch_size=1000):
+    stamp = datetime.now(timezone.utc).isoformat()
+    updated = {}
+
+    for collection, field in ((db.albums, 'album_id'), (db.songs, 'song_id')):
+        # $topN guarda solo los `recent_size()` mas nuevos de cada grupo ($push
+        # juntaria todos y podria pasar los 16 MB en un album con muchos comentarios)
+        pipeline = [
+            {'$match': {field: {'$ne': None}}},
+            {'$group': {
+                '_id': '$' + field,
+                'count': {'$sum': 1},
+                'recent': {'$topN': {
+                    'n': recent_size(),
+                    'sortBy': {'_id': -1},
+                    'output': {'_id': '$_id', 'user': '$user', 'text': '$text', 'created_at': '$created_at'}
+                }}
+            }}
+        ]
+
+        ops = []
+        total = 0
+        for group in db.comments.aggregate(pipeline, allowDiskUse=True):
+            ops.append(UpdateOne({field: group['_id']}, {'$set': {
+                'comment_count': group['count'],
+                'recent_comments': [comment_to_json(c) for c in group['recent']],
+                'comments_reconciled_at': stamp
+            }}))
+            if len(ops) >= batch_size:
+                collection.bulk_write(ops, ordered=False)
+                total += len(ops)
+                ops = []
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+            total += len(ops)
+
+        # Los que no aparecieron ya no tienen comentarios
+        collection.update_many(
+            {'comments_reconciled_at': {'$ne': stamp}, 'comment_count': {'$ne': 0}},
+            {'$set': {'comment_count': 0, 'recent_comments': [], 'comments_reconciled_at': stamp}}
+        )
+        updated[collection.name] = total
+
+    return updated
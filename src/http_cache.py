@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from flask import Response, current_app, request
+from cache import create_backend
+
+logger = logging.getLogger('songbox.http_cache')
+
+
+# ETag del cuerpo serializado: cambia si cambia cualquier dato de la respuesta,
+# tambien los que vienen de otros documentos (las canciones de ?expand=songs)
+def body_etag(body):
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+# Cache de respuestas JSON de lecturas publicas (playlist, trivia) con ETag.
+# Guarda el cuerpo ya serializado: un acierto no toca MongoDB ni serializa, y si
+# el cliente manda If-None-Match con el mismo ETag se responde 304 sin cuerpo.
+# Los handlers que modifican el documento llaman a invalidate().
+#
+# Cada documento tiene una generacion guardada en el backend y la entrada se
+# guarda bajo `kind:id:generacion`. invalidate() cambia la generacion, asi un
+# load() que leyo MongoDB antes de la escritura guarda su respuesta bajo la
+# generacion vieja, que ya nadie lee, en vez de pisar la invalidacion.
+#
+# Sin backend (backend=None) no se guarda nada: cada peticion lee MongoDB, pero
+# el ETag del cuerpo sigue permitiendo responder 304.
+class ResponseCache:
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _get(self, key):
+        try:
+            entry = self.backend.get(key)
+        except Exception:
+            self._count('errors')
+            return None
+        return entry[0] if entry else None
+
+    def _new_generation(self, gen_key):
+        generation = uuid.uuid4().hex[:16]
+        try:
+            # Dura mas que las entradas: si expira solo se pierden aciertos
+            self.backend.set(gen_key, generation, time.time(), self.ttl * 10)
+        except Exception:
+            self._count('errors')
+        return generation
+
+    def _generation(self, kind, doc_id):
+        gen_key = f'gen:{kind}:{doc_id}'
+        return self._get(gen_key) or self._new_generation(gen_key)
+
+    # load() devuelve (payload, cacheable) o None si no existe.
+    # Una respuesta no cacheable (por ejemplo incompleta por un error de Spotify)
+    # se envia sin guardar y sin ETag, para que el cliente no la revalide con 304.
+    def serve(self, kind, doc_id, load):
+        key = None
+        entry = None
+        if self.backend is not None:
+            key = f'{kind}:{doc_id}:{self._generation(kind, doc_id)}'
+            entry = self._get(key)
+
+        if entry is not None:
+            self._count('hits')
+        else:
+            self._count('misses')
+            loaded = load()
+            if loaded is None:
+                return None
+            payload, cacheable = loaded
+            body = current_app.json.dumps(payload)
+            if not cacheable:
+                response = Response(body, mimetype='application/json')
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+            entry = {'etag': body_etag(body), 'body': body}
+            if key is not None:
+                try:
+                    self.backend.set(key, entry, time.time(), self.ttl)
+                except Exception:
+                    self._count('errors')
+
+        if request.if_none_match.contains_weak(entry['etag']):
+            self._count('not_modified')
+            response = Response(status=304)
+        else:
+            response = Response(entry['body'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def invalidate(self, kind, doc_id):
+        if self.backend is None:
+            return
+        gen_key = f'gen:{kind}:{doc_id}'
+        old = self._get(gen_key)
+        self._new_generation(gen_key)
+        if old:
+            try:
+                self.backend.delete(f'{kind}:{doc_id}:{old}')
+            except Exception:
+                self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'not_modified': self.not_modified, 'errors': self.errors}
+
+
+# Por defecto Redis si hay CACHE_REDIS_URL o REDIS_URL. El backend en memoria es por proceso: la
+# invalidacion solo llega al worker que atendio la escritura y los demas
+# servirian la version vieja, asi que con varios workers (WEB_CONCURRENCY, que
+# fija gunicorn.conf.py) el cache queda desactivado.
+def create_response_cache():
+    default = 'redis' if os.getenv('CACHE_REDIS_URL') or os.getenv('REDIS_URL') else 'memory'
+    name = os.getenv('RESPONSE_CACHE_BACKEND', default)
+    ttl = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    workers = int(os.getenv('WEB_CONCURRENCY', 1))
+    if name == 'memory' and workers > 1:
+        logger.warning("Cache de respuestas desactivado: el backend memory no se comparte entre %s workers "
+                       "(usar RESPONSE_CACHE_BACKEND=redis)", workers)
+        return ResponseCache(None, ttl=ttl)
+    backend = create_backend(name, int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024)), prefix='songbox:http:')
+    return ResponseCache(backend, ttl=ttl)
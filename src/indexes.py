@@ -0,0 +1,126 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+
+# Indices que necesita la app, por coleccion.
+# Para cambiar un indice se cambia aqui y se corre `flask indexes ensure`.
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'albums': [
+        IndexModel([('album_id', ASCENDING)], name='album_id_unique', unique=True),
+        IndexModel([('name_norm', ASCENDING)], name='name_norm'),
+    ],
+    'songs': [
+        IndexModel([('song_id', ASCENDING)], name='song_id_unique', unique=True),
+        IndexModel([('name_norm', ASCENDING)], name='name_norm'),
+    ],
+    'comments': [
+        # Sirven al filtro por album/cancion y al orden por _id de la paginacion
+        IndexModel([('album_id', ASCENDING), ('_id', DESCENDING)], name='album_id_recent'),
+        IndexModel([('song_id', ASCENDING), ('_id', DESCENDING)], name='song_id_recent'),
+    ],
+    'playlist': [
+        # Playlists que tienen una cancion, para invalidar sus respuestas expandidas
+        IndexModel([('songs', ASCENDING)], name='songs'),
+    ],
+    'trivia_answers': [
+        IndexModel([('trivia_id', ASCENDING), ('_id', DESCENDING)], name='trivia_id_recent'),
+    ],
+    'sessions': [
+        # MongoDB borra las sesiones vencidas (cuando SESSION_BACKEND=mongo)
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+    ],
+    'spotify_tokens': [
+        IndexModel([('discard_at', ASCENDING)], name='discard_at_ttl', expireAfterSeconds=0),
+        # El refresco en segundo plano busca los tokens en uso que estan por vencer
+        IndexModel([('expires_at', ASCENDING), ('last_used_at', ASCENDING)], name='expires_at_last_used'),
+    ],
+    'trivia_seen': [
+        # Preguntas vistas de usuarios inactivos (cuando TRIVIA_SEEN_BACKEND=mongo)
+        IndexModel([('discard_at', ASCENDING)], name='discard_at_ttl', expireAfterSeconds=0),
+    ],
+    'leaderboards': [
+        # Una entrada por usuario en cada leaderboard (trivia:<id> o global)
+        IndexModel([('scope', ASCENDING), ('user', ASCENDING)], name='scope_user_unique', unique=True),
+        # Sirve el top de cada leaderboard sin ordenar en memoria
+        IndexModel([('scope', ASCENDING), ('score', DESCENDING), ('user', ASCENDING)], name='scope_score'),
+    ],
+}
+
+# Consultas de las rutas mas usadas, para revisar su plan con `flask indexes explain`
+HOT_QUERIES = [
+    ('register_user / login_user / user_profile', 'users', {'email': 'user@example.com'}),
+    ('search_album', 'albums', {'album_id': '0ETFjACtuP2ADo6LFhL6HN'}),
+    ('search_song', 'songs', {'song_id': '3n3Ppam7vgaVa1iaRUc9Lp'}),
+    ('search_album (comentarios)', 'comments', {'album_id': '0ETFjACtuP2ADo6LFhL6HN'}),
+    ('search_song (comentarios)', 'comments', {'song_id': '3n3Ppam7vgaVa1iaRUc9Lp'}),
+    ('busqueda local (album)', 'albums', {'name_norm': 'abbey road'}),
+    ('busqueda local (cancion)', 'songs', {'name_norm': 'something'}),
+    ('trivia_leaderboard', 'leaderboards', {'scope': 'global'}),
+]
+
+
+def _spec(index):
+    document = index.document
+    options = {k: v for k, v in document.items() if k not in ('key', 'name', 'v', 'ns')}
+    return list(document['key'].items()), options
+
+
+# Crea los indices que falten. Es idempotente: los que ya existen no se tocan.
+def ensure_indexes(db):
+    created = {}
+    errors = {}
+    for collection, indexes in INDEXES.items():
+        try:
+            created[collection] = db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # Por ejemplo un indice con el mismo nombre y otras opciones,
+            # o datos duplicados que impiden crear un indice unique
+            errors[collection] = str(e)
+    return created, errors
+
+
+# Compara los indices declarados con los que existen en la base de datos
+def check_indexes(db):
+    report = {}
+    for collection, indexes in INDEXES.items():
+        existing = {}
+        for info in db[collection].list_indexes():
+            if info['name'] != '_id_':
+                existing[info['name']] = info
+
+        missing = []
+        for index in indexes:
+            keys, options = _spec(index)
+            name = index.document['name']
+            info = existing.pop(name, None)
+            if info is None or list(info['key'].items()) != keys or any(info.get(k) != v for k, v in options.items()):
+                missing.append(name)
+
+        report[collection] = {'missing': missing, 'extra': sorted(existing)}
+    return report
+
+
+# Etapas de un plan de explain, de la ultima a la primera
+def plan_stages(plan):
+    stages = [plan.get('stage')]
+    if plan.get('indexName'):
+        stages[-1] += f"({plan['indexName']})"
+    for child in ('inputStage', 'queryPlan'):
+        if child in plan:
+            stages += plan_stages(plan[child])
+    for child in plan.get('inputStages', []):
+        stages += plan_stages(child)
+    return stages
+
+
+# Plan ganador de cada consulta de HOT_QUERIES (COLLSCAN = sin indice)
+def explain_queries(db):
+    plans = []
+    for endpoint, collection, query in HOT_QUERIES:
+        result = db.command('explain', {'find': collection, 'filter': query}, verbosity='queryPlanner')
+        plan = result['queryPlanner']['winningPlan']
+        plans.append((endpoint, collection, ' <- '.join(plan_stages(plan))))
+    return plans
@@ -0,0 +1,62 @@
+import decimal
+import os
+import orjson
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+# Sin indentacion ni orden de claves. OPT_NAIVE_UTC: pymongo devuelve las fechas
+# sin zona horaria pero en UTC. OPT_NON_STR_KEYS: como json, acepta claves no string.
+OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+# Tipos que orjson no conoce. datetime, date, UUID y dataclasses los serializa
+# orjson directamente (las fechas en ISO 8601).
+def _default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+# Proveedor JSON de Flask sobre orjson: lo usan jsonify, request.get_json y
+# current_app.json.dumps (cache de respuestas). Los documentos de MongoDB se
+# pueden devolver tal cual: ObjectId y Decimal128 salen como string.
+class OrjsonProvider(JSONProvider):
+    mimetype = 'application/json'
+
+    # kwargs (separators, sort_keys...) se ignoran: la salida siempre es compacta
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+# El proveedor de Flask (json) con ObjectId y Decimal128 como string; las fechas
+# salen como las deja Flask (HTTP date)
+class BsonJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, (ObjectId, Decimal128)):
+            return _default(o)
+        return DefaultJSONProvider.default(o)
+
+
+# JSON_PROVIDER: orjson o default (el de Flask sobre json)
+def create_json_provider(app):
+    if os.getenv('JSON_PROVIDER', 'orjson') == 'default':
+        return BsonJSONProvider(app)
+    return OrjsonProvider(app)
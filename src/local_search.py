@@ -0,0 +1,85 @@
+import threading
+import time
+from catalog import normalize_name
+
+# Campos necesarios para responder /search_album y /search_song sin Spotify
+DETAIL_FIELDS = {
+    'album': ('artist', 'release_date'),
+    'track': ('artist', 'album', 'release_date'),
+}
+
+
+# Busqueda en el catalogo local (albums/songs) antes de ir a Spotify.
+# Solo responde cuando el nombre normalizado exacto coincide con un unico
+# documento. Un prefijo no alcanza: el catalogo local es parcial y "never"
+# devolveria el "Nevermind" guardado en vez del primer resultado de Spotify (y
+# en create_comment el comentario quedaria en otro album).
+# Usa el indice sobre `name_norm`, asi que no recorre la coleccion.
+class LocalSearch:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.local_seconds = 0.0
+        self.remote_calls = 0
+        self.remote_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def find(self, db, kind, query, projection=None, require_details=True):
+        start = time.perf_counter()
+        doc = self._find(db, kind, query, projection, require_details)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.local_seconds += elapsed
+            if doc is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return doc
+
+    def _find(self, db, kind, query, projection, require_details):
+        norm = normalize_name(query)
+        if not norm:
+            return None
+
+        collection = db.albums if kind == 'album' else db.songs
+        base = {}
+        if require_details:
+            base = {field: {'$exists': True, '$ne': None} for field in DETAIL_FIELDS[kind]}
+
+        # Dos albumes distintos pueden llamarse igual: si es ambiguo se va a Spotify
+        matches = self._unique(collection, {**base, 'name_norm': norm}, projection)
+        return matches[0] if len(matches) == 1 else None
+
+    # Se piden 2 para saber si la consulta es ambigua
+    @staticmethod
+    def _unique(collection, query, projection):
+        return list(collection.find(query, projection).limit(2))
+
+    # Llamada a Spotify cronometrada, para estimar lo que ahorra cada acierto local
+    def timed_remote(self, fetch, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fetch(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.remote_calls += 1
+                self.remote_seconds += time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_local = self.local_seconds / lookups if lookups else 0.0
+            avg_remote = self.remote_seconds / self.remote_calls if self.remote_calls else 0.0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'avg_local_ms': round(avg_local * 1000, 3),
+                'avg_spotify_ms': round(avg_remote * 1000, 3),
+                'estimated_saved_ms': round(self.hits * max(avg_remote - avg_local, 0) * 1000, 1),
+            }
+
+
+def create_local_search():
+    return LocalSearch()
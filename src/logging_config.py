@@ -0,0 +1,134 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+# Campos que nunca deben llegar a los logs
+REDACTED_KEYS = {'access_token', 'refresh_token', 'token', 'token_info', 'password', 'code', 'authorization'}
+REDACTED = '[REDACTED]'
+
+# Atributos propios de LogRecord; el resto son campos extra del registro
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'request_id'}
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in REDACTED_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    return value
+
+
+# Agrega el id de la peticion y oculta tokens. Corre en el hilo de la peticion,
+# antes de encolar el registro, porque `g` solo existe ahi.
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        if record.args:
+            record.args = redact(record.args)
+        for key in list(record.__dict__):
+            if key.lower() in REDACTED_KEYS:
+                record.__dict__[key] = REDACTED
+            elif key not in _RECORD_ATTRS:
+                # Campos extra con dicts anidados (headers, respuestas de Spotify)
+                record.__dict__[key] = redact(record.__dict__[key])
+        return True
+
+
+# Encola el registro sin formatearlo: el formateo y la escritura a stdout
+# quedan en el hilo del QueueListener, fuera del camino de la peticion
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_listener = None
+
+
+# Los hilos no sobreviven al fork: cada worker de gunicorn levanta su propio
+# QueueListener sobre la misma cola (se llama desde post_fork)
+def restart_listener_after_fork():
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers)
+        _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+# Configura el logger `songbox` (y el de Flask) con una cola no bloqueante.
+# LOG_LEVEL controla el nivel; en produccion los logger.debug(...) se descartan
+# antes de construir el registro.
+def setup_logging(app):
+    global _listener
+
+    level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    stream = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'json') == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    for logger in (logging.getLogger('songbox'), app.logger):
+        logger.handlers[:] = [handler]
+        logger.setLevel(level)
+        logger.propagate = False
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(log_queue, stream)
+    _listener.start()
+
+    request_logger = logging.getLogger('songbox.request')
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_request_log(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        if request_logger.isEnabledFor(logging.INFO) and 'request_start' in g:
+            request_logger.info('request', extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.request_start) * 1000, 2),
+            })
+        return response
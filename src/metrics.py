@@ -0,0 +1,353 @@
+import glob
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+from pymongo import monitoring
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def empty(self):
+        return Counter(self.name, self.help, self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, values, worker=None):
+        for labels, value in values:
+            self.inc(*labels, amount=value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def empty(self):
+        return Histogram(self.name, self.help, self.labelnames, self.buckets)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), total, count] for labels, (counts, total, count) in self._values.items()]
+
+    def merge(self, values, worker=None):
+        with self._lock:
+            for labels, counts, total, count in values:
+                entry = self._values.setdefault(tuple(labels), [[0] * len(self.buckets), 0.0, 0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+# Metricas calculadas al momento de exportar (por ejemplo los contadores del cache).
+# Son de cada proceso: al juntar varios workers van con la etiqueta `worker`.
+class Gauges:
+    def __init__(self, name, help, labelnames, collect):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def empty(self):
+        rows = []
+        gauges = Gauges(self.name, self.help, tuple(self.labelnames) + ('worker',), lambda: rows)
+        gauges.rows = rows
+        return gauges
+
+    def snapshot(self):
+        return [[list(labels), value] for labels, value in self.collect()]
+
+    def merge(self, values, worker=None):
+        if worker is not None:
+            self.rows.extend((tuple(labels) + (worker,), value) for labels, value in values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for labels, value in self.collect():
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+_metrics = []
+
+
+def register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def _render(metrics):
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------- Varios procesos (workers de gunicorn) ----------------
+#
+# Cada worker tiene sus propias metricas y /metrics lo atiende un worker
+# cualquiera. Con METRICS_MULTIPROC_DIR cada worker escribe las suyas en
+# <dir>/<pid>.json cada METRICS_FLUSH_INTERVAL segundos (y justo antes de
+# responder /metrics) y /metrics suma las de todos los archivos. Cuando un worker
+# termina (max_requests, timeout) mark_process_dead() pasa sus contadores e
+# histogramas a archive.json, asi no vuelven a cero; sus gauges se descartan.
+# Sin METRICS_MULTIPROC_DIR cada /metrics muestra solo el worker que lo atendio.
+
+ARCHIVE = 'archive'
+
+
+def multiproc_dir():
+    return os.getenv('METRICS_MULTIPROC_DIR') or None
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # El worker lo esta reemplazando o ya se archivo
+        return None
+
+
+def _write(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def write_snapshot(directory, pid=None):
+    _write(os.path.join(directory, f'{pid or os.getpid()}.json'), {m.name: m.snapshot() for m in _metrics})
+
+
+# Suma de los archivos de todos los workers (vivos y archivados)
+def merged(directory):
+    totals = {metric.name: metric.empty() for metric in _metrics}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        data = _read(path)
+        if data is None:
+            continue
+        worker = os.path.basename(path)[:-len('.json')]
+        for name, values in data.items():
+            if name in totals:
+                totals[name].merge(values, None if worker == ARCHIVE else worker)
+    return [totals[metric.name] for metric in _metrics]
+
+
+def render():
+    directory = multiproc_dir()
+    if not directory:
+        return _render(_metrics)
+    write_snapshot(directory)
+    return _render(merged(directory))
+
+
+# Hilo de cada worker que guarda sus metricas periodicamente
+def start_snapshot_writer(directory=None, interval=None):
+    directory = directory or multiproc_dir()
+    if not directory:
+        return None
+    interval = interval or float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(directory)
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=run, name='metrics-snapshot', daemon=True)
+    thread.start()
+    return thread
+
+
+# Desde el master (child_exit de gunicorn): suma el ultimo archivo del worker al
+# archivo de los workers terminados y lo borra
+def mark_process_dead(pid, directory=None):
+    directory = directory or multiproc_dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f'{pid}.json')
+    data = _read(path)
+    if data is not None:
+        archive_path = os.path.join(directory, f'{ARCHIVE}.json')
+        archive = {m.name: m.empty() for m in _metrics if not isinstance(m, Gauges)}
+        for values_by_name in (_read(archive_path) or {}, data):
+            for name, values in values_by_name.items():
+                if name in archive:
+                    archive[name].merge(values)
+        _write(archive_path, {name: metric.snapshot() for name, metric in archive.items()})
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Al arrancar gunicorn: los archivos de una ejecucion anterior no se suman
+def clear_multiproc_dir(directory=None):
+    directory = directory or multiproc_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+
+REQUESTS = register(Counter('songbox_http_requests_total', 'Peticiones HTTP', ('route', 'method', 'status')))
+REQUEST_TIME = register(Histogram('songbox_http_request_duration_seconds', 'Duracion de las peticiones HTTP', ('route', 'method')))
+EXCEPTIONS = register(Counter('songbox_http_exceptions_total', 'Excepciones no manejadas', ('route',)))
+DEPENDENCY_TIME = register(Histogram('songbox_dependency_duration_seconds', 'Duracion de las llamadas a dependencias', ('dependency', 'operation')))
+DEPENDENCY_ERRORS = register(Counter('songbox_dependency_errors_total', 'Errores de dependencias', ('dependency', 'operation')))
+MONGO_PER_REQUEST = register(Histogram('songbox_mongo_commands_per_request', 'Comandos de MongoDB por peticion', ('route',), COUNT_BUCKETS))
+
+# Fraccion de observaciones que se guardan en los histogramas (los contadores son exactos)
+SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1.0))
+
+_local = threading.local()
+
+
+def sampled():
+    return SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE
+
+
+def observe_dependency(dependency, operation, seconds, error=False):
+    if error:
+        DEPENDENCY_ERRORS.inc(dependency, operation)
+    if sampled():
+        DEPENDENCY_TIME.observe(seconds, dependency, operation)
+
+
+# Listener de pymongo: duracion de cada comando y cuantos hace cada peticion.
+# pymongo lo llama en el mismo hilo que ejecuta el comando.
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        if getattr(_local, 'mongo_commands', None) is not None:
+            _local.mongo_commands += 1
+
+    def succeeded(self, event):
+        observe_dependency('mongo', event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        observe_dependency('mongo', event.command_name, event.duration_micros / 1e6, error=True)
+
+
+# Hook de respuesta de requests: cada intento HTTP a Spotify (incluye los
+# reintentos de urllib3 y los pedidos de token). La llamada completa, con los
+# errores de conexion y timeouts que no llegan aqui, la mide el gateway.
+def spotify_response_hook(response, *args, **kwargs):
+    parts = [p for p in urlparse(response.url).path.split('/') if p]
+    # /v1/search -> search, /v1/me -> me, /api/token -> token
+    operation = parts[1] if len(parts) > 1 else (parts[0] if parts else '')
+    observe_dependency('spotify_http', operation, response.elapsed.total_seconds(), error=response.status_code >= 400)
+    return response
+
+
+# Middleware WSGI: mide la peticion completa (ruteo, vista, serializacion y
+# envio del cuerpo). Con respuestas en streaming el cuerpo se genera despues de
+# que la app devuelve, asi que la medicion se cierra en close() del iterable.
+class MetricsMiddleware:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        _local.mongo_commands = 0
+        status_holder = {}
+
+        def capture_status(status, headers, exc_info=None):
+            status_holder['status'] = status.split(' ', 1)[0]
+            return start_response(status, headers, exc_info)
+
+        def finish():
+            route = environ.get('songbox.route', 'unmatched')
+            method = environ.get('REQUEST_METHOD', '')
+            REQUESTS.inc(route, method, status_holder.get('status', '500'))
+            if sampled():
+                REQUEST_TIME.observe(time.perf_counter() - start, route, method)
+                MONGO_PER_REQUEST.observe(_local.mongo_commands or 0, route)
+            _local.mongo_commands = None
+
+        try:
+            result = self.wsgi_app(environ, capture_status)
+        except BaseException:
+            finish()
+            raise
+        return ClosingIterator(result, finish)
+
+
+def setup_metrics(app):
+    from flask import request, got_request_exception
+
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+    @app.before_request
+    def remember_route():
+        request.environ['songbox.route'] = request.url_rule.rule if request.url_rule else 'unmatched'
+
+    def count_exception(sender, exception, **extra):
+        EXCEPTIONS.inc(request.environ.get('songbox.route', 'unmatched'))
+
+    got_request_exception.connect(count_exception, app, weak=False)
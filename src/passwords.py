@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger('songbox.passwords')
+
+# PASSWORD_HASH_METHOD: 'argon2id' (por defecto) o un metodo de werkzeug completo,
+# por ejemplo 'scrypt:32768:8:1' o 'pbkdf2:sha256:600000'
+HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'argon2id')
+
+# Parametros de argon2id (valores minimos recomendados por OWASP)
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+
+POOL_SIZE = int(os.getenv('PASSWORD_POOL_SIZE', os.cpu_count() or 1))
+QUEUE_SIZE = int(os.getenv('PASSWORD_QUEUE_SIZE', POOL_SIZE * 4))
+QUEUE_TIMEOUT = float(os.getenv('PASSWORD_QUEUE_TIMEOUT', 2))
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+_argon2 = None
+
+
+def _argon2_hasher():
+    global _argon2
+    if _argon2 is None:
+        from argon2 import PasswordHasher
+        _argon2 = PasswordHasher(
+            time_cost=ARGON2_TIME_COST,
+            memory_cost=ARGON2_MEMORY_COST,
+            parallelism=ARGON2_PARALLELISM
+        )
+    return _argon2
+
+
+def _hash(password):
+    if HASH_METHOD == 'argon2id':
+        return _argon2_hasher().hash(password)
+    return generate_password_hash(password, method=HASH_METHOD)
+
+
+# Acepta hashes argon2 y los de werkzeug guardados antes del cambio
+def _verify(stored, password):
+    if stored.startswith('$argon2'):
+        from argon2.exceptions import InvalidHashError, VerificationError
+        try:
+            return _argon2_hasher().verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(stored, password)
+
+
+_werkzeug_method = None
+
+
+# Metodo de werkzeug con todos sus parametros: 'scrypt' -> 'scrypt:32768:8:1'.
+# Se toma de un hash generado con la configuracion, asi usa los mismos valores
+# por defecto que werkzeug.
+def _full_method():
+    global _werkzeug_method
+    if _werkzeug_method is None:
+        _werkzeug_method = generate_password_hash('', method=HASH_METHOD).split('$', 1)[0]
+    return _werkzeug_method
+
+
+# El hash guardado usa otro algoritmo o parametros que los configurados
+def needs_rehash(stored):
+    if HASH_METHOD == 'argon2id':
+        return not stored.startswith('$argon2id$') or _argon2_hasher().check_needs_rehash(stored)
+    return stored.split('$', 1)[0] != _full_method()
+
+
+# Pool acotado para el KDF: argon2 y hashlib sueltan el GIL, asi el hash corre
+# en paralelo sin bloquear los hilos que atienden otras peticiones. Si la cola
+# esta llena se rechaza (PasswordPoolBusy) en vez de acumular logins esperando.
+_pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='password')
+_slots = threading.BoundedSemaphore(QUEUE_SIZE)
+
+
+def _gevent_hub():
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return None
+    # Con workers gevent los hilos de Python son greenlets: se usa el pool de hilos reales de gevent
+    return get_hub() if monkey.is_module_patched('threading') else None
+
+
+def _run(fn, *args):
+    hub = _gevent_hub()
+    if hub is not None:
+        return hub.threadpool.apply(fn, args)
+    return _pool.submit(fn, *args).result()
+
+
+def _submit(fn, *args):
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT):
+        raise PasswordPoolBusy()
+    try:
+        return _run(fn, *args)
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    return _submit(_hash, password)
+
+
+def verify_password(stored, password):
+    return _submit(_verify, stored, password)
+
+
+# Actualiza el hash despues de un login correcto si cambio la configuracion.
+# Corre en segundo plano y solo escribe si el hash no cambio mientras tanto.
+# En el pool solo se calcula el hash; la escritura se hace en el hilo de fondo
+# (un greenlet con gevent, donde pymongo esta parcheado) y no ocupa el pool.
+def rehash_in_background(collection, user_id, stored, password):
+    if not needs_rehash(stored) or not _slots.acquire(blocking=False):
+        return
+
+    def rehash():
+        try:
+            new_hash = _run(_hash, password)
+        except Exception:
+            logger.exception("No se pudo calcular el nuevo hash de la contrasena")
+            return
+        finally:
+            _slots.release()
+        try:
+            collection.update_one({'_id': user_id, 'password': stored}, {'$set': {'password': new_hash}})
+        except Exception:
+            logger.exception("No se pudo actualizar el hash de la contrasena")
+
+    thread = threading.Thread(target=rehash, name='password-rehash', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+from pymongo import ReturnDocument
+
+
+# Una operacion sobre las canciones de una playlist (PATCH /playlist/<id>/songs).
+# `version` es la que el cliente leyo: si otro editor cambio la playlist
+# mientras tanto la operacion se rechaza con 409 en vez de pisar sus cambios.
+class SongsOperationSchema(Schema):
+    op = fields.Str(required=True, validate=validate.OneOf(['add', 'remove', 'move']))
+    version = fields.Int(required=True, validate=validate.Range(min=0))
+    songs = fields.List(fields.Str(validate=validate.Length(min=1)), validate=validate.Length(min=1))
+    position = fields.Int(validate=validate.Range(min=0))
+    from_ = fields.Int(data_key='from', validate=validate.Range(min=0))
+    to = fields.Int(validate=validate.Range(min=0))
+
+    @validates_schema
+    def check_operation(self, data, **kwargs):
+        if data['op'] in ('add', 'remove') and 'songs' not in data:
+            raise ValidationError('Lista de canciones requerida', 'songs')
+        if data['op'] == 'move' and ('from_' not in data or 'to' not in data):
+            raise ValidationError('Posiciones "from" y "to" requeridas', 'from')
+
+
+songs_operation_schema = SongsOperationSchema()
+
+
+# Limite para el tercer argumento de $slice ("hasta el final del array")
+_SLICE_ALL = 2 ** 31 - 1
+
+
+# Las playlists creadas antes de tener `version` cuentan como version 0
+def version_filter(version):
+    return {'$in': [0, None]} if version == 0 else version
+
+
+# Mueve un elemento dentro del array en el servidor (update con pipeline):
+# se quita de `from` y se inserta en `to`, sin mandar la lista completa
+def _move_pipeline(source, target, stamp):
+    without = {'$concatArrays': [
+        {'$slice': ['$songs', source]},
+        {'$slice': ['$songs', source + 1, _SLICE_ALL]}
+    ]}
+    return [
+        {'$set': {'songs': {'$let': {
+            'vars': {'rest': without},
+            'in': {'$concatArrays': [
+                {'$slice': ['$$rest', target]},
+                {'$slice': ['$songs', source, 1]},
+                {'$slice': ['$$rest', target, _SLICE_ALL]}
+            ]}
+        }}}},
+        {'$set': {'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]}, 'updated_at': stamp}}
+    ]
+
+
+def songs_update(operation):
+    stamp = datetime.now(timezone.utc).isoformat()
+    if operation['op'] == 'move':
+        return _move_pipeline(operation['from_'], operation['to'], stamp)
+
+    if operation['op'] == 'add':
+        push = {'$each': operation['songs']}
+        if 'position' in operation:
+            push['$position'] = operation['position']
+        change = {'$push': {'songs': push}}
+    else:
+        change = {'$pull': {'songs': {'$in': operation['songs']}}}
+    return {**change, '$inc': {'version': 1}, '$set': {'updated_at': stamp}}
+
+
+# Aplica la operacion en un solo round trip. Devuelve la playlist actualizada
+# (solo la version) o None si no coincidio el filtro:
+# no existe, no es del usuario, cambio la version o `from` esta fuera de rango.
+def apply_songs_operation(collection, playlist_id, user, operation):
+    query = {'_id': playlist_id, 'user': user, 'version': version_filter(operation['version'])}
+    if operation['op'] == 'move':
+        query[f"songs.{operation['from_']}"] = {'$exists': True}
+    return collection.find_one_and_update(
+        query,
+        songs_update(operation),
+        projection={'version': 1},
+        return_document=ReturnDocument.AFTER
+    )
@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+# Token bucket: `rate` permisos por segundo con rafagas de hasta `burst`.
+# El reloj se puede inyectar para probarlo sin esperar.
+class TokenBucket:
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Toma un permiso si hay; no espera
+    def try_acquire(self):
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    # Segundos hasta que haya un permiso disponible
+    def wait_time(self):
+        with self._lock:
+            self._refill()
+            return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
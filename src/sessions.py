@@ -0,0 +1,193 @@
+import os
+import secrets
+from datetime import datetime, timezone
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+
+SIGNER_SALT = 'songbox-session'
+
+_serializer = TaggedJSONSerializer()
+
+
+# Backend por defecto para datos compartidos entre workers: Redis si esta configurado
+def default_shared_backend():
+    return 'redis' if os.getenv('REDIS_URL') else 'mongo'
+
+
+class RedisSessionStore:
+    def __init__(self, url, prefix='songbox:session:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        raw = self._client.get(self.prefix + sid)
+        return _serializer.loads(raw) if raw is not None else None
+
+    def set(self, sid, data, lifetime):
+        self._client.set(self.prefix + sid, _serializer.dumps(data), ex=max(1, int(lifetime.total_seconds())))
+
+    def touch(self, sid, lifetime):
+        self._client.expire(self.prefix + sid, max(1, int(lifetime.total_seconds())))
+
+    def delete(self, sid):
+        self._client.delete(self.prefix + sid)
+
+
+# Sesiones en la coleccion `sessions`; el indice TTL sobre expires_at las borra al vencer
+class MongoSessionStore:
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+
+    def get(self, sid):
+        doc = self.get_collection().find_one({'_id': sid, 'expires_at': {'$gt': datetime.now(timezone.utc)}})
+        return _serializer.loads(doc['data']) if doc else None
+
+    def set(self, sid, data, lifetime):
+        self.get_collection().update_one(
+            {'_id': sid},
+            {'$set': {'data': _serializer.dumps(data), 'expires_at': datetime.now(timezone.utc) + lifetime}},
+            upsert=True
+        )
+
+    # Solo escribe si ya paso la mitad de la vida de la sesion
+    def touch(self, sid, lifetime):
+        expires_at = datetime.now(timezone.utc) + lifetime
+        self.get_collection().update_one(
+            {'_id': sid, 'expires_at': {'$lt': expires_at - lifetime / 2}},
+            {'$set': {'expires_at': expires_at}}
+        )
+
+    def delete(self, sid):
+        self.get_collection().delete_one({'_id': sid})
+
+
+# Sesion guardada en el servidor. Los datos se leen del store recien la primera
+# vez que se usan: las rutas que no tocan `session` no hacen ninguna consulta.
+class ServerSession(SessionMixin):
+    def __init__(self, store, sid=None):
+        self.store = store
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.accessed = True
+            self._data = (self.store.get(self.sid) if self.sid else None) or {}
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _signer(app):
+    return Signer(app.secret_key, salt=SIGNER_SALT, key_derivation='hmac')
+
+
+# Valor de la cookie: solo el id de sesion firmado (unos 60 bytes)
+def session_cookie(app, sid):
+    return _signer(app).sign(sid).decode()
+
+
+# Datos de una cookie de sesion de Flask (SESSION_BACKEND=cookie o de antes del
+# cambio a sesiones en el servidor), o None si no lo es
+def legacy_session_data(app, cookie):
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    try:
+        return serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+
+
+# La cookie lleva solo el id de sesion; los datos quedan en Redis o MongoDB,
+# compartidos por todos los workers y nodos. Solo se escribe si la sesion cambio;
+# si solo se leyo se extiende su vencimiento.
+# Una cookie de sesion de Flask se convierte en una sesion nueva del servidor
+# (pasando sus datos por `migrate`), asi nadie pierde la sesion con el cambio.
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store, migrate=None):
+        self.store = store
+        self.migrate = migrate
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        sid = None
+        if cookie:
+            try:
+                sid = _signer(app).unsign(cookie).decode()
+            except BadSignature:
+                legacy = legacy_session_data(app, cookie)
+                if legacy:
+                    session = ServerSession(self.store)
+                    session._data = dict(legacy)
+                    if self.migrate is not None:
+                        self.migrate(session._data)
+                    session.modified = True
+                    return session
+        return ServerSession(self.store, sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session.modified:
+            if session.accessed and session.sid is not None and session:
+                self.store.touch(session.sid, app.permanent_session_lifetime)
+                if session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST']:
+                    response.set_cookie(
+                        name, session_cookie(app, session.sid),
+                        expires=self.get_expiration_time(app, session),
+                        httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite
+                    )
+            return
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly)
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(24)
+        self.store.set(session.sid, dict(session), app.permanent_session_lifetime)
+        if session.new or session.permanent:
+            response.set_cookie(
+                name, session_cookie(app, session.sid),
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite
+            )
+
+
+# SESSION_BACKEND: redis, mongo o cookie (la sesion firmada de Flask)
+def create_session_interface(get_collection, migrate=None):
+    backend = os.getenv('SESSION_BACKEND', default_shared_backend())
+    if backend == 'cookie':
+        return None
+    if backend == 'redis':
+        return ServerSessionInterface(RedisSessionStore(os.getenv('REDIS_URL', 'redis://localhost:6379/0')), migrate)
+    return ServerSessionInterface(MongoSessionStore(get_collection), migrate)
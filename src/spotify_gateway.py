@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from spotipy.exceptions import SpotifyException
+from metrics import observe_dependency
+from ratelimit import TokenBucket
+
+logger = logging.getLogger('songbox.spotify')
+
+
+# Spotify esta limitando las peticiones (429) o la cola local esta llena
+class SpotifyThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Spotify limitado, reintentar en {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+# Una llamada en curso; las identicas que llegan mientras tanto esperan su resultado
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _retry_after(e, default):
+    headers = getattr(e, 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('Retry-After', default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# Todas las llamadas a la API de Spotify pasan por aqui:
+# - Un token bucket limita las llamadas por segundo del worker (el limite de
+#   Spotify es por credencial de la app, compartido por todos los usuarios).
+#   Si no hay cupo se espera hasta `max_wait` segundos; con mas de `max_queue`
+#   llamadas esperando, o si la espera seria mas larga, se responde SpotifyThrottled.
+# - Ante un 429 se respeta Retry-After: hasta entonces no sale ninguna llamada.
+# - Las llamadas identicas en curso (misma `key`) se juntan en una sola.
+# - Cada llamada que sale se mide en songbox_dependency_duration_seconds con
+#   `operation` (por defecto key[0]); cualquier excepcion cuenta como error,
+#   tambien los timeouts y errores de conexion que no generan respuesta.
+# `clock` y `sleep` son inyectables para probarlo sin esperar.
+class SpotifyGateway:
+    def __init__(self, rate=10, burst=20, max_wait=2, max_queue=50, default_retry_after=1,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.default_retry_after = default_retry_after
+        self.clock = clock
+        self.sleep = sleep
+        self.calls = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.queued = 0
+        self.max_queued = 0
+        self._blocked_until = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def call(self, key, fetch, operation=None):
+        if operation is None:
+            operation = key[0] if key else 'call'
+        if key is None:
+            return self._call(fetch, operation)
+
+        with self._lock:
+            current = self._in_flight.get(key)
+            leader = current is None
+            if leader:
+                current = self._in_flight[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            current.done.wait()
+            if current.error is not None:
+                raise current.error
+            return current.result
+
+        try:
+            current.result = self._call(fetch, operation)
+            return current.result
+        except Exception as e:
+            current.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            current.done.set()
+
+    def _call(self, fetch, operation):
+        self._acquire()
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+        try:
+            result = fetch()
+        except Exception as e:
+            observe_dependency('spotify', operation, time.perf_counter() - start, error=True)
+            if not isinstance(e, SpotifyException) or e.http_status != 429:
+                raise
+            retry_after = _retry_after(e, self.default_retry_after)
+            with self._lock:
+                self.rate_limited += 1
+                self._blocked_until = max(self._blocked_until, self.clock() + retry_after)
+            logger.warning("Spotify respondio 429, pausa de %ss", retry_after)
+            raise SpotifyThrottled(retry_after) from e
+        observe_dependency('spotify', operation, time.perf_counter() - start)
+        return result
+
+    def _throttled(self, retry_after):
+        with self._lock:
+            self.throttled += 1
+        return SpotifyThrottled(retry_after)
+
+    def _acquire(self):
+        deadline = self.clock() + self.max_wait
+        with self._lock:
+            full = self.queued >= self.max_queue
+            if not full:
+                self.queued += 1
+                self.max_queued = max(self.max_queued, self.queued)
+        if full:
+            raise self._throttled(self.max_wait)
+
+        try:
+            while True:
+                now = self.clock()
+                blocked = self._blocked_until - now
+                if blocked > 0:
+                    # Despues de un 429 no vale la pena esperar en la cola
+                    raise self._throttled(blocked)
+                if self.bucket.try_acquire():
+                    return
+                wait = self.bucket.wait_time()
+                if now + wait > deadline:
+                    raise self._throttled(wait)
+                self.sleep(wait)
+        finally:
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'throttled': self.throttled,
+                'rate_limited': self.rate_limited,
+                'queued': self.queued,
+                'max_queued': self.max_queued,
+                'in_flight': len(self._in_flight),
+                'blocked_seconds': round(max(0, self._blocked_until - self.clock()), 3),
+            }
+
+
+# Crea el gateway segun las variables de entorno
+def create_spotify_gateway():
+    return SpotifyGateway(
+        rate=float(os.getenv('SPOTIFY_RATE_LIMIT', 10)),
+        burst=int(os.getenv('SPOTIFY_RATE_BURST', 20)),
+        max_wait=float(os.getenv('SPOTIFY_QUEUE_TIMEOUT', 2)),
+        max_queue=int(os.getenv('SPOTIFY_MAX_QUEUE', 50))
+    )
@@ -1,47 +1,260 @@
 import os
 import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from flask import session, jsonify
+from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
+from spotipy.cache_handler import CacheHandler, MemoryCacheHandler
+from flask import current_app, session, jsonify, g
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+import threading
 import time
+from collections import OrderedDict
 from functools import wraps
+from metrics import observe_dependency, spotify_response_hook
+from token_store import user_token_key
+
+logger = logging.getLogger('songbox.spotify')
+
+_http_session = None
+_app_client = None
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+# Sesion HTTP compartida por todas las peticiones del worker: reutiliza las
+# conexiones TCP/TLS con api.spotify.com en vez de abrir una por request
+def get_http_session():
+    global _http_session
+    if _http_session is None:
+        with _clients_lock:
+            if _http_session is None:
+                _http_session = _build_http_session()
+    return _http_session
+
+
+def _build_http_session():
+    pool_size = int(os.getenv('SPOTIFY_POOL_SIZE', 10))
+    retry = Retry(
+        total=int(os.getenv('SPOTIFY_MAX_RETRIES', 3)),
+        backoff_factor=float(os.getenv('SPOTIFY_BACKOFF_FACTOR', 0.3)),
+        # Los 429 no se reintentan aqui (dormiria el worker durante Retry-After):
+        # los maneja el gateway (spotify_gateway.py). Sin respect_retry_after_header
+        # urllib3 reintentaria igual un 429 (o 503) que trae Retry-After.
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        respect_retry_after_header=False,
+        raise_on_status=False  # spotipy se encarga del error final
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    http = requests.Session()
+    http.hooks['response'].append(spotify_response_hook)
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    if os.getenv('SPOTIFY_KEEPALIVE', '1') == '0':
+        http.headers['Connection'] = 'close'
+    return http
+
+
+# Devuelve un cliente de spotipy por token, todos sobre la misma sesion HTTP
+def get_spotify_client(access_token):
+    with _clients_lock:
+        sp = _clients.get(access_token)
+        if sp is not None:
+            _clients.move_to_end(access_token)
+            return sp
+
+    sp = spotipy.Spotify(
+        auth=access_token,
+        requests_session=get_http_session(),
+        requests_timeout=float(os.getenv('SPOTIFY_TIMEOUT', 5))
+    )
+    sp.prefix = os.getenv('SPOTIFY_API_URL', sp.prefix)
+
+    with _clients_lock:
+        _clients[access_token] = sp
+        while len(_clients) > int(os.getenv('SPOTIFY_CLIENT_CACHE_SIZE', 256)):
+            _clients.popitem(last=False)
+    return sp
+
+
+# Cliente con las credenciales de la app (client credentials), para leer el
+# catalogo en rutas publicas sin un usuario conectado a Spotify
+def get_app_spotify_client():
+    global _app_client
+    if _app_client is None:
+        http = get_http_session()
+        with _clients_lock:
+            if _app_client is None:
+                auth_manager = SpotifyClientCredentials(
+                    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+                    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
+                    cache_handler=MemoryCacheHandler(),
+                    requests_session=http
+                )
+                auth_manager.OAUTH_TOKEN_URL = os.getenv('SPOTIFY_TOKEN_URL', auth_manager.OAUTH_TOKEN_URL)
+                sp = spotipy.Spotify(
+                    auth_manager=auth_manager,
+                    requests_session=http,
+                    requests_timeout=float(os.getenv('SPOTIFY_TIMEOUT', 5))
+                )
+                sp.prefix = os.getenv('SPOTIFY_API_URL', sp.prefix)
+                _app_client = sp
+    return _app_client
+
+
+# Spotipy guarda el token en un archivo .cache compartido por todos los usuarios.
+# Los tokens viven en la sesion de cada usuario, asi que no se cachean aqui.
+class NoTokenCache(CacheHandler):
+    def get_cached_token(self):
+        return None
+
+    def save_token_to_cache(self, token_info):
+        pass
+
+
+# Un refresh en curso; los demas hilos con el mismo refresh_token esperan su resultado
+class _Refresh:
+    def __init__(self):
+        self.done = threading.Event()
+        self.token_info = None
+        self.error = None
+
+
+# Maneja la configuracion OAuth (se construye una sola vez) y los refresh de tokens.
+# Los refresh simultaneos del mismo refresh_token se juntan en una sola llamada a
+# Spotify, y el resultado se reutiliza durante `reuse_seconds` para los que llegan tarde.
+class SpotifyTokenManager:
+    def __init__(self, reuse_seconds=30):
+        self.reuse_seconds = reuse_seconds
+        self.refresh_calls = 0
+        self._oauth = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._recent = {}
+
+    @property
+    def oauth(self):
+        if self._oauth is None:
+            with self._lock:
+                if self._oauth is None:
+                    self._oauth = SpotifyOAuth(
+                        client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+                        client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
+                        redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
+                        scope="user-library-read playlist-read-private user-read-private",
+                        cache_handler=NoTokenCache(),
+                        requests_session=get_http_session()
+                    )
+                    self._oauth.OAUTH_TOKEN_URL = os.getenv('SPOTIFY_TOKEN_URL', self._oauth.OAUTH_TOKEN_URL)
+        return self._oauth
+
+    def refresh(self, refresh_token):
+        with self._lock:
+            recent = self._recent.get(refresh_token)
+            if recent and time.monotonic() - recent[1] < self.reuse_seconds:
+                return recent[0]
+
+            current = self._in_flight.get(refresh_token)
+            leader = current is None
+            if leader:
+                current = self._in_flight[refresh_token] = _Refresh()
+
+        if not leader:
+            current.done.wait()
+            if current.error is not None:
+                raise current.error
+            return current.token_info
+
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                self.refresh_calls += 1
+            current.token_info = self.oauth.refresh_access_token(refresh_token)
+            observe_dependency('spotify', 'token', time.perf_counter() - start)
+            with self._lock:
+                self._forget_old()
+                self._recent[refresh_token] = (current.token_info, time.monotonic())
+            return current.token_info
+        except Exception as e:
+            observe_dependency('spotify', 'token', time.perf_counter() - start, error=True)
+            current.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[refresh_token]
+            current.done.set()
+
+    def _forget_old(self):
+        now = time.monotonic()
+        for key in [k for k, (_, at) in self._recent.items() if now - at >= self.reuse_seconds]:
+            del self._recent[key]
+
+
+token_manager = SpotifyTokenManager()
+
 
 # Autenticacion con spotify
 def create_spotify_oauth():
-    return SpotifyOAuth(
-        client_id=os.getenv("SPOTIFY_CLIENT_ID"),
-        client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
-        redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
-        scope="user-library-read playlist-read-private user-read-private"
-    )
+    return token_manager.oauth
+
+# Clave del token de Spotify de esta peticion: la guardada en la sesion o,
+# desde otro dispositivo, la del usuario del JWT si vinculo su cuenta
+def spotify_token_key():
+    key = session.get('spotify_token_key')
+    if key:
+        return key
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except (JWTExtendedException, PyJWTError):
+        # JWT vencido o invalido: se sigue como si no hubiera (la ruta no lo exige)
+        identity = None
+    return user_token_key(identity) if identity else None
+
+
+def get_token_store():
+    return current_app.extensions['spotify_token_store']
+
 
 def get_spotify_token():
-    token_info = session.get('token_info', {})
-    print("Token info:", token_info)
+    # Dentro de una misma peticion el token se resuelve una sola vez
+    if 'spotify_token_info' in g:
+        return g.spotify_token_info
+
+    key = spotify_token_key()
+    token_info = get_token_store().get(key) if key else None
     
     if not token_info or 'access_token' not in token_info or 'refresh_token' not in token_info:
-        print("No se encontro un token de spotify valido")
-        return None
-    
-    if token_info['expires_at'] - int(time.time()) < 60:
-        print("El token ha expirado, refrescando token ...")
-        token_info = refresh_spotify_token(create_spotify_oauth())
-        print("Token después de refrescar:", token_info)  # Agregado para verificar
-        session['token_info'] = token_info  # Asegúrate de que esta línea esté aquí
+        logger.debug("No se encontro un token de spotify valido")
+        token_info = None
+    elif token_info['expires_at'] - int(time.time()) < 60:
+        logger.debug("El token ha expirado, refrescando token ...")
+        token_info = refresh_spotify_token(key, token_info)
 
+    g.spotify_token_info = token_info
     return token_info
 
 
-def refresh_spotify_token(sp_oauth):
-    token_info = session.get('token_info', {})
+# Refresca y guarda el token en el store: los demas workers, nodos y
+# dispositivos del usuario leen el token nuevo en vez de refrescar otra vez
+def refresh_spotify_token(key, token_info):
     try:
         # Refrescar el token de acceso
-        token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-        session['token_info'] = token_info
-        print("Token refrescado exitosamente.")
+        token_info = token_manager.refresh(token_info['refresh_token'])
+        get_token_store().set(key, token_info)
+        logger.info("Token refrescado exitosamente", extra={'expires_at': token_info.get('expires_at')})
     except Exception as e:
-        print(f"Error al refrescar el token: {str(e)}")
+        logger.warning("Error al refrescar el token: %s", e)
+        # Solo se descarta si Spotify rechazo el refresh_token (revocado)
+        if getattr(e, 'error', None) == 'invalid_grant':
+            get_token_store().delete(key)
         return None
 
+    g.spotify_token_info = token_info
     return token_info
 
 def spotify_token_required(f):
@@ -51,8 +264,5 @@ def spotify_token_required(f):
         if token_info is None:
             return jsonify({'message' : 'Por favor, inicia sesion en Spotify'}), 401
         
-        return f(*args, *kwargs)
+        return f(*args, **kwargs)
     return decorated_function
-        
-
-
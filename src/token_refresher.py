@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from ratelimit import TokenBucket
+
+logger = logging.getLogger('songbox.token_refresher')
+
+
+# Refresca en segundo plano los tokens de Spotify del store antes de que venzan,
+# asi get_spotify_token() casi nunca tiene que refrescar dentro de una peticion.
+# - Cada token se refresca `lead` segundos antes de vencer, menos un desfase
+#   estable por token de hasta `jitter` segundos para repartir los refresh.
+# - Un token bucket limita los refresh por segundo hacia Spotify y, si Spotify
+#   falla (429, 5xx, red), se pausa con backoff exponencial.
+# - Con varios workers o nodos cada token se reclama en el store antes de
+#   refrescarlo (y antes de gastar cupo del bucket), asi lo refresca uno solo.
+# - Solo se refrescan los tokens usados en las ultimas `active` segundos; el
+#   refresco no cuenta como uso, asi los abandonados vencen por TOKEN_RETENTION.
+# `clock` es inyectable para probarlo con un reloj falso.
+class TokenRefresher:
+    def __init__(self, store, refresh, lead=300, jitter=120, rate=5, batch=100,
+                 interval=15, backoff=5, max_backoff=300, active=86400, clock=time.time):
+        self.store = store
+        self.refresh = refresh
+        self.lead = lead
+        self.jitter = jitter
+        self.active = active
+        self.batch = batch
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.bucket = TokenBucket(rate, clock=clock)
+        self.refreshed = 0
+        self.failed = 0
+        self.revoked = 0
+        self.throttled = 0
+        self._failures = 0
+        self._paused_until = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _offset(self, key):
+        if not self.jitter:
+            return 0
+        return int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) % self.jitter
+
+    def due_at(self, key, token_info):
+        return token_info['expires_at'] - self.lead - self._offset(key)
+
+    # Una pasada: refresca los tokens que ya entraron en su ventana.
+    # Devuelve cuantos refresco.
+    def run_once(self):
+        now = self.clock()
+        if now < self._paused_until:
+            return 0
+
+        done = 0
+        for key, token_info in self.store.expiring(now + self.lead + self.jitter, self.batch, now - self.active):
+            if self.due_at(key, token_info) > now:
+                continue
+            # Primero el claim: los tokens que refresca otro worker no gastan cupo
+            if not self.store.claim(key, self.interval * 4):
+                continue
+            if not self.bucket.try_acquire():
+                # Sin cupo: el resto queda para la proxima pasada
+                self.store.release(key)
+                self.throttled += 1
+                break
+            if not self._refresh_one(key, token_info):
+                break
+            done += 1
+        return done
+
+    def _refresh_one(self, key, token_info):
+        try:
+            new_token = self.refresh(token_info['refresh_token'])
+        except Exception as e:
+            if getattr(e, 'error', None) == 'invalid_grant':
+                # El usuario revoco el acceso: el token ya no sirve
+                self.revoked += 1
+                self.store.delete(key)
+                return True
+            self.failed += 1
+            self._failures += 1
+            pause = min(self.max_backoff, self.backoff * 2 ** (self._failures - 1))
+            self._paused_until = self.clock() + pause
+            self.store.release(key)
+            logger.warning("Error al refrescar tokens de Spotify, pausa de %ss: %s", pause, e)
+            return False
+
+        self._failures = 0
+        self.store.update(key, new_token)
+        self.refreshed += 1
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Error en el refresco de tokens de Spotify")
+
+    # Un hilo por proceso; se arranca despues del fork (init_mongo)
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='spotify-token-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'revoked': self.revoked,
+            'throttled': self.throttled,
+            'paused': int(self.clock() < self._paused_until),
+        }
+
+
+def create_token_refresher(store, refresh):
+    return TokenRefresher(
+        store, refresh,
+        lead=int(os.getenv('SPOTIFY_PREREFRESH_LEAD', 300)),
+        jitter=int(os.getenv('SPOTIFY_PREREFRESH_JITTER', 120)),
+        rate=float(os.getenv('SPOTIFY_PREREFRESH_RATE', 5)),
+        interval=int(os.getenv('SPOTIFY_PREREFRESH_INTERVAL', 15)),
+        active=int(float(os.getenv('SPOTIFY_PREREFRESH_ACTIVE_HOURS', 24)) * 3600)
+    )
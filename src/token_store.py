@@ -0,0 +1,189 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sessions import default_shared_backend
+
+# Los tokens sin uso se descartan despues de este tiempo (el refresh_token de
+# Spotify no vence, pero un token abandonado no tiene por que quedar guardado)
+TOKEN_RETENTION = timedelta(days=int(os.getenv('SPOTIFY_TOKEN_RETENTION_DAYS', 90)))
+
+# get() registra el ultimo uso (last_used_at) como mucho una vez por este tiempo,
+# asi una lectura casi nunca escribe
+USE_RESOLUTION = 3600
+
+
+# Clave de un token vinculado a la cuenta (compartido entre dispositivos)
+def user_token_key(email):
+    return f'user:{email}'
+
+
+# Clave de un token de una sola sesion (antes de vincularlo)
+def session_token_key(nonce):
+    return f'session:{nonce}'
+
+
+# Ademas de cada token guarda un sorted set clave -> expires_at para que el
+# refresco en segundo plano encuentre los que estan por vencer sin recorrerlos
+# todos, y otro clave -> ultimo uso para refrescar solo los que se estan usando.
+# Los tokens sin uso salen del primero; get() los vuelve a agregar.
+class RedisTokenStore:
+    def __init__(self, url, prefix='songbox:spotify_token:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.expiry_key = prefix.rstrip(':') + '_expiry'
+        self.used_key = prefix.rstrip(':') + '_used'
+        self.claim_prefix = prefix.rstrip(':') + '_claim:'
+
+    # Un uso: extiende la retencion del token
+    def get(self, key):
+        pipe = self._client.pipeline(transaction=False)
+        pipe.get(self.prefix + key)
+        pipe.zscore(self.used_key, key)
+        raw, last_used = pipe.execute()
+        if raw is None:
+            return None
+        token_info = json.loads(raw)
+        now = time.time()
+        if last_used is None or now - last_used >= USE_RESOLUTION:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.expire(self.prefix + key, int(TOKEN_RETENTION.total_seconds()))
+            pipe.zadd(self.used_key, {key: now})
+            if token_info.get('refresh_token'):
+                pipe.zadd(self.expiry_key, {key: token_info['expires_at']})
+            pipe.execute()
+        return token_info
+
+    def set(self, key, token_info):
+        pipe = self._client.pipeline()
+        pipe.set(self.prefix + key, json.dumps(token_info), ex=int(TOKEN_RETENTION.total_seconds()))
+        pipe.zadd(self.used_key, {key: time.time()})
+        if token_info.get('refresh_token'):
+            pipe.zadd(self.expiry_key, {key: token_info['expires_at']})
+        else:
+            pipe.zrem(self.expiry_key, key)
+        pipe.delete(self.claim_prefix + key)
+        pipe.execute()
+
+    # Guarda un token refrescado en segundo plano: no es un uso, asi que no
+    # extiende la retencion (KEEPTTL) ni crea el token si ya se descarto
+    def update(self, key, token_info):
+        if not self._client.set(self.prefix + key, json.dumps(token_info), keepttl=True, xx=True):
+            self.delete(key)
+            return
+        pipe = self._client.pipeline()
+        pipe.zadd(self.expiry_key, {key: token_info['expires_at']})
+        pipe.delete(self.claim_prefix + key)
+        pipe.execute()
+
+    def delete(self, key):
+        pipe = self._client.pipeline()
+        pipe.delete(self.prefix + key)
+        pipe.zrem(self.expiry_key, key)
+        pipe.zrem(self.used_key, key)
+        pipe.execute()
+
+    # Tokens usados desde `used_since` que vencen antes de `before` (epoch),
+    # los mas proximos primero
+    def expiring(self, before, limit, used_since=0):
+        keys = [k.decode() for k in self._client.zrangebyscore(self.expiry_key, '-inf', before, start=0, num=limit)]
+        if not keys:
+            return []
+        pipe = self._client.pipeline(transaction=False)
+        pipe.mget([self.prefix + k for k in keys])
+        pipe.zmscore(self.used_key, keys)
+        raws, last_used = pipe.execute()
+        found = []
+        for key, raw, used in zip(keys, raws, last_used):
+            if raw is None or used is None or used < used_since:
+                # Descartado por TOKEN_RETENTION o sin uso: se saca del indice
+                self._client.zrem(self.expiry_key, key)
+                if raw is None:
+                    self._client.zrem(self.used_key, key)
+            else:
+                found.append((key, json.loads(raw)))
+        return found
+
+    # Reserva el refresco de un token por `seconds` (un solo worker o nodo lo refresca)
+    def claim(self, key, seconds):
+        return bool(self._client.set(self.claim_prefix + key, 1, nx=True, ex=max(1, int(seconds))))
+
+    def release(self, key):
+        self._client.delete(self.claim_prefix + key)
+
+
+# Tokens en la coleccion `spotify_tokens` (el indice TTL sobre discard_at borra
+# los abandonados). last_used_at (epoch) es el ultimo uso desde una peticion.
+class MongoTokenStore:
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+
+    # Un uso: extiende la retencion del token
+    def get(self, key):
+        doc = self.get_collection().find_one({'_id': key}, {'token_info': 1, 'last_used_at': 1})
+        if not doc:
+            return None
+        now = time.time()
+        if now - (doc.get('last_used_at') or 0) >= USE_RESOLUTION:
+            self.get_collection().update_one({'_id': key}, {'$set': {
+                'last_used_at': now,
+                'discard_at': datetime.now(timezone.utc) + TOKEN_RETENTION
+            }})
+        return doc['token_info']
+
+    def set(self, key, token_info):
+        self.get_collection().update_one(
+            {'_id': key},
+            {'$set': {
+                'token_info': token_info,
+                'expires_at': token_info.get('expires_at'),
+                'last_used_at': time.time(),
+                'discard_at': datetime.now(timezone.utc) + TOKEN_RETENTION
+            }, '$unset': {'refresh_claim': ''}},
+            upsert=True
+        )
+
+    # Guarda un token refrescado en segundo plano: no es un uso, asi que no
+    # extiende la retencion ni crea el token si ya se descarto
+    def update(self, key, token_info):
+        self.get_collection().update_one(
+            {'_id': key},
+            {'$set': {'token_info': token_info, 'expires_at': token_info.get('expires_at')},
+             '$unset': {'refresh_claim': ''}}
+        )
+
+    def delete(self, key):
+        self.get_collection().delete_one({'_id': key})
+
+    # Tokens usados desde `used_since` que vencen antes de `before` (epoch),
+    # los mas proximos primero
+    def expiring(self, before, limit, used_since=0):
+        cursor = self.get_collection().find(
+            {
+                'expires_at': {'$lte': before},
+                'last_used_at': {'$gte': used_since},
+                'token_info.refresh_token': {'$exists': True}
+            },
+            {'token_info': 1}
+        ).sort('expires_at', 1).limit(limit)
+        return [(doc['_id'], doc['token_info']) for doc in cursor]
+
+    # Reserva el refresco de un token por `seconds` (un solo worker o nodo lo refresca)
+    def claim(self, key, seconds):
+        now = datetime.now(timezone.utc)
+        result = self.get_collection().update_one(
+            {'_id': key, '$or': [{'refresh_claim': {'$exists': False}}, {'refresh_claim': {'$lte': now}}]},
+            {'$set': {'refresh_claim': now + timedelta(seconds=seconds)}}
+        )
+        return result.modified_count == 1
+
+    def release(self, key):
+        self.get_collection().update_one({'_id': key}, {'$unset': {'refresh_claim': ''}})
+
+
+# SPOTIFY_TOKEN_BACKEND: redis o mongo
+def create_token_store(get_collection):
+    if os.getenv('SPOTIFY_TOKEN_BACKEND', default_shared_backend()) == 'redis':
+        return RedisTokenStore(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    return MongoTokenStore(get_collection)
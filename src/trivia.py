@@ -0,0 +1,447 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from bson import Int64
+from pymongo import DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from sessions import default_shared_backend
+
+logger = logging.getLogger('songbox.trivia')
+
+GLOBAL_SCOPE = 'global'
+
+
+def trivia_scope(trivia_id):
+    return f'trivia:{trivia_id}'
+
+
+# Los tags son filtros de /trivia/next: lista de strings no vacios
+def valid_tags(tags):
+    return isinstance(tags, list) and all(isinstance(tag, str) and tag for tag in tags)
+
+
+# Registro de respuestas en `trivia_answers`. Las respuestas se encolan y un
+# hilo las escribe con insert_many cada `batch_size` respuestas o `flush_interval`
+# segundos, en vez de un insert (o un $push al documento de la trivia) por respuesta.
+class AnswerLog:
+    def __init__(self, get_collection, batch_size=100, flush_interval=0.2):
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def add(self, answer):
+        self._queue.put(answer)
+        self._ensure_thread()
+
+    # El hilo no sobrevive al fork: cada worker arranca el suyo en la primera respuesta
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='trivia-answers', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _take_batch(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self.get_collection().insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception:
+            self.errors += len(batch)
+            logger.exception("No se pudieron guardar %d respuestas de trivia", len(batch))
+
+    # Escribe lo que quede en la cola (al salir del proceso)
+    def flush(self):
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        return {'pending': self._queue.qsize(), 'written': self.written, 'errors': self.errors}
+
+
+# Leaderboards pre-agregados en la coleccion `leaderboards`: un documento por
+# (scope, user) con su puntaje. El top se lee del indice (scope, score desc).
+class MongoLeaderboard:
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+
+    # Solo cuenta la primera respuesta de cada usuario a cada trivia. La entrada
+    # de la trivia y el $inc del global van en un solo bulk_write ordenado: si la
+    # entrada ya existia (clave duplicada) el global no se toca.
+    def record(self, trivia_id, user, points):
+        now = datetime.now(timezone.utc).isoformat()
+        collection = self.get_collection()
+        global_filter = {'scope': GLOBAL_SCOPE, 'user': user}
+        global_update = {'$inc': {'score': points}, '$set': {'updated_at': now}}
+        ops = [InsertOne({'scope': trivia_scope(trivia_id), 'user': user, 'score': points, 'updated_at': now})]
+        if points:
+            ops.append(UpdateOne(global_filter, global_update, upsert=True))
+        try:
+            collection.bulk_write(ops, ordered=True)
+        except BulkWriteError as e:
+            error = e.details['writeErrors'][0]
+            if error['code'] != 11000:
+                raise
+            if error['index'] == 0:
+                return False
+            # Otro worker creo la entrada global al mismo tiempo: ahora el update la encuentra
+            collection.update_one(global_filter, global_update)
+        return True
+
+    def top(self, scope, limit):
+        cursor = self.get_collection().find(
+            {'scope': scope}, {'_id': 0, 'user': 1, 'score': 1}
+        ).sort([('score', DESCENDING), ('user', 1)]).limit(limit)
+        return [(entry['user'], entry['score']) for entry in cursor]
+
+    # Al borrar una trivia se descuentan sus puntos del global y se borra su leaderboard
+    def remove_trivia(self, trivia_id, batch_size=1000):
+        collection = self.get_collection()
+        scope = trivia_scope(trivia_id)
+        now = datetime.now(timezone.utc).isoformat()
+        ops = []
+        for entry in collection.find({'scope': scope, 'score': {'$ne': 0}}, {'user': 1, 'score': 1}):
+            ops.append(UpdateOne(
+                {'scope': GLOBAL_SCOPE, 'user': entry['user']},
+                {'$inc': {'score': -entry['score']}, '$set': {'updated_at': now}}
+            ))
+            if len(ops) >= batch_size:
+                collection.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+        collection.delete_many({'scope': scope})
+
+
+# Leaderboards en sorted sets de Redis (ZADD NX para la primera respuesta,
+# ZINCRBY para el global). Compartidos por todos los workers.
+class RedisLeaderboard:
+    def __init__(self, url, prefix='songbox:leaderboard:'):
+        import redis
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def record(self, trivia_id, user, points):
+        if not self._client.zadd(self.prefix + trivia_scope(trivia_id), {user: points}, nx=True):
+            return False
+        if points:
+            self._client.zincrby(self.prefix + GLOBAL_SCOPE, points, user)
+        return True
+
+    def top(self, scope, limit):
+        entries = self._client.zrevrange(self.prefix + scope, 0, limit - 1, withscores=True)
+        return [(user, int(score)) for user, score in entries]
+
+    # Descuenta los puntos de la trivia del global y borra su leaderboard en una transaccion
+    def remove_trivia(self, trivia_id):
+        scope = self.prefix + trivia_scope(trivia_id)
+
+        def remove(pipe):
+            entries = pipe.zrange(scope, 0, -1, withscores=True)
+            pipe.multi()
+            for user, score in entries:
+                if score:
+                    pipe.zincrby(self.prefix + GLOBAL_SCOPE, -score, user)
+            pipe.delete(scope)
+
+        self._client.transaction(remove, scope)
+
+
+def create_answer_log(get_collection):
+    log = AnswerLog(
+        get_collection,
+        batch_size=int(os.getenv('TRIVIA_ANSWER_BATCH_SIZE', 100)),
+        flush_interval=float(os.getenv('TRIVIA_ANSWER_FLUSH_MS', 200)) / 1000
+    )
+    atexit.register(log.flush)
+    return log
+
+
+def create_leaderboard(get_collection):
+    if os.getenv('LEADERBOARD_BACKEND', 'mongo') == 'redis':
+        return RedisLeaderboard(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    return MongoLeaderboard(get_collection)
+
+
+# Filtro de Bloom sobre un bitset: `bits` bits y `hashes` posiciones por pregunta.
+# Puede dar falsos positivos (una pregunta no vista se salta), nunca repite una vista.
+# El orden de los bits es el de SETBIT de Redis (bit 0 = bit mas alto del byte 0).
+class BloomFilter:
+    def __init__(self, bits=8192, hashes=4):
+        self.bits = bits
+        self.hashes = hashes
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    @staticmethod
+    def contains(bitset, positions):
+        for position in positions:
+            index = position >> 3
+            if index >= len(bitset) or not bitset[index] & (0x80 >> (position & 7)):
+                return False
+        return True
+
+
+# Preguntas vistas por usuario, en memoria del proceso (LRU de usuarios)
+class MemorySeenSets:
+    def __init__(self, bloom, max_users=10000):
+        self.bloom = bloom
+        self.max_users = max_users
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def snapshot(self, user):
+        with self._lock:
+            bitset = self._sets.get(user)
+            return bytes(bitset) if bitset is not None else b''
+
+    def add(self, user, positions):
+        with self._lock:
+            bitset = self._sets.get(user)
+            if bitset is None:
+                bitset = self._sets[user] = bytearray((self.bloom.bits + 7) // 8)
+            self._sets.move_to_end(user)
+            for position in positions:
+                bitset[position >> 3] |= 0x80 >> (position & 7)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+
+
+# Preguntas vistas por usuario en Redis, compartidas entre workers.
+# Un GET trae el bitset completo (bits/8 bytes) y los SETBIT van en un pipeline.
+class RedisSeenSets:
+    def __init__(self, bloom, url, ttl=30 * 86400, prefix='songbox:trivia_seen:'):
+        import redis
+        self.bloom = bloom
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def snapshot(self, user):
+        return self._client.get(self.prefix + user) or b''
+
+    def add(self, user, positions):
+        pipeline = self._client.pipeline(transaction=False)
+        for position in positions:
+            pipeline.setbit(self.prefix + user, position, 1)
+        pipeline.expire(self.prefix + user, self.ttl)
+        pipeline.execute()
+
+
+# Preguntas vistas por usuario en MongoDB (coleccion `trivia_seen`), compartidas
+# entre workers cuando no hay Redis. Un documento por usuario con el bitset en
+# palabras int64 (`w.<indice>`, bits/64 como maximo); add() enciende los bits con
+# $bit or, sin leer antes, y snapshot() arma los bytes en el orden de SETBIT. El
+# indice TTL sobre discard_at borra los de usuarios inactivos.
+class MongoSeenSets:
+    def __init__(self, bloom, get_collection, ttl=30 * 86400):
+        self.bloom = bloom
+        self.get_collection = get_collection
+        self.ttl = ttl
+        self.words = (bloom.bits + 63) // 64
+
+    # Mascara por palabra; bit 0 = bit mas alto de la palabra 0
+    @staticmethod
+    def word_masks(positions):
+        masks = {}
+        for position in positions:
+            masks[position >> 6] = masks.get(position >> 6, 0) | (1 << (63 - (position & 63)))
+        return masks
+
+    # Los int64 de MongoDB tienen signo: se guarda el complemento a dos
+    @staticmethod
+    def to_int64(word):
+        return Int64(word - (1 << 64) if word >= 1 << 63 else word)
+
+    def bitset(self, words):
+        bitset = bytearray(self.words * 8)
+        for index, word in words.items():
+            index = int(index)
+            # Palabras de un filtro mas grande (si se achico TRIVIA_SEEN_BITS)
+            if index < self.words:
+                bitset[index * 8:(index + 1) * 8] = (word & 0xFFFFFFFFFFFFFFFF).to_bytes(8, 'big')
+        return bytes(bitset[:(self.bloom.bits + 7) // 8])
+
+    def snapshot(self, user):
+        doc = self.get_collection().find_one({'_id': user}, {'w': 1})
+        return self.bitset((doc or {}).get('w', {}))
+
+    def add(self, user, positions):
+        masks = self.word_masks(positions)
+        self.get_collection().update_one(
+            {'_id': user},
+            {
+                '$bit': {f'w.{index}': {'or': self.to_int64(mask)} for index, mask in masks.items()},
+                '$set': {'discard_at': datetime.now(timezone.utc) + timedelta(seconds=self.ttl)}
+            },
+            upsert=True
+        )
+
+
+# Pool de preguntas precalculado para /trivia/next: se carga de MongoDB cada
+# `refresh_interval` segundos (en segundo plano, como el cache de busquedas) e
+# indexa las preguntas por album, cancion y tag. Elegir la siguiente no toca MongoDB.
+class QuestionPool:
+    def __init__(self, load, seen, refresh_interval=60, draws=32):
+        self.load = load
+        self.seen = seen
+        self.refresh_interval = refresh_interval
+        self.draws = draws
+        self.served = 0
+        self.exhausted = 0
+        self._questions = []
+        self._by_filter = {}
+        self._loaded_at = None
+        self._stale = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        questions = list(self.load())
+        by_filter = {}
+        for question in questions:
+            keys = [('album_id', question.get('album_id')), ('song_id', question.get('song_id'))]
+            keys += [('tag', tag) for tag in question.get('tags') or [] if isinstance(tag, str)]
+            for key in keys:
+                if key[1]:
+                    by_filter.setdefault(key, []).append(question)
+        with self._lock:
+            self._questions = questions
+            self._by_filter = by_filter
+            self._loaded_at = time.monotonic()
+            self._stale = False
+
+    # Se llama al crear o borrar trivias: el proximo pedido refresca el pool
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None:
+            self.refresh()
+            return
+        with self._lock:
+            expired = self._stale or time.monotonic() - self._loaded_at >= self.refresh_interval
+            if self._refreshing or not expired:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self.refresh()
+            except Exception:
+                # Se sigue sirviendo el pool anterior
+                logger.exception("No se pudo refrescar el pool de trivias")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _candidates(self, filters):
+        with self._lock:
+            if not filters:
+                return self._questions
+            lists = [self._by_filter.get(key, []) for key in filters.items()]
+        lists.sort(key=len)
+        candidates = lists[0]
+        for other in lists[1:]:
+            ids = {q['id'] for q in other}
+            candidates = [q for q in candidates if q['id'] in ids]
+        return candidates
+
+    # Siguiente pregunta no vista por el usuario, o None si ya vio todas
+    def next(self, user, filters):
+        self._ensure_fresh()
+        candidates = self._candidates(filters)
+        if not candidates:
+            return None
+
+        bitset = self.seen.snapshot(user)
+        bloom = self.seen.bloom
+        chosen = None
+        # Primero al azar; si casi todo esta visto, recorrer desde una posicion al azar
+        for _ in range(min(self.draws, len(candidates))):
+            question = random.choice(candidates)
+            if not bloom.contains(bitset, bloom.positions(question['id'])):
+                chosen = question
+                break
+        else:
+            start = random.randrange(len(candidates))
+            for i in range(len(candidates)):
+                question = candidates[(start + i) % len(candidates)]
+                if not bloom.contains(bitset, bloom.positions(question['id'])):
+                    chosen = question
+                    break
+
+        if chosen is None:
+            self.exhausted += 1
+            return None
+        self.seen.add(user, bloom.positions(chosen['id']))
+        self.served += 1
+        return chosen
+
+    def stats(self):
+        with self._lock:
+            return {
+                'questions': len(self._questions),
+                'filters': len(self._by_filter),
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+                'served': self.served,
+                'exhausted': self.exhausted,
+            }
+
+
+# Por defecto las preguntas vistas se comparten entre workers (Redis si hay
+# REDIS_URL, si no MongoDB); `memory` es por worker
+def create_question_pool(load, get_seen_collection):
+    bloom = BloomFilter(
+        bits=int(os.getenv('TRIVIA_SEEN_BITS', 8192)),
+        hashes=int(os.getenv('TRIVIA_SEEN_HASHES', 4))
+    )
+    backend = os.getenv('TRIVIA_SEEN_BACKEND', default_shared_backend())
+    if backend == 'redis':
+        seen = RedisSeenSets(bloom, os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    elif backend == 'mongo':
+        seen = MongoSeenSets(bloom, get_seen_collection)
+    else:
+        seen = MemorySeenSets(bloom, max_users=int(os.getenv('TRIVIA_SEEN_MAX_USERS', 10000)))
+    return QuestionPool(load, seen, refresh_interval=int(os.getenv('TRIVIA_POOL_REFRESH', 60)))
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from cache import MemoryBackend, RedisBackend, cache_redis_url
+from json_provider import dumps_bytes
+
+# Campos del usuario que nunca salen de la base de datos
+PROFILE_PROJECTION = {'_id': 0, 'password': 0}
+
+
+# Cache de perfiles por email en dos niveles: un LRU en memoria del proceso con
+# TTL corto y, opcionalmente, Redis compartido entre workers con un TTL mas largo.
+# invalidate() borra ambos niveles; en los otros workers la copia en memoria
+# vence sola despues de `ttl` segundos.
+class UserCache:
+    def __init__(self, memory, ttl=30, shared=None, shared_ttl=300):
+        self.memory = memory
+        self.ttl = ttl
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, email, load):
+        entry = self.memory.get(email)
+        if entry is not None:
+            self._count('hits')
+            return entry[0]
+
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(email)
+            except Exception:
+                self._count('errors')
+                entry = None
+            if entry is not None:
+                self._count('shared_hits')
+                self.memory.set(email, entry[0], time.time(), self.ttl)
+                return entry[0]
+
+        self._count('misses')
+        user = load(email)
+        if user is None:
+            return None
+        now = time.time()
+        self.memory.set(email, user, now, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(email, user, now, self.shared_ttl)
+            except Exception:
+                self._count('errors')
+        return user
+
+    def invalidate(self, email):
+        self.memory.delete(email)
+        if self.shared is not None:
+            try:
+                self.shared.delete(email)
+            except Exception:
+                self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'size': len(self.memory),
+            }
+
+
+# Usuario del token. El id y el nombre vienen en los claims (se agregan en el
+# login), asi que la mayoria de las rutas no consultan MongoDB; el perfil
+# completo se carga la primera vez que se pide y pasa por el cache.
+class UserContext:
+    def __init__(self, claims, cache, load):
+        self.email = claims['sub']
+        self._claims = claims
+        self._cache = cache
+        self._load = load
+        self._profile = None
+
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = self._cache.get(self.email, self._load)
+        return self._profile
+
+    # Los tokens emitidos antes de tener estos claims caen al perfil
+    @property
+    def username(self):
+        if 'username' in self._claims:
+            return self._claims['username']
+        return self.profile['username'] if self.profile else None
+
+    @property
+    def id(self):
+        return self._claims.get('uid')
+
+
+# Claims estables que viajan en el token
+def user_claims(user):
+    return {'uid': str(user['_id']), 'username': user.get('username')}
+
+
+def create_user_cache():
+    memory = MemoryBackend(int(os.getenv('USER_CACHE_MAX_ENTRIES', 4096)))
+    shared = None
+    if os.getenv('USER_CACHE_BACKEND', 'memory') == 'redis':
+        # Los perfiles son documentos de MongoDB (fechas, ObjectId, Decimal128): se
+        # guardan como los serializa la respuesta de /profile
+        shared = RedisBackend(cache_redis_url(), prefix='songbox:user:', dumps=dumps_bytes)
+    return UserCache(
+        memory,
+        ttl=int(os.getenv('USER_CACHE_TTL', 30)),
+        shared=shared,
+        shared_ttl=int(os.getenv('USER_CACHE_REDIS_TTL', 300))
+    )
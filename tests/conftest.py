@@ -0,0 +1,110 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+from benchmarks.harness import SRC, load_app
+from benchmarks.stub_spotify import StubSpotify
+
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'requires_mongod: necesita un mongod real (no corre con mongomock)')
+
+
+# MongoDB de las pruebas: TEST_MONGO_URI (un mongod desechable), si no un mongod
+# temporal de pymongo_inmemory y, si no se puede descargar, mongomock. Las pruebas
+# que usan funciones del servidor que mongomock no tiene ($topN, updates con
+# pipeline, explain) se marcan con requires_mongod y se saltan con mongomock.
+def _mongo_client():
+    uri = os.getenv('TEST_MONGO_URI')
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+    try:
+        import pymongo_inmemory
+        # 5.2+ para $topN (flask comments reconcile)
+        os.environ.setdefault('PYMONGOIM__MONGO_VERSION', '7.0')
+        return pymongo_inmemory.MongoClient()
+    except Exception:
+        import mongomock
+        return mongomock.MongoClient()
+
+
+def is_mongomock(client):
+    return type(client).__module__.startswith('mongomock')
+
+
+@pytest.fixture(scope='session')
+def mongo_client():
+    client = _mongo_client()
+    yield client
+    client.close()
+
+
+# Una base nueva por prueba
+@pytest.fixture
+def db(mongo_client):
+    name = f'songbox_test_{uuid.uuid4().hex[:12]}'
+    yield mongo_client[name]
+    mongo_client.drop_database(name)
+
+
+@pytest.fixture(autouse=True)
+def _requires_mongod(request):
+    if request.node.get_closest_marker('requires_mongod') and is_mongomock(request.getfixturevalue('mongo_client')):
+        pytest.skip('necesita un mongod (TEST_MONGO_URI o pymongo_inmemory)')
+
+
+# Stub de Spotify sin latencia; las pruebas pueden cambiar stub.latency y forzar
+# respuestas con respond_with(), ambas se restablecen al terminar cada prueba
+@pytest.fixture(scope='session')
+def stub():
+    stub = StubSpotify(latency=0).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture(autouse=True)
+def _reset_stub(request):
+    yield
+    if 'stub' in request.fixturenames:
+        stub = request.getfixturevalue('stub')
+        stub.reset()
+        stub.latency = 0
+
+
+# Modulo de la app (se importa una sola vez) con Spotify apuntando al stub
+@pytest.fixture(scope='session')
+def songbox(stub):
+    os.environ['SPOTIFY_TOKEN_URL'] = stub.url + '/api/token'
+    os.environ['SPOTIFY_PREREFRESH'] = '0'
+    return load_app(stub.api_url)
+
+
+# La app sobre la base de la prueba, con los indices declarados
+@pytest.fixture
+def app_db(songbox, db):
+    from indexes import ensure_indexes
+
+    ensure_indexes(db)
+    songbox.mongo.cx = db.client
+    songbox.mongo.db = db
+    return db
+
+
+@pytest.fixture
+def client(songbox, app_db):
+    return songbox.app.test_client()
+
+
+# Usuario registrado y su header de autorizacion
+@pytest.fixture
+def auth(client):
+    user = {'username': 'test', 'email': f'{uuid.uuid4().hex[:8]}@songbox.dev', 'password': 'test-password'}
+    client.post('/register', json=user)
+    token = client.post('/login', json=user).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from cache import MemoryBackend, RedisBackend, SearchCache, cache_redis_url, make_key
+
+
+class _FailingBackend:
+    def get(self, key):
+        raise ConnectionError('redis caido')
+
+    def set(self, key, value, stored_at, max_age):
+        raise ConnectionError('redis caido')
+
+    def delete(self, key):
+        raise ConnectionError('redis caido')
+
+
+def _fetcher(*values):
+    calls = []
+    values = list(values)
+
+    def fetch():
+        calls.append(1)
+        return values.pop(0)
+    return fetch, calls
+
+
+def test_fresh_entry_is_a_hit():
+    cache = SearchCache(MemoryBackend(), ttl=60, stale_ttl=60)
+    fetch, calls = _fetcher('resultado')
+
+    assert cache.get_or_fetch('Abbey Road', 'album', fetch) == 'resultado'
+    assert cache.get_or_fetch('  abbey   ROAD ', 'album', fetch) == 'resultado'
+
+    assert len(calls) == 1
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+
+
+def test_stale_entry_is_served_then_refreshed():
+    backend = MemoryBackend()
+    cache = SearchCache(backend, ttl=60, stale_ttl=600)
+    backend.set(make_key('album', 'abbey road'), 'viejo', time.time() - 120, 660)
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        return 'nuevo'
+
+    # Se responde enseguida con la entrada vencida; el refresco corre aparte
+    assert cache.get_or_fetch('abbey road', 'album', fetch) == 'viejo'
+    assert cache.stats()['stale_hits'] == 1
+    assert cache.get_or_fetch('abbey road', 'album', fetch) == 'viejo'
+    assert cache.stats()['refreshing'] == 1
+
+    release.set()
+    deadline = time.time() + 5
+    while cache.stats()['refreshes'] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert cache.stats()['refreshes'] == 1
+    assert cache.get_or_fetch('abbey road', 'album', fetch) == 'nuevo'
+    assert cache.stats()['hits'] == 1
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    now = time.time()
+    backend.set('a', 1, now, 60)
+    backend.set('b', 2, now, 60)
+    backend.get('a')
+    backend.set('c', 3, now, 60)
+
+    assert backend.get('b') is None
+    assert backend.get('a') == (1, now)
+    assert backend.get('c') == (3, now)
+    assert len(backend) == 2
+
+
+def test_expired_entry_is_dropped():
+    backend = MemoryBackend()
+    backend.set('a', 1, time.time() - 10, 5)
+
+    assert backend.get('a') is None
+    assert len(backend) == 0
+
+
+def test_backend_errors_are_misses():
+    cache = SearchCache(_FailingBackend())
+    fetch, calls = _fetcher('uno', 'dos')
+
+    assert cache.get_or_fetch('abbey road', 'album', fetch) == 'uno'
+    assert cache.get_or_fetch('abbey road', 'album', fetch) == 'dos'
+    cache.invalidate('abbey road', 'album')
+
+    assert len(calls) == 2
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['errors'] == 5
+
+
+def test_redis_backend_round_trip():
+    backend = RedisBackend('redis://localhost:6379/0')
+    backend._client = fakeredis.FakeRedis()
+
+    backend.set('album:abbey road', {'items': [1]}, 100.0, 60)
+    assert backend.get('album:abbey road') == ({'items': [1]}, 100.0)
+    assert 0 < backend._client.ttl('songbox:cache:album:abbey road') <= 60
+
+
+@pytest.mark.parametrize('env, expected', [
+    ({'REDIS_URL': 'redis://store:6379/0'}, 'redis://store:6379/0'),
+    ({'REDIS_URL': 'redis://store:6379/0', 'CACHE_REDIS_URL': 'redis://cache:6379/0'}, 'redis://cache:6379/0'),
+])
+def test_caches_use_their_own_redis(monkeypatch, env, expected):
+    monkeypatch.delenv('CACHE_REDIS_URL', raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    assert cache_redis_url() == expected
@@ -0,0 +1,60 @@
+from spotipy.exceptions import SpotifyException
+
+from benchmarks.stub_spotify import load_fixture
+from catalog import SPOTIFY_TRACKS_BATCH, ingest_albums, resolve_songs, upsert_album
+from indexes import ensure_indexes
+from spotify_gateway import SpotifyThrottled
+
+ALBUMS = load_fixture('search_album.json')['albums']['items']
+
+
+def test_upsert_keeps_local_edits(db):
+    ensure_indexes(db)
+    upsert_album(db, ALBUMS[0])
+    db.albums.update_one({'album_id': ALBUMS[0]['id']}, {'$set': {'name': 'Editado'}})
+
+    upsert_album(db, ALBUMS[0])
+
+    assert db.albums.count_documents({}) == 1
+    assert db.albums.find_one({'album_id': ALBUMS[0]['id']})['name'] == 'Editado'
+
+
+def test_ingest_page_is_one_bulk_write(db):
+    ensure_indexes(db)
+    upsert_album(db, ALBUMS[0])
+
+    # La pagina trae un album repetido y uno que ya estaba guardado
+    result = ingest_albums(db, ALBUMS + [ALBUMS[1]])
+
+    assert result.upserted_count == len(ALBUMS) - 1
+    assert db.albums.count_documents({}) == len(ALBUMS)
+    assert db.albums.find_one({'album_id': ALBUMS[1]['id']})['name_norm'] == ALBUMS[1]['name'].casefold()
+
+
+def test_resolve_songs_skips_a_batch_spotify_rejects(db):
+    ensure_indexes(db)
+    batches = []
+
+    # /v1/tracks responde 400 al lote entero si un id esta mal formado
+    def fetch_tracks(ids):
+        batches.append(ids)
+        if 'bad id' in ids:
+            raise SpotifyException(400, -1, 'invalid id')
+        return {'tracks': [{'id': track_id, 'name': track_id, 'artists': [], 'album': {'id': 'a1', 'name': 'A'}}
+                           for track_id in ids]}
+
+    ids = ['bad id'] + [f't{n}' for n in range(SPOTIFY_TRACKS_BATCH)]
+    songs, complete = resolve_songs(db, ids, {'name': 1}, fetch_tracks)
+
+    assert complete
+    assert len(batches) == 2
+    assert songs[:2] == [None, None]
+    assert [song['song_id'] for song in songs[SPOTIFY_TRACKS_BATCH:]] == [f't{SPOTIFY_TRACKS_BATCH - 1}']
+
+
+def test_resolve_songs_is_incomplete_when_throttled(db):
+    def fetch_tracks(ids):
+        raise SpotifyThrottled(1)
+
+    songs, complete = resolve_songs(db, ['t1'], {'name': 1}, fetch_tracks)
+    assert (songs, complete) == ([None], False)
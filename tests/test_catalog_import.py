@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from catalog import bulk_upsert
+from catalog_import import CatalogImporter, Checkpoint, InvalidRecord, album_record, import_file, read_csv
+
+
+def test_overwrite_keeps_fields_missing_from_the_record(db):
+    first = CatalogImporter(db)
+    first.add_record('albums', {'album_id': 'a1', 'name': 'Uno', 'artist': ['A'], 'release_date': '2020'})
+    first.flush()
+    importer = CatalogImporter(db, overwrite=True)
+    importer.add_record('albums', {'album_id': 'a1', 'name': 'Uno (remaster)'})
+    importer.flush()
+
+    album = db.albums.find_one({'album_id': 'a1'})
+    assert album['name'] == 'Uno (remaster)'
+    assert album['artist'] == ['A']
+    assert album['release_date'] == '2020'
+
+
+def test_artist_must_be_a_list_of_strings():
+    assert album_record({'album_id': 'a1', 'artist': [' A ', '']})['artist'] == ['A']
+    for artist in ('A', ['A', 1], {'name': 'A'}):
+        with pytest.raises(InvalidRecord):
+            album_record({'album_id': 'a1', 'artist': artist})
+
+
+def test_csv_artist_is_split_on_semicolons():
+    (_, row), = read_csv(['album_id,name,artist\n', 'a1,Uno,A; B\n'])
+    assert album_record(row)['artist'] == ['A', 'B']
+
+
+def test_checkpoint_is_saved_to_the_file(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    Checkpoint(path).set('albums.ndjson', 2)
+
+    assert Checkpoint(path).get('albums.ndjson') == 2
+    assert Checkpoint(path).get('songs.ndjson', 0) == 0
+    assert not (tmp_path / 'checkpoint.json.tmp').exists()
+
+
+def _lines(count, fail_after=None):
+    for number in range(1, count + 1):
+        if number == fail_after:
+            raise OSError('conexion perdida')
+        yield json.dumps({'album_id': f'a{number}', 'name': f'Album {number}'}) + '\n'
+
+
+def test_import_resumes_from_the_middle_of_a_file(db, tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+
+    # Se corta al leer la linea 4: solo el primer lote (lineas 1-2) quedo guardado
+    importer = CatalogImporter(db, chunk_size=2)
+    with pytest.raises(OSError):
+        import_file(importer, 'albums', _lines(5, fail_after=4), 'ndjson', 'albums.ndjson', Checkpoint(path))
+    assert Checkpoint(path).get('albums.ndjson') == 2
+    assert db.albums.count_documents({}) == 2
+
+    importer = CatalogImporter(db, chunk_size=2)
+    import_file(importer, 'albums', _lines(5), 'ndjson', 'albums.ndjson', Checkpoint(path))
+
+    assert Checkpoint(path).get('albums.ndjson') == 'done'
+    assert importer.counts['albums'] == {'inserted': 3, 'existing': 0, 'invalid': 0}
+    assert sorted(db.albums.distinct('album_id')) == [f'a{n}' for n in range(1, 6)]
+
+
+# Coleccion cuyo bulk_write pierde una carrera con otro writer: uno de los dos
+# upserts choca con la clave unica, el otro se inserta
+class _RacingCollection:
+    def bulk_write(self, requests, ordered=True):
+        raise BulkWriteError({
+            'writeErrors': [{'index': 0, 'code': 11000, 'errmsg': 'E11000 duplicate key'}],
+            'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 1, 'nMatched': 0,
+            'nModified': 0, 'nRemoved': 0, 'upserted': [{'index': 1, '_id': 'x'}]
+        })
+
+
+def test_duplicate_key_race_keeps_the_upserted_count():
+    docs = [{'album_id': 'a1', 'name': 'Uno'}, {'album_id': 'a2', 'name': 'Dos'}]
+    assert bulk_upsert(_RacingCollection(), 'album_id', docs).upserted_count == 1
+
+    importer = CatalogImporter({'albums': _RacingCollection()})
+    for doc in docs:
+        importer.add('albums', doc)
+    importer.flush()
+    assert importer.counts['albums'] == {'inserted': 1, 'existing': 1, 'invalid': 0}
+
+
+def test_bulk_endpoint_reports_invalid_records_by_index(client, auth):
+    records = [
+        {'album_id': 'b1', 'name': 'Uno', 'artist': ['A']},
+        {'album_id': ''},
+        {'album_id': 'b3', 'artist': 'A'},
+        'no es un objeto'
+    ]
+    response = client.post('/albums/bulk', json=records, headers=auth)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [error['index'] for error in body['errors']] == [1, 2, 3]
+    assert (body['inserted'], body['existing'], body['invalid']) == (1, 0, 3)
+
+    body = client.post('/albums/bulk', json=records[:1], headers=auth).get_json()
+    assert (body['inserted'], body['existing']) == (0, 1)
@@ -0,0 +1,55 @@
+import pytest
+
+from comments import add_to_parents, get_comments_page, rebuild_comment_counters, remove_from_parents
+
+
+def _comment(db, album_id, i):
+    comment = {'user': 'a@songbox.dev', 'album_id': album_id, 'song_id': None, 'text': f'c{i}', 'created_at': f'2024-01-{i + 1:02d}'}
+    comment['_id'] = db.comments.insert_one(comment).inserted_id
+    return comment
+
+
+def test_pages_walk_newest_first(db):
+    for i in range(5):
+        _comment(db, 'album1', i)
+
+    first, cursor = get_comments_page(db, 'album_id', 'album1', limit=3)
+    second, last = get_comments_page(db, 'album_id', 'album1', cursor=cursor, limit=3)
+
+    assert [c['text'] for c in first + second] == ['c4', 'c3', 'c2', 'c1', 'c0']
+    assert last is None
+
+
+def test_counters_follow_adds_and_removes(db, monkeypatch):
+    monkeypatch.setenv('RECENT_COMMENTS_SIZE', '2')
+    db.albums.insert_one({'album_id': 'album1'})
+    comments = [_comment(db, 'album1', i) for i in range(3)]
+    for comment in comments:
+        add_to_parents(db, comment)
+
+    album = db.albums.find_one({'album_id': 'album1'})
+    assert album['comment_count'] == 3
+    assert [c['text'] for c in album['recent_comments']] == ['c2', 'c1']
+
+    db.comments.delete_one({'_id': comments[2]['_id']})
+    remove_from_parents(db, comments[2])
+
+    album = db.albums.find_one({'album_id': 'album1'})
+    assert album['comment_count'] == 2
+    # Se relleno desde `comments`
+    assert [c['text'] for c in album['recent_comments']] == ['c1', 'c0']
+
+
+@pytest.mark.requires_mongod
+def test_rebuild_keeps_only_the_newest(db, monkeypatch):
+    monkeypatch.setenv('RECENT_COMMENTS_SIZE', '3')
+    db.albums.insert_many([{'album_id': 'album1'}, {'album_id': 'album2', 'comment_count': 7}])
+    for i in range(20):
+        _comment(db, 'album1', i)
+
+    rebuild_comment_counters(db)
+
+    album = db.albums.find_one({'album_id': 'album1'})
+    assert album['comment_count'] == 20
+    assert [c['text'] for c in album['recent_comments']] == ['c19', 'c18', 'c17']
+    assert db.albums.find_one({'album_id': 'album2'})['comment_count'] == 0
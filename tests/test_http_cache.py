@@ -0,0 +1,91 @@
+from cache import MemoryBackend
+from http_cache import ResponseCache, body_etag, create_response_cache
+
+
+def _serve(songbox, cache, version, on_load=None):
+    loads = []
+
+    def load():
+        loads.append(version)
+        if on_load:
+            on_load()
+        return {'version': version}, True
+
+    with songbox.app.test_request_context('/playlist/p1'):
+        response = cache.serve('playlist', 'p1', load)
+        return response.get_json(), loads
+
+
+def test_hit_until_invalidated(songbox):
+    cache = ResponseCache(MemoryBackend())
+
+    assert _serve(songbox, cache, 1) == ({'version': 1}, [1])
+    assert _serve(songbox, cache, 2) == ({'version': 1}, [])
+
+    cache.invalidate('playlist', 'p1')
+    assert _serve(songbox, cache, 2) == ({'version': 2}, [2])
+
+
+def test_load_racing_an_invalidate_is_not_served_later(songbox):
+    cache = ResponseCache(MemoryBackend())
+
+    # La escritura y su invalidate() ocurren mientras load() ya leyo la version 1
+    body, _ = _serve(songbox, cache, 1, on_load=lambda: cache.invalidate('playlist', 'p1'))
+    assert body == {'version': 1}
+
+    assert _serve(songbox, cache, 2) == ({'version': 2}, [2])
+
+
+def test_backend_defaults_to_redis_with_redis_url(monkeypatch):
+    monkeypatch.delenv('RESPONSE_CACHE_BACKEND', raising=False)
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    assert isinstance(create_response_cache().backend, MemoryBackend)
+
+    monkeypatch.setenv('REDIS_URL', 'redis://localhost:6379/0')
+    assert type(create_response_cache().backend).__name__ == 'RedisBackend'
+
+
+def test_expanded_playlist_with_failed_fetch_is_not_cached(songbox, client, auth, stub):
+    playlist_id = client.post('/playlist', json={'name': 'Mix', 'songs': ['track1', 'track2']}, headers=auth).get_json()['id']
+    stub.respond_with('/v1/tracks', 429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, {'Retry-After': 0})
+
+    partial = client.get(f'/playlist/{playlist_id}?expand=songs')
+    assert partial.get_json()['songs'] == [None, None]
+    assert partial.headers.get('ETag') is None
+
+    stub.reset()
+    full = client.get(f'/playlist/{playlist_id}?expand=songs')
+    assert [song['song_id'] for song in full.get_json()['songs']] == ['track1', 'track2']
+    assert full.headers.get('ETag')
+
+    hits = songbox.response_cache.stats()['hits']
+    assert client.get(f'/playlist/{playlist_id}?expand=songs').get_json() == full.get_json()
+    assert songbox.response_cache.stats()['hits'] == hits + 1
+
+
+def test_song_edit_changes_expanded_playlist_etag(client, auth):
+    client.post('/songs', json={'song_id': 'track1', 'name': 'Uno', 'album_id': 'a1'}, headers=auth)
+    playlist_id = client.post('/playlist', json={'name': 'Mix', 'songs': ['track1']}, headers=auth).get_json()['id']
+    first = client.get(f'/playlist/{playlist_id}?expand=songs')
+
+    client.put('/songs/track1', json={'name': 'Uno (en vivo)'}, headers=auth)
+
+    second = client.get(f'/playlist/{playlist_id}?expand=songs', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.get_json()['songs'][0]['name'] == 'Uno (en vivo)'
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_memory_backend_is_disabled_with_several_workers(songbox, monkeypatch):
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    monkeypatch.setenv('RESPONSE_CACHE_BACKEND', 'memory')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    cache = create_response_cache()
+    assert cache.backend is None
+
+    # Cada peticion lee MongoDB, pero el ETag del cuerpo sigue dando 304
+    assert _serve(songbox, cache, 1) == ({'version': 1}, [1])
+    assert _serve(songbox, cache, 2) == ({'version': 2}, [2])
+    with songbox.app.test_request_context('/playlist/p1', headers={'If-None-Match': body_etag(songbox.app.json.dumps({'version': 2}))}):
+        assert cache.serve('playlist', 'p1', lambda: ({'version': 2}, True)).status_code == 304
@@ -0,0 +1,31 @@
+import pytest
+
+from indexes import INDEXES, check_indexes, ensure_indexes, explain_queries
+
+
+def test_ensure_is_idempotent(db):
+    first, errors = ensure_indexes(db)
+    assert not errors
+    assert set(first) == set(INDEXES)
+
+    _, errors = ensure_indexes(db)
+    assert not errors
+    assert all(not result['missing'] and not result['extra'] for result in check_indexes(db).values())
+
+
+def test_check_reports_missing_and_extra(db):
+    ensure_indexes(db)
+    db.albums.drop_index('name_norm')
+    db.songs.create_index('album_id', name='album_id')
+
+    report = check_indexes(db)
+
+    assert report['albums']['missing'] == ['name_norm']
+    assert report['songs']['extra'] == ['album_id']
+
+
+@pytest.mark.requires_mongod
+def test_hot_queries_use_indexes(db):
+    ensure_indexes(db)
+    for endpoint, collection, plan in explain_queries(db):
+        assert 'COLLSCAN' not in plan, endpoint
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+from bson import Decimal128, ObjectId
+
+from json_provider import create_json_provider
+
+REF = ObjectId()
+
+DATES = {
+    'orjson': '2024-01-02T03:04:05+00:00',
+    'default': 'Tue, 02 Jan 2024 03:04:05 GMT'
+}
+
+
+# GET /profile devuelve el documento de MongoDB tal cual, con tipos BSON
+@pytest.mark.parametrize('provider', ['orjson', 'default'])
+def test_profile_with_bson_types(songbox, client, auth, app_db, monkeypatch, provider):
+    monkeypatch.setenv('JSON_PROVIDER', provider)
+    monkeypatch.setattr(songbox.app, 'json', create_json_provider(songbox.app))
+    app_db.users.update_one({'username': 'test'}, {'$set': {
+        'favorite_id': REF,
+        'last_login': datetime(2024, 1, 2, 3, 4, 5),
+        'balance': Decimal128('10.50')
+    }})
+
+    response = client.get('/profile', headers=auth)
+
+    assert response.status_code == 200
+    profile = response.get_json()
+    assert profile['favorite_id'] == str(REF)
+    assert profile['last_login'] == DATES[provider]
+    assert profile['balance'] == '10.50'
+    assert profile['username'] == 'test'
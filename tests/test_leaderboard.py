@@ -0,0 +1,31 @@
+from indexes import INDEXES
+from trivia import GLOBAL_SCOPE, MongoLeaderboard, trivia_scope
+
+
+def _leaderboard(db):
+    db.leaderboards.create_indexes(INDEXES['leaderboards'])
+    return MongoLeaderboard(lambda: db.leaderboards)
+
+
+def test_only_the_first_answer_counts(db):
+    leaderboard = _leaderboard(db)
+
+    assert leaderboard.record('t1', 'a', 10)
+    assert not leaderboard.record('t1', 'a', 10)
+    assert leaderboard.record('t2', 'a', 10)
+    assert leaderboard.record('t2', 'b', 0)
+
+    assert leaderboard.top(trivia_scope('t2'), 10) == [('a', 10), ('b', 0)]
+    assert leaderboard.top(GLOBAL_SCOPE, 10) == [('a', 20)]
+
+
+def test_deleting_a_trivia_takes_its_points_out_of_global(db):
+    leaderboard = _leaderboard(db)
+    leaderboard.record('t1', 'a', 10)
+    leaderboard.record('t1', 'b', 10)
+    leaderboard.record('t2', 'a', 5)
+
+    leaderboard.remove_trivia('t1')
+
+    assert leaderboard.top(trivia_scope('t1'), 10) == []
+    assert leaderboard.top(GLOBAL_SCOPE, 10) == [('a', 5), ('b', 0)]
@@ -0,0 +1,37 @@
+from local_search import LocalSearch
+
+
+def _album(album_id, name):
+    return {'album_id': album_id, 'name': name, 'name_norm': name.casefold(), 'artist': ['Artista'], 'release_date': '2000'}
+
+
+def test_unique_exact_match_is_served_locally(db):
+    db.albums.insert_many([_album('a1', 'Abbey Road'), _album('a2', 'Abbey Road Live')])
+
+    doc = LocalSearch().find(db, 'album', 'ABBEY  road', {'_id': 0, 'album_id': 1})
+
+    assert doc == {'album_id': 'a1'}
+
+
+def test_ambiguous_exact_match_goes_to_spotify(db):
+    db.albums.insert_many([_album('a1', 'Greatest Hits'), _album('a2', 'Greatest Hits')])
+    search = LocalSearch()
+
+    assert search.find(db, 'album', 'greatest hits') is None
+    assert search.stats()['misses'] == 1
+
+
+def test_prefix_match_goes_to_spotify(db):
+    db.albums.insert_one(_album('a1', 'Nevermind'))
+    search = LocalSearch()
+
+    assert search.find(db, 'album', 'never') is None
+    assert search.find(db, 'album', 'never', require_details=False) is None
+    assert search.find(db, 'album', 'nevermind')['album_id'] == 'a1'
+
+
+def test_documents_without_details_are_skipped(db):
+    db.albums.insert_one({'album_id': 'a1', 'name': 'Abbey Road', 'name_norm': 'abbey road'})
+
+    assert LocalSearch().find(db, 'album', 'abbey road') is None
+    assert LocalSearch().find(db, 'album', 'abbey road', require_details=False)['album_id'] == 'a1'
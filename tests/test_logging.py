@@ -0,0 +1,67 @@
+import io
+import json
+import logging
+
+import pytest
+
+from logging_config import REDACTED, JsonFormatter, RequestContextFilter
+
+SECRETS = ('secret-access', 'secret-refresh', 'secret-nested', 'secret-header', 'secret-arg', 'secret-password')
+
+
+@pytest.fixture
+def log():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestContextFilter())
+    logger = logging.getLogger('songbox.test_redaction')
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    def lines():
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield logger, stream, lines
+    logger.handlers[:] = []
+
+
+def _assert_no_secrets(output):
+    assert REDACTED in output
+    for secret in SECRETS:
+        assert secret not in output
+
+
+def test_token_info_extra_is_redacted(log):
+    logger, stream, lines = log
+    logger.info('token refrescado', extra={'token_info': {'access_token': 'secret-access', 'refresh_token': 'secret-refresh'}})
+
+    assert lines()[0]['token_info'] == REDACTED
+    _assert_no_secrets(stream.getvalue())
+
+
+def test_nested_dicts_and_lists_are_redacted(log):
+    logger, stream, lines = log
+    logger.info('respuesta de Spotify', extra={'spotify': {
+        'user': 'test',
+        'tokens': [{'refresh_token': 'secret-nested', 'scope': 'user-read-email'}],
+        'login': {'Password': 'secret-password'},
+    }})
+
+    spotify = lines()[0]['spotify']
+    assert spotify['user'] == 'test'
+    assert spotify['tokens'] == [{'refresh_token': REDACTED, 'scope': 'user-read-email'}]
+    assert spotify['login'] == {'Password': REDACTED}
+    _assert_no_secrets(stream.getvalue())
+
+
+def test_authorization_header_is_redacted(log):
+    logger, stream, lines = log
+    logger.info('peticion', extra={'headers': {'Authorization': 'Bearer secret-header', 'Accept': 'application/json'}})
+    logger.info('argumentos %s', {'access_token': 'secret-arg'})
+
+    first, second = lines()
+    assert first['headers'] == {'Authorization': REDACTED, 'Accept': 'application/json'}
+    assert second['msg'] == f"argumentos {{'access_token': '{REDACTED}'}}"
+    _assert_no_secrets(stream.getvalue())
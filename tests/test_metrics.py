@@ -0,0 +1,83 @@
+import requests
+
+import metrics
+from spotify_gateway import SpotifyGateway
+
+
+def _count(histogram, *labels):
+    entry = histogram._values.get(labels)
+    return entry[2] if entry else 0
+
+
+def test_connection_errors_are_counted_in_the_gateway():
+    gateway = SpotifyGateway()
+    errors = metrics.DEPENDENCY_ERRORS._values.get(('spotify', 'search'), 0)
+    timed = _count(metrics.DEPENDENCY_TIME, 'spotify', 'search')
+
+    def fetch():
+        raise requests.ConnectionError('connection refused')
+
+    try:
+        gateway.call(('search', 'album:test'), fetch)
+    except requests.ConnectionError:
+        pass
+
+    assert metrics.DEPENDENCY_ERRORS._values[('spotify', 'search')] == errors + 1
+    assert _count(metrics.DEPENDENCY_TIME, 'spotify', 'search') == timed + 1
+
+
+def test_streamed_response_is_timed_until_close():
+    def app(environ, start_response):
+        environ['songbox.route'] = '/stream-test'
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        yield b'uno'
+        yield b'dos'
+
+    middleware = metrics.MetricsMiddleware(app)
+    before = _count(metrics.REQUEST_TIME, '/stream-test', 'GET')
+
+    body = middleware({'REQUEST_METHOD': 'GET'}, lambda status, headers, exc_info=None: None)
+    assert _count(metrics.REQUEST_TIME, '/stream-test', 'GET') == before
+
+    assert b''.join(body) == b'unodos'
+    body.close()
+    assert _count(metrics.REQUEST_TIME, '/stream-test', 'GET') == before + 1
+    assert metrics.REQUESTS._values[('/stream-test', 'GET', '200')] >= 1
+
+
+def _sample(text, line_start):
+    return [line for line in text.splitlines() if line.startswith(line_start)]
+
+
+def test_multiprocess_metrics_are_summed_and_archived(tmp_path, monkeypatch):
+    monkeypatch.setenv('METRICS_MULTIPROC_DIR', str(tmp_path))
+    metrics.REQUESTS.inc('/multiproc-test', 'GET', '200')
+    own = metrics.REQUESTS._values[('/multiproc-test', 'GET', '200')]
+
+    # Otro worker que atendio 3 peticiones de la misma ruta
+    metrics._write(str(tmp_path / '999999.json'), {
+        'songbox_http_requests_total': [[['/multiproc-test', 'GET', '200'], 3]],
+        'songbox_http_request_duration_seconds': [[['/multiproc-test', 'GET'], [1] + [0] * 12, 0.001, 1]],
+    })
+    expected = f'songbox_http_requests_total{{route="/multiproc-test",method="GET",status="200"}} {own + 3}'
+    assert _sample(metrics.render(), 'songbox_http_requests_total{route="/multiproc-test"') == [expected]
+
+    # Al terminar el worker sus contadores pasan al archivo y no vuelven a cero
+    metrics.mark_process_dead(999999)
+    text = metrics.render()
+    assert not (tmp_path / '999999.json').exists()
+    assert _sample(text, 'songbox_http_requests_total{route="/multiproc-test"') == [expected]
+    assert 'songbox_http_request_duration_seconds_count{route="/multiproc-test",method="GET"} 1' in text
+
+
+def test_gauges_are_reported_per_worker():
+    gauges = metrics.Gauges('songbox_test_gauge', 'Prueba', ('stat',), lambda: [])
+    merged = gauges.empty()
+    merged.merge([[['hits'], 2]], '101')
+    merged.merge([[['hits'], 5]], '102')
+    merged.merge([[['hits'], 7]])
+
+    assert merged.render()[2:] == [
+        'songbox_test_gauge{stat="hits",worker="101"} 2',
+        'songbox_test_gauge{stat="hits",worker="102"} 5',
+    ]
@@ -0,0 +1,43 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import passwords
+
+
+@pytest.fixture
+def scrypt(monkeypatch):
+    monkeypatch.setattr(passwords, 'HASH_METHOD', 'scrypt')
+    monkeypatch.setattr(passwords, '_werkzeug_method', None)
+
+
+def test_short_method_matches_its_full_parameters(scrypt):
+    assert not passwords.needs_rehash(generate_password_hash('secret', method='scrypt'))
+    assert not passwords.needs_rehash(generate_password_hash('secret', method='scrypt:32768:8:1'))
+    assert passwords.needs_rehash(generate_password_hash('secret', method='scrypt:16384:8:1'))
+    assert passwords.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+
+
+def test_argon2_parameters_are_compared():
+    assert not passwords.needs_rehash(passwords.hash_password('secret'))
+    assert passwords.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+
+
+def test_rehash_writes_the_new_hash(db, scrypt):
+    stored = generate_password_hash('secret', method='pbkdf2:sha256:1000')
+    user_id = db.users.insert_one({'email': 'a@songbox.dev', 'password': stored}).inserted_id
+
+    passwords.rehash_in_background(db.users, user_id, stored, 'secret').join(timeout=10)
+
+    updated = db.users.find_one({'_id': user_id})['password']
+    assert updated.startswith('scrypt:32768:8:1$')
+    assert passwords.verify_password(updated, 'secret')
+    assert passwords.rehash_in_background(db.users, user_id, updated, 'secret') is None
+
+
+def test_rehash_keeps_a_hash_changed_in_between(db, scrypt):
+    stored = generate_password_hash('secret', method='pbkdf2:sha256:1000')
+    user_id = db.users.insert_one({'email': 'a@songbox.dev', 'password': 'changed'}).inserted_id
+
+    passwords.rehash_in_background(db.users, user_id, stored, 'secret').join(timeout=10)
+
+    assert db.users.find_one({'_id': user_id})['password'] == 'changed'
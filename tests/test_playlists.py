@@ -0,0 +1,82 @@
+import pytest
+from marshmallow import ValidationError
+
+from playlists import apply_songs_operation, songs_operation_schema
+
+
+@pytest.fixture
+def playlist(db):
+    doc = {'user': 'a@songbox.dev', 'songs': ['s1', 's2', 's3', 's4'], 'version': 3}
+    doc['_id'] = db.playlist.insert_one(doc).inserted_id
+    return doc
+
+
+def _apply(db, playlist, data, user='a@songbox.dev'):
+    return apply_songs_operation(db.playlist, playlist['_id'], user, songs_operation_schema.load(data))
+
+
+def _songs(db, playlist):
+    return db.playlist.find_one({'_id': playlist['_id']})['songs']
+
+
+def test_add_at_position_and_remove(db, playlist):
+    assert _apply(db, playlist, {'op': 'add', 'version': 3, 'songs': ['x'], 'position': 1})['version'] == 4
+    assert _songs(db, playlist) == ['s1', 'x', 's2', 's3', 's4']
+
+    assert _apply(db, playlist, {'op': 'remove', 'version': 4, 'songs': ['s1', 's3']})['version'] == 5
+    assert _songs(db, playlist) == ['x', 's2', 's4']
+
+
+def test_stale_version_or_other_user_is_not_applied(db, playlist):
+    assert _apply(db, playlist, {'op': 'add', 'version': 2, 'songs': ['x']}) is None
+    assert _apply(db, playlist, {'op': 'add', 'version': 3, 'songs': ['x']}, user='b@songbox.dev') is None
+    assert _songs(db, playlist) == ['s1', 's2', 's3', 's4']
+
+
+def test_playlists_without_version_count_as_zero(db):
+    playlist = {'user': 'a@songbox.dev', 'songs': []}
+    playlist['_id'] = db.playlist.insert_one(playlist).inserted_id
+
+    assert _apply(db, playlist, {'op': 'add', 'version': 0, 'songs': ['x']})['version'] == 1
+
+
+@pytest.mark.requires_mongod
+@pytest.mark.parametrize('source, target, expected', [
+    (0, 2, ['s2', 's3', 's1', 's4']),
+    (3, 0, ['s4', 's1', 's2', 's3']),
+    (1, 1, ['s1', 's2', 's3', 's4']),
+    (1, 9, ['s1', 's3', 's4', 's2']),
+])
+def test_move(db, playlist, source, target, expected):
+    assert _apply(db, playlist, {'op': 'move', 'version': 3, 'from': source, 'to': target})['version'] == 4
+    assert _songs(db, playlist) == expected
+
+
+@pytest.mark.requires_mongod
+def test_move_out_of_range_is_not_applied(db, playlist):
+    assert _apply(db, playlist, {'op': 'move', 'version': 3, 'from': 4, 'to': 0}) is None
+
+
+@pytest.mark.parametrize('data', [
+    {'op': 'add', 'version': 0},
+    {'op': 'move', 'version': 0, 'to': 1},
+    {'op': 'shuffle', 'version': 0},
+    {'op': 'add', 'version': -1, 'songs': ['x']},
+    {'op': 'add', 'version': 0, 'songs': []},
+])
+def test_invalid_operations_are_rejected(data):
+    with pytest.raises(ValidationError):
+        songs_operation_schema.load(data)
+
+
+def test_patch_reports_why_it_was_not_applied(client, auth):
+    playlist_id = client.post('/playlist', json={'name': 'Mix', 'songs': ['s1']}, headers=auth).get_json()['id']
+    url = f'/playlist/{playlist_id}/songs'
+
+    assert client.patch(url, json={'op': 'add', 'version': 0, 'songs': ['s2']}, headers=auth).get_json()['version'] == 1
+
+    conflict = client.patch(url, json={'op': 'add', 'version': 0, 'songs': ['s3']}, headers=auth)
+    assert conflict.status_code == 409
+    assert conflict.get_json()['version'] == 1
+
+    assert client.patch(url, json={'op': 'add', 'songs': ['s3']}, headers=auth).status_code == 400
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+
+from flask.sessions import SecureCookieSessionInterface
+
+TOKEN = {'access_token': 'test-access-token', 'refresh_token': 'test-refresh-token', 'expires_at': 2 ** 31}
+
+
+def _sid(client):
+    cookie = client.get_cookie('session')
+    return cookie.value.rsplit('.', 1)[0] if cookie else None
+
+
+def test_legacy_cookie_session_moves_its_token_to_the_store(songbox, client, app_db):
+    legacy = SecureCookieSessionInterface().get_signing_serializer(songbox.app).dumps({'token_info': TOKEN})
+    client.set_cookie('session', legacy)
+
+    response = client.get('/home')
+
+    assert response.get_data(as_text=True).startswith('Bievenido')
+    stored = app_db.sessions.find_one({'_id': _sid(client)})
+    assert stored is not None
+    # La sesion nueva guarda solo la clave del token
+    assert 'test-access-token' not in stored['data']
+    assert client.get('/home').get_data(as_text=True).startswith('Bievenido')
+
+
+def test_reading_the_session_extends_it(songbox, client, app_db):
+    with client.session_transaction() as session:
+        session['spotify_token_key'] = 'session:ttl'
+    songbox.token_store.set('session:ttl', TOKEN)
+    sid = _sid(client)
+    soon = datetime.now(timezone.utc) + timedelta(minutes=1)
+    app_db.sessions.update_one({'_id': sid}, {'$set': {'expires_at': soon}})
+
+    client.get('/home')
+
+    expires_at = app_db.sessions.find_one({'_id': sid})['expires_at'].replace(tzinfo=timezone.utc)
+    assert expires_at > soon + songbox.app.permanent_session_lifetime / 2
+
+
+def test_invalid_jwt_is_ignored_when_looking_for_the_token(client):
+    response = client.get('/home', headers={'Authorization': 'Bearer not-a-jwt'})
+
+    assert response.get_data(as_text=True) == 'Por favor, inicia sesion'
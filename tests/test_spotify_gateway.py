@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from ratelimit import TokenBucket
+from spotify_gateway import SpotifyGateway, SpotifyThrottled
+from spotify_integration import get_spotify_client
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_bucket_allows_a_burst_then_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+    clock.sleep(0.5)
+    assert bucket.try_acquire()
+    clock.sleep(100)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_gateway_waits_for_a_permit_up_to_max_wait():
+    clock = FakeClock()
+    gateway = SpotifyGateway(rate=1, burst=1, max_wait=2, clock=clock, sleep=clock.sleep)
+
+    assert gateway.call(None, lambda: 'a') == 'a'
+    assert gateway.call(None, lambda: 'b') == 'b'
+    assert clock.now == pytest.approx(1001)
+
+    slow = SpotifyGateway(rate=0.1, burst=1, max_wait=2, clock=clock, sleep=clock.sleep)
+    slow.call(None, lambda: 'a')
+    with pytest.raises(SpotifyThrottled):
+        slow.call(None, lambda: 'b')
+    assert slow.stats()['throttled'] == 1
+
+
+def test_identical_calls_in_flight_are_coalesced():
+    gateway = SpotifyGateway()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(gateway.call(('search', 'q'), fetch)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(gateway.call(('search', 'q'), fetch))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while gateway.stats()['coalesced'] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ['result'] * 4
+    assert len(calls) == 1
+
+
+def test_429_with_retry_after_reaches_the_gateway_at_once(songbox, stub):
+    stub.respond_with('/v1/search', 429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, {'Retry-After': 30})
+    clock = FakeClock()
+    gateway = SpotifyGateway(clock=clock, sleep=clock.sleep)
+    sp = get_spotify_client('test-access-token')
+    before = stub.calls.get('/v1/search', 0)
+
+    start = time.perf_counter()
+    with pytest.raises(SpotifyThrottled) as raised:
+        gateway.call(('search', 'q'), lambda: sp.search(q='q', type='album'))
+
+    # urllib3 no reintento ni durmio los 30 s: el gateway bloquea y responde 503
+    assert time.perf_counter() - start < 5
+    assert stub.calls['/v1/search'] == before + 1
+    assert raised.value.retry_after == 30
+    assert gateway.stats()['blocked_seconds'] == 30
+
+    stub.reset()
+    with pytest.raises(SpotifyThrottled):
+        gateway.call(('search', 'q'), lambda: sp.search(q='q', type='album'))
+    assert stub.calls['/v1/search'] == before + 1
+    clock.sleep(30)
+    assert gateway.call(('search', 'q'), lambda: sp.search(q='q', type='album'))['albums']['items']
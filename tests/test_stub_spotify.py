@@ -0,0 +1,38 @@
+import requests
+
+
+def test_search_replays_fixture(stub):
+    response = requests.get(stub.api_url + 'search', params={'q': 'abbey road', 'type': 'album'})
+    assert response.status_code == 200
+    assert response.json()['albums']['items']
+
+
+def test_tracks_accepts_trailing_slash(stub):
+    response = requests.get(stub.api_url + 'tracks/', params={'ids': 'a,b'})
+    assert [track['id'] for track in response.json()['tracks']] == ['a', 'b']
+
+
+def test_forced_response_until_reset(stub):
+    stub.respond_with('/v1/me', 429, headers={'Retry-After': 7})
+    response = requests.get(stub.api_url + 'me')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+
+    stub.reset()
+    assert requests.get(stub.api_url + 'me').status_code == 200
+
+
+def test_app_serves_through_stub(songbox, client, stub):
+    with client.session_transaction() as session:
+        session['spotify_token_key'] = 'session:test'
+    songbox.token_store.set('session:test', {
+        'access_token': 'test-access-token',
+        'refresh_token': 'test-refresh-token',
+        'expires_at': 2 ** 31,
+    })
+    before = stub.calls.get('/v1/search', 0)
+
+    response = client.get('/search_album', query_string={'name': 'stub smoke test album'})
+
+    assert response.status_code == 200
+    assert stub.calls['/v1/search'] == before + 1
@@ -0,0 +1,70 @@
+import threading
+
+from spotify_integration import SpotifyTokenManager
+
+THREADS = 8
+
+
+# Lanza `THREADS` refrescos del mismo refresh token a la vez; devuelve
+# (resultados, errores)
+def _refresh_together(manager, refresh_token):
+    barrier = threading.Barrier(THREADS)
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        try:
+            token_info = manager.refresh(refresh_token)
+            with lock:
+                results.append(token_info)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+
+def test_concurrent_refreshes_share_one_call(songbox, stub):
+    stub.latency = 0.2
+    before = stub.calls.get('/api/token', 0)
+    manager = SpotifyTokenManager(reuse_seconds=0)
+
+    results, errors = _refresh_together(manager, 'refresh-token')
+
+    assert errors == []
+    assert len(results) == THREADS
+    assert len({token_info['access_token'] for token_info in results}) == 1
+    assert manager.refresh_calls == 1
+    assert stub.calls['/api/token'] - before == 1
+
+
+def test_failed_refresh_reaches_every_caller(songbox, stub):
+    stub.latency = 0.2
+    stub.respond_with('/api/token', 400, {'error': 'invalid_grant', 'error_description': 'Refresh token revoked'})
+    manager = SpotifyTokenManager(reuse_seconds=0)
+
+    results, errors = _refresh_together(manager, 'revoked-token')
+
+    assert results == []
+    assert len(errors) == THREADS
+    assert len({id(e) for e in errors}) == 1
+    assert 'invalid_grant' in str(errors[0])
+    assert manager.refresh_calls == 1
+
+
+def test_recent_refresh_is_reused(songbox, stub):
+    manager = SpotifyTokenManager(reuse_seconds=30)
+
+    first = manager.refresh('refresh-token')
+    assert manager.refresh('refresh-token') is first
+    assert manager.refresh_calls == 1
+
+    manager.reuse_seconds = 0
+    assert manager.refresh('refresh-token') is not first
+    assert manager.refresh_calls == 2
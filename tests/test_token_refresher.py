@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+from spotify_integration import SpotifyTokenManager
+from token_refresher import TokenRefresher
+from token_store import MongoTokenStore, RedisTokenStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(params=['mongo', 'redis'])
+def store(request, db):
+    if request.param == 'mongo':
+        return MongoTokenStore(lambda: db.spotify_tokens)
+    fakeredis = pytest.importorskip('fakeredis')
+    store = RedisTokenStore('redis://localhost:6379/0')
+    store._client = fakeredis.FakeRedis()
+    return store
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+# Refresca contra /api/token del stub
+@pytest.fixture
+def refresh(songbox, stub):
+    return SpotifyTokenManager(reuse_seconds=0).refresh
+
+
+def _refresher(store, refresh, clock, **kwargs):
+    options = {'lead': 300, 'jitter': 120, 'rate': 100, 'backoff': 5, 'max_backoff': 300}
+    options.update(kwargs)
+    return TokenRefresher(store, refresh, clock=clock, **options)
+
+
+def _token(clock, expires_in, refresh_token='refresh-token'):
+    return {'access_token': 'old', 'refresh_token': refresh_token, 'expires_at': int(clock.now + expires_in)}
+
+
+def test_tokens_are_refreshed_inside_their_jitter_window(store, refresh, clock):
+    refresher = _refresher(store, refresh, clock)
+    token = _token(clock, 1000)
+    store.set('user:a', token)
+    due_at = refresher.due_at('user:a', token)
+    assert token['expires_at'] - 300 - 120 < due_at <= token['expires_at'] - 300
+
+    clock.now = due_at - 1
+    assert refresher.run_once() == 0
+
+    clock.now = due_at
+    assert refresher.run_once() == 1
+    assert store.get('user:a')['access_token'].startswith('stub-')
+
+
+def test_refreshes_per_pass_are_capped_by_the_bucket(store, refresh, clock):
+    refresher = _refresher(store, refresh, clock, rate=2, jitter=0)
+    for i in range(5):
+        store.set(f'user:{i}', _token(clock, 60))
+
+    assert refresher.run_once() == 2
+    assert refresher.stats()['throttled'] == 1
+
+    # El token que no tuvo cupo no quedo reclamado
+    clock.advance(1)
+    assert refresher.run_once() == 2
+    clock.advance(1)
+    assert refresher.run_once() == 1
+
+
+def test_tokens_claimed_elsewhere_do_not_use_the_bucket(store, refresh, clock):
+    refresher = _refresher(store, refresh, clock, rate=1, jitter=0)
+    store.set('user:a', _token(clock, 60))
+    store.set('user:b', _token(clock, 61))
+    assert store.claim('user:a', 60)
+
+    assert refresher.run_once() == 1
+    assert store.get('user:a')['access_token'] == 'old'
+    assert store.get('user:b')['access_token'] != 'old'
+
+
+def test_failures_back_off_exponentially(store, refresh, clock, stub):
+    refresher = _refresher(store, refresh, clock, jitter=0)
+    store.set('user:a', _token(clock, 60))
+    stub.respond_with('/api/token', 400, {'error': 'server_error'})
+
+    assert refresher.run_once() == 0
+    assert refresher.stats()['paused'] == 1
+    clock.advance(4)
+    assert refresher.run_once() == 0
+    assert refresher.stats()['failed'] == 1
+
+    clock.advance(1)
+    assert refresher.run_once() == 0
+    assert refresher.stats()['failed'] == 2
+    # Segunda falla: 10s de pausa
+    clock.advance(9)
+    assert refresher.stats()['paused'] == 1
+
+    stub.reset()
+    clock.advance(1)
+    assert refresher.run_once() == 1
+    assert refresher.stats()['paused'] == 0
+
+
+def test_revoked_tokens_are_deleted(store, refresh, clock, stub):
+    refresher = _refresher(store, refresh, clock, jitter=0)
+    store.set('user:a', _token(clock, 60))
+    stub.respond_with('/api/token', 400, {'error': 'invalid_grant', 'error_description': 'Refresh token revoked'})
+
+    refresher.run_once()
+
+    assert refresher.stats()['revoked'] == 1
+    assert store.get('user:a') is None
+
+
+def test_claim_is_exclusive_until_released_or_stored(store, clock):
+    store.set('user:a', _token(clock, 60))
+
+    assert store.claim('user:a', 60)
+    assert not store.claim('user:a', 60)
+    store.release('user:a')
+    assert store.claim('user:a', 60)
+    store.update('user:a', _token(clock, 3600))
+    assert store.claim('user:a', 60)
+
+
+def test_idle_tokens_are_not_refreshed(store, refresh, clock):
+    refresher = _refresher(store, refresh, clock, jitter=0, active=3600)
+    store.set('user:a', _token(clock, 60 + 2 * 3600))
+
+    clock.advance(2 * 3600)
+    assert refresher.run_once() == 0
+    assert store.get('user:a')['access_token'] == 'old'
+
+
+def test_background_refresh_does_not_extend_retention(store, db, clock):
+    store.set('user:a', _token(clock, 60))
+    if isinstance(store, MongoTokenStore):
+        db.spotify_tokens.update_one({'_id': 'user:a'}, {'$set': {'discard_at': 'marker'}})
+        store.update('user:a', _token(clock, 3600))
+        assert db.spotify_tokens.find_one({'_id': 'user:a'})['discard_at'] == 'marker'
+    else:
+        store._client.expire(store.prefix + 'user:a', 100)
+        store.update('user:a', _token(clock, 3600))
+        assert store._client.ttl(store.prefix + 'user:a') <= 100
+
+    # Si ya se descarto no se vuelve a crear
+    store.delete('user:a')
+    store.update('user:a', _token(clock, 3600))
+    assert store.get('user:a') is None
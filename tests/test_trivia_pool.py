@@ -0,0 +1,98 @@
+import pytest
+
+from trivia import BloomFilter, MemorySeenSets, MongoSeenSets, QuestionPool, create_question_pool
+
+
+def _questions(n):
+    return [{'id': f'q{i}', 'album_id': 'a1' if i % 2 else 'a2', 'tags': ['rock'] if i < 3 else []} for i in range(n)]
+
+
+# mongomock no tiene $bit
+@pytest.fixture(params=['memory', pytest.param('mongo', marks=pytest.mark.requires_mongod)])
+def seen(request, db):
+    # 13 bits: el bitset necesita 2 bytes aunque no sea multiplo de 8
+    bloom = BloomFilter(bits=13, hashes=2)
+    if request.param == 'memory':
+        return MemorySeenSets(bloom)
+    return MongoSeenSets(bloom, lambda: db.trivia_seen)
+
+
+def test_bloom_never_reports_an_added_item_as_unseen():
+    bloom = BloomFilter(bits=1000, hashes=4)
+    bitset = bytearray((bloom.bits + 7) // 8)
+    for i in range(100):
+        for position in bloom.positions(f'q{i}'):
+            bitset[position >> 3] |= 0x80 >> (position & 7)
+
+    assert all(bloom.contains(bitset, bloom.positions(f'q{i}')) for i in range(100))
+    assert not bloom.contains(b'', bloom.positions('q1'))
+
+
+def test_mongo_words_match_the_setbit_layout(db):
+    bloom = BloomFilter(bits=130, hashes=2)
+    mongo = MongoSeenSets(bloom, lambda: db.trivia_seen)
+    memory = MemorySeenSets(bloom)
+    positions = [0, 1, 63, 64, 100, 127, 128, 129]
+    memory.add('user', positions)
+
+    # Lo que quedaria guardado despues de los $bit or
+    words = {}
+    for index, mask in MongoSeenSets.word_masks(positions).items():
+        words[str(index)] = words.get(str(index), 0) | MongoSeenSets.to_int64(mask)
+
+    assert all(-(1 << 63) <= word < (1 << 63) for word in words.values())
+    assert mongo.bitset(words) == memory.snapshot('user')
+    assert mongo.bitset({}) == bytes(17)
+
+
+def test_seen_sets_cover_every_bit(seen):
+    top = seen.bloom.bits - 1
+    seen.add('user', [0, top])
+
+    bitset = seen.snapshot('user')
+    assert len(bitset) == 2
+    assert seen.bloom.contains(bitset, [0, top])
+    assert not seen.bloom.contains(bitset, [1])
+    assert seen.snapshot('other') in (b'', bytes(2))
+
+
+def test_pool_serves_each_question_once():
+    pool = QuestionPool(lambda: _questions(6), MemorySeenSets(BloomFilter(bits=8192, hashes=4)))
+
+    served = {pool.next('user', {})['id'] for _ in range(6)}
+
+    assert served == {f'q{i}' for i in range(6)}
+    assert pool.next('user', {}) is None
+    assert pool.next('other', {}) is not None
+
+
+def test_pool_filters_combine(seen):
+    pool = QuestionPool(lambda: _questions(6), seen)
+
+    question = pool.next('user', {'album_id': 'a1', 'tag': 'rock'})
+
+    assert question['id'] == 'q1'
+
+
+def test_seen_backend_is_shared_by_default(monkeypatch, db):
+    monkeypatch.delenv('TRIVIA_SEEN_BACKEND', raising=False)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    assert isinstance(create_question_pool(list, lambda: db.trivia_seen).seen, MongoSeenSets)
+
+    monkeypatch.setenv('TRIVIA_SEEN_BACKEND', 'memory')
+    assert isinstance(create_question_pool(list, lambda: db.trivia_seen).seen, MemorySeenSets)
+
+
+@pytest.mark.parametrize('tags', ['rock', [1, 2], ['rock', ''], {'tag': 'rock'}])
+def test_trivia_tags_must_be_a_list_of_strings(client, auth, tags):
+    trivia = {'question': '?', 'options': ['a', 'b'], 'correct_answer': 'a', 'tags': tags}
+
+    assert client.post('/trivia', json=trivia, headers=auth).status_code == 400
+
+
+def test_trivia_with_tags_is_created(client, auth):
+    trivia = {'question': '?', 'options': ['a', 'b'], 'correct_answer': 'a', 'tags': ['rock', '70s']}
+
+    response = client.post('/trivia', json=trivia, headers=auth)
+    assert response.status_code == 201
+    assert response.get_json()['tags'] == ['rock', '70s']
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import fakeredis
+from bson import Decimal128, ObjectId
+from flask_jwt_extended import decode_token
+
+from cache import MemoryBackend, RedisBackend
+from json_provider import dumps_bytes
+from users import UserCache
+
+
+def _loader(doc):
+    calls = []
+
+    def load(email):
+        calls.append(email)
+        return dict(doc)
+    return load, calls
+
+
+def _claims(songbox, token):
+    with songbox.app.app_context():
+        return decode_token(token)
+
+
+def test_memory_hit_does_not_load_again():
+    cache = UserCache(MemoryBackend(), ttl=30)
+    load, calls = _loader({'email': 'a@songbox.dev', 'username': 'a'})
+
+    assert cache.get('a@songbox.dev', load)['username'] == 'a'
+    assert cache.get('a@songbox.dev', load)['username'] == 'a'
+
+    assert calls == ['a@songbox.dev']
+    assert (cache.stats()['misses'], cache.stats()['hits']) == (1, 1)
+
+
+def test_shared_tier_stores_bson_values():
+    redis = fakeredis.FakeRedis()
+    profile = {'email': 'a@songbox.dev', 'ref': ObjectId(), 'last_login': datetime(2024, 1, 2, 3, 4, 5),
+               'balance': Decimal128('10.50')}
+
+    def shared():
+        backend = RedisBackend('redis://localhost:6379/0', prefix='songbox:user:', dumps=dumps_bytes)
+        backend._client = redis
+        return backend
+
+    first = UserCache(MemoryBackend(), shared=shared())
+    load, calls = _loader(profile)
+    first.get('a@songbox.dev', load)
+    assert first.stats()['errors'] == 0
+
+    # Otro worker lo encuentra en Redis, ya serializado como en la respuesta
+    second = UserCache(MemoryBackend(), shared=shared())
+    cached = second.get('a@songbox.dev', load)
+    assert calls == ['a@songbox.dev']
+    assert second.stats()['shared_hits'] == 1
+    assert cached['ref'] == str(profile['ref'])
+    assert cached['last_login'] == '2024-01-02T03:04:05+00:00'
+    assert cached['balance'] == '10.50'
+
+
+def test_login_token_carries_id_and_username(songbox, client, auth, app_db):
+    user = app_db.users.find_one({'username': 'test'})
+    claims = _claims(songbox, auth['Authorization'].split()[1])
+
+    assert claims['uid'] == str(user['_id'])
+    assert claims['username'] == 'test'
+    assert claims['sub'] == user['email']
+
+
+def test_profile_update_invalidates_cache_and_returns_new_token(songbox, client, auth):
+    assert client.get('/profile', headers=auth).get_json()['username'] == 'test'
+
+    response = client.put('/profile', json={'username': 'nuevo', 'email': 'ignored@songbox.dev'}, headers=auth)
+    assert response.status_code == 200
+    token = response.get_json()['token']
+
+    # El token anterior sigue valido y ve el perfil nuevo (el cache se invalido)
+    assert client.get('/profile', headers=auth).get_json()['username'] == 'nuevo'
+    assert _claims(songbox, token)['username'] == 'nuevo'
+    assert client.get('/profile', headers={'Authorization': f'Bearer {token}'}).get_json()['email'] != 'ignored@songbox.dev'
+
+
+def test_profile_update_rejects_non_string_or_blank_values(client, auth):
+    for data in ({'username': ''}, {'username': '   '}, {'username': 123}, {'profile_picture': ['x']},
+                 {'username': {'$gt': ''}}, ['username']):
+        response = client.put('/profile', json=data, headers=auth)
+        assert response.status_code == 400, data
+
+    assert client.get('/profile', headers=auth).get_json()['username'] == 'test'
+    assert client.put('/profile', json={'profile_picture': 'https://img/1.png'}, headers=auth).status_code == 200